@@ -0,0 +1,324 @@
+"""
+Análisis por lotes de todas las sesiones (o de un subconjunto) de la base de datos.
+
+Cada sesión pasa por decodificación de señales, filtrado PPG, evolución de
+BPM, filtrado EOG y extracción de métricas en un pool de procesos. Los
+procesos del pool solo leen: devuelven la fila de resumen y los resultados
+derivados nuevos, y el proceso principal (único escritor) los guarda en
+resumen_sesiones y resultados_derivados. Las revisiones mensuales de resultados se consultan
+después con DatabaseManager.get_session_summaries() y
+DatabaseManager.get_monthly_outcomes() sin volver a abrir ninguna sesión.
+
+Las sesiones ya resumidas sin errores con la versión actual del análisis se
+omiten, así que el comando puede relanzarse para procesar solo las sesiones
+nuevas o las que fallaron. Las sesiones sin datos PPG suficientes no son un
+error: se guardan con su estado ('sin_datos' o 'datos_insuficientes') y no
+se reintentan.
+
+Uso (desde src/):
+    python analysis/cohort_analysis.py                          # sesiones pendientes
+    python analysis/cohort_analysis.py --paciente 3 --desde 2025-01-01 --hasta 2025-01-31
+    python analysis/cohort_analysis.py --todas --procesos 4 --csv resumen.csv
+"""
+
+import argparse
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+
+# Añadir el directorio src al path para las importaciones
+src_path = Path(__file__).parent.parent
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+
+from database.database_manager import DatabaseManager
+from database.derived_cache import save_pending_writes
+
+# Incrementar al cambiar las métricas del resumen (fuerza el recálculo)
+ANALYSIS_VERSION = 1
+
+# Mismos parámetros que la vista de detalles de sesión (comparten la caché de resultados)
+PPG_FILTER_PARAMS = {
+    'hp_cutoff': 0.5,
+    'lp_cutoff': 5.0,
+    'notch_freq': 50,
+    'notch_q': 30,
+    'smoothing': True,
+}
+
+# Filas acumuladas antes de escribir en la base de datos
+WRITE_BATCH_SIZE = 20
+
+
+# Estados de resumen_sesiones (solo STATUS_ERROR se reintenta)
+STATUS_COMPLETE = 'completo'
+STATUS_NO_DATA = 'sin_datos'
+STATUS_INSUFFICIENT_DATA = 'datos_insuficientes'
+STATUS_ERROR = 'error'
+
+
+def _empty_summary(session_id):
+    """Fila de resumen sin métricas (sesión sin datos o con error)."""
+    return {
+        'id_sesion': session_id,
+        'version': ANALYSIS_VERSION,
+        'estado': STATUS_COMPLETE,
+        'duracion_min': None,
+        'muestras': 0,
+        'fs_estimada': None,
+        'calidad_ppg': None,
+        'snr_db': None,
+        'artefactos': None,
+        'artefactos_seg': None,
+        'bpm_medio': None,
+        'bpm_std': None,
+        'bpm_min': None,
+        'bpm_max': None,
+        'bpm_inicio': None,
+        'bpm_final': None,
+        'bpm_cambio_pct': None,
+        'rmssd': None,
+        'sdnn': None,
+        'lf_hf': None,
+        'eog_rms': None,
+        'eog_movimientos_seg': None,
+        'error': None,
+    }
+
+
+def _optional_float(value):
+    """float nativo o None (para columnas REAL)."""
+    if value is None:
+        return None
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def analyze_session(session_id, use_cache=True):
+    """
+    Analizar una sesión completa y devolver su fila de resumen.
+
+    Se ejecuta en los procesos del pool y solo lee de la base de datos: los
+    resultados derivados nuevos se devuelven para que los guarde el proceso
+    principal. Un fallo a mitad del análisis conserva las métricas ya
+    calculadas y lo indica en 'error' (estado 'error'); la falta de datos PPG
+    solo se indica en 'estado'.
+
+    Args:
+        session_id: ID de la sesión
+        use_cache: Reutilizar filtrado PPG y BPM de resultados_derivados (y
+                   devolver los nuevos para guardarlos)
+
+    Returns:
+        tuple: (fila para resumen_sesiones, resultados derivados pendientes de guardar)
+    """
+    summary = _empty_summary(session_id)
+    cache_id = session_id if use_cache else None
+    pending_writes = []
+
+    try:
+        from analysis.session_analyzer import SessionAnalyzer
+        from database.derived_cache import filter_ppg_cached, bpm_evolution_cached
+        from utils.signal_processing import OfflineEOGFilter
+
+        signals = DatabaseManager.get_session_signals(session_id, channels=("eog", "ppg"))
+        if not signals or not signals.get('ppg'):
+            summary['estado'] = STATUS_NO_DATA
+            return summary, pending_writes
+
+        ms_data = signals['ppg']['ms']
+        ppg_data = signals['ppg']['values']
+        summary['muestras'] = len(ppg_data)
+        if len(ppg_data) < 500:  # Mínimo ~4 segundos a 125 Hz
+            summary['estado'] = STATUS_INSUFFICIENT_DATA
+            return summary, pending_writes
+
+        time_seconds = (ms_data - ms_data[0]) / 1000.0
+        fs = len(ms_data) / time_seconds[-1] if time_seconds[-1] > 0 else 125
+        summary['duracion_min'] = float(time_seconds[-1] / 60.0)
+        summary['fs_estimada'] = float(fs)
+
+        # Filtrado PPG y calidad de la señal
+        filter_result = filter_ppg_cached(ppg_data, fs, session_id=cache_id,
+                                          pending_writes=pending_writes, **PPG_FILTER_PARAMS)
+        quality = filter_result['quality']
+        artifacts = filter_result.get('artifacts', [])
+        summary['calidad_ppg'] = quality.get('overall')
+        summary['snr_db'] = _optional_float(quality.get('snr_db'))
+        summary['artefactos'] = len(artifacts)
+        summary['artefactos_seg'] = float(sum(end - start for start, end, _ in artifacts) / fs)
+
+        # Evolución de BPM (un valor por segundo)
+        bpm_result = bpm_evolution_cached(filter_result['filtered'], ms_data, fs, session_id=cache_id,
+                                          pending_writes=pending_writes)
+        bpm_values = np.asarray(bpm_result['bpm_values'], dtype=float)
+        bpm_times = np.asarray(bpm_result['times_sec'], dtype=float)
+        valid = np.isfinite(bpm_values)
+        bpm_values, bpm_times = bpm_values[valid], bpm_times[valid]
+
+        analyzer = SessionAnalyzer(sample_rate=int(round(fs)))
+        if len(bpm_values) > 0:
+            third = max(1, len(bpm_values) // 3)
+            start_bpm = float(np.mean(bpm_values[:third]))
+            end_bpm = float(np.mean(bpm_values[-third:]))
+            summary.update({
+                'bpm_medio': float(np.mean(bpm_values)),
+                'bpm_std': float(np.std(bpm_values)),
+                'bpm_min': float(np.min(bpm_values)),
+                'bpm_max': float(np.max(bpm_values)),
+                'bpm_inicio': start_bpm,
+                'bpm_final': end_bpm,
+                'bpm_cambio_pct': (end_bpm - start_bpm) / start_bpm * 100 if start_bpm else None,
+            })
+
+            # Variabilidad sobre la serie de BPM a 1 Hz (misma definición que SessionAnalyzer)
+            hrv = analyzer._calculate_hrv_metrics(bpm_values, bpm_times)
+            if 'error' not in hrv:
+                summary['rmssd'] = _optional_float(hrv['rmssd'])
+                summary['sdnn'] = _optional_float(hrv['sdnn'])
+                summary['lf_hf'] = _optional_float(hrv['lf_hf_ratio'])
+
+        # Actividad ocular sobre la señal EOG filtrada (sin componente DC)
+        eog = signals.get('eog')
+        if eog and len(eog['values']) == len(ms_data):
+            eog_filtered = OfflineEOGFilter(fs=fs).filter_signal(eog['values'])['filtered']
+            eog_metrics = analyzer._calculate_eog_metrics(eog_filtered, time_seconds)
+            if 'error' not in eog_metrics:
+                summary['eog_rms'] = _optional_float(eog_metrics['rms'])
+                summary['eog_movimientos_seg'] = _optional_float(eog_metrics['movement_rate_per_second'])
+
+    except Exception as e:
+        summary['estado'] = STATUS_ERROR
+        summary['error'] = f"{type(e).__name__}: {e}"
+
+    return summary, pending_writes
+
+
+def run_cohort_analysis(patient_id=None, date_from=None, date_to=None, objective=None,
+                        force=False, workers=None, use_cache=True, progress=None):
+    """
+    Analizar en paralelo las sesiones que cumplen los filtros y guardar sus resúmenes.
+
+    Args:
+        patient_id: Solo sesiones de este paciente
+        date_from: Fecha inicial 'YYYY-MM-DD' (inclusive)
+        date_to: Fecha final 'YYYY-MM-DD' (inclusive)
+        objective: Solo sesiones con este objetivo
+        force: Re-analizar también las sesiones ya resumidas sin errores con la versión actual
+        workers: Procesos del pool (None = núcleos disponibles)
+        use_cache: Reutilizar/guardar filtrado PPG y BPM en resultados_derivados
+        progress: callback(procesadas, total, fila) llamado tras cada sesión
+
+    Returns:
+        dict: {'sessions': analizadas, 'errors': sesiones con error,
+               'no_data': sesiones sin datos PPG suficientes, 'total': seleccionadas}
+    """
+    sessions = DatabaseManager.get_sessions_for_cohort(
+        patient_id=patient_id, date_from=date_from, date_to=date_to, objective=objective,
+        pending_version=None if force else ANALYSIS_VERSION
+    ) or []
+    stats = {'sessions': 0, 'errors': 0, 'no_data': 0, 'total': len(sessions)}
+    if not sessions:
+        return stats
+
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    pending_rows = []
+
+    # Un solo escritor (este proceso): los procesos del pool solo leen y
+    # devuelven sus resultados derivados nuevos para guardarlos aquí
+    with ProcessPoolExecutor(max_workers=min(workers, len(sessions))) as pool:
+        futures = {pool.submit(analyze_session, session['id'], use_cache): session['id']
+                   for session in sessions}
+        for future in as_completed(futures):
+            try:
+                row, derived_results = future.result()
+            except Exception as e:
+                # Fallo del proceso (no del análisis): la sesión queda pendiente
+                row, derived_results = _empty_summary(futures[future]), []
+                row['estado'] = STATUS_ERROR
+                row['error'] = f"{type(e).__name__}: {e}"
+
+            if derived_results:
+                save_pending_writes(derived_results)
+            pending_rows.append(row)
+            stats['sessions'] += 1
+            if row['estado'] == STATUS_ERROR:
+                stats['errors'] += 1
+            elif row['estado'] != STATUS_COMPLETE:
+                stats['no_data'] += 1
+            if progress:
+                progress(stats['sessions'], stats['total'], row)
+
+            if len(pending_rows) >= WRITE_BATCH_SIZE:
+                DatabaseManager.save_session_summaries(pending_rows)
+                pending_rows = []
+
+    DatabaseManager.save_session_summaries(pending_rows)
+    return stats
+
+
+def export_summaries_csv(path, **filters):
+    """
+    Exportar a CSV los resúmenes (con datos clínicos) que cumplen los filtros.
+
+    Args:
+        path: Ruta del archivo CSV
+        **filters: patient_id, date_from, date_to, objective
+
+    Returns:
+        int: Número de filas exportadas
+    """
+    rows = DatabaseManager.get_session_summaries(**filters) or []
+    if not rows:
+        return 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    return len(rows)
+
+
+def _print_progress(done, total, row):
+    """Mostrar el avance del lote en consola."""
+    if row['estado'] == STATUS_ERROR:
+        status = f"⚠️ {row['error']}"
+    elif row['estado'] != STATUS_COMPLETE:
+        status = f"ℹ️ {row['estado']} ({row['muestras']} muestras)"
+    else:
+        status = f"BPM medio {row['bpm_medio'] or 0:.1f}"
+    print(f"[{done}/{total}] Sesión {row['id_sesion']}: {status}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Análisis por lotes de sesiones EMDR")
+    parser.add_argument('--paciente', type=int, help="ID del paciente")
+    parser.add_argument('--desde', help="Fecha inicial YYYY-MM-DD")
+    parser.add_argument('--hasta', help="Fecha final YYYY-MM-DD")
+    parser.add_argument('--objetivo', help="Objetivo/tipo de sesión")
+    parser.add_argument('--todas', action='store_true', help="Re-analizar sesiones ya resumidas")
+    parser.add_argument('--procesos', type=int, help="Número de procesos")
+    parser.add_argument('--sin-cache', action='store_true', help="No usar la caché de resultados derivados")
+    parser.add_argument('--csv', help="Exportar los resúmenes filtrados a este CSV")
+    args = parser.parse_args()
+
+    filters = {'patient_id': args.paciente, 'date_from': args.desde,
+               'date_to': args.hasta, 'objective': args.objetivo}
+
+    result = run_cohort_analysis(force=args.todas, workers=args.procesos,
+                                 use_cache=not args.sin_cache, progress=_print_progress, **filters)
+    print(f"Sesiones analizadas: {result['sessions']} de {result['total']} "
+          f"({result['errors']} con errores, {result['no_data']} sin datos suficientes)")
+
+    for month in DatabaseManager.get_monthly_outcomes(**filters) or []:
+        reduction = month['reduccion_sud']
+        print(f"  {month['mes']}: {month['sesiones']} sesiones, {month['pacientes']} pacientes, "
+              f"reducción SUD media {reduction if reduction is None else round(reduction, 1)}, "
+              f"BPM medio {month['bpm_medio'] or 0:.1f}")
+
+    if args.csv:
+        exported = export_summaries_csv(args.csv, **filters)
+        print(f"📄 {exported} filas exportadas a {args.csv}")
@@ -0,0 +1,219 @@
+"""
+Estadísticas por segmentos de una señal en una sola pasada.
+
+Los análisis de sesión calculan medias, desviaciones, extremos y tendencias
+sobre muchos tramos de la misma señal (segmentos temporales, ventanas
+deslizantes de 5 minutos, ventanas de 30 s hacia delante). En lugar de
+construir una máscara booleana de longitud completa por tramo, los tramos se
+describen como intervalos semiabiertos [inicio, fin) de índices (obtenidos
+con searchsorted sobre los tiempos) y se reducen todos a la vez con
+np.ufunc.reduceat. El coste es el de unas pocas pasadas sobre la señal
+aunque haya cientos de segmentos (p.ej. uno cada 30 s o uno por set
+bilateral).
+
+Uso:
+    starts, stops, edges = segment_bounds(tiempos, segment_seconds=30)
+    stats = SegmentedStats(bpm, starts, stops)
+    medias, desviaciones = stats.mean(), stats.std()
+"""
+
+import numpy as np
+
+
+def segment_bounds(time_seconds, n_segments=None, segment_seconds=None, edges=None):
+    """
+    Índices [inicio, fin) de segmentos temporales consecutivos.
+
+    Se usa la primera opción indicada: límites explícitos, duración fija o
+    número de segmentos iguales (6 por defecto). Cada muestra pertenece a un
+    único segmento; la última muestra se incluye en el último segmento.
+
+    Args:
+        time_seconds: Tiempos no decrecientes (s)
+        n_segments: Número de segmentos de igual duración
+        segment_seconds: Duración de cada segmento (s); el último puede ser más corto
+        edges: Límites explícitos en segundos (p.ej. inicio de cada set bilateral)
+
+    Returns:
+        tuple: (inicios, fines, límites) con límites de longitud n_segmentos + 1
+    """
+    time_seconds = np.asarray(time_seconds)
+    if len(time_seconds) == 0:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty, np.empty(0)
+
+    t_start, t_end = float(time_seconds[0]), float(time_seconds[-1])
+    if edges is not None:
+        edges = np.asarray(edges, dtype=float)
+    elif segment_seconds is not None:
+        n = max(1, int(np.ceil((t_end - t_start) / segment_seconds)))
+        edges = t_start + np.arange(n + 1) * float(segment_seconds)
+    else:
+        edges = np.linspace(t_start, t_end, (n_segments or 6) + 1)
+
+    starts = np.searchsorted(time_seconds, edges[:-1], side='left')
+    stops = np.searchsorted(time_seconds, edges[1:], side='left')
+    if len(stops) and edges[-1] >= t_end:
+        stops[-1] = np.searchsorted(time_seconds, edges[-1], side='right')
+    return starts, np.maximum(stops, starts), edges
+
+
+def window_bounds(time_seconds, window_starts, window_seconds):
+    """
+    Índices de ventanas cerradas [t, t + window_seconds] (pueden solaparse).
+
+    Args:
+        time_seconds: Tiempos no decrecientes (s)
+        window_starts: Tiempo inicial de cada ventana (s)
+        window_seconds: Duración de las ventanas (s)
+
+    Returns:
+        tuple: (inicios, fines) con fin exclusivo
+    """
+    time_seconds = np.asarray(time_seconds)
+    window_starts = np.asarray(window_starts, dtype=float)
+    starts = np.searchsorted(time_seconds, window_starts, side='left')
+    stops = np.searchsorted(time_seconds, window_starts + window_seconds, side='right')
+    return starts, np.maximum(stops, starts)
+
+
+class SegmentedStats:
+    """
+    Reducciones de una señal sobre muchos intervalos [inicio, fin) a la vez.
+
+    Los intervalos pueden estar desordenados, solaparse o estar vacíos; los
+    resultados de intervalos vacíos son NaN. Cada estadística se calcula
+    una sola vez con reduceat y se reutiliza.
+    """
+
+    def __init__(self, values, starts, stops):
+        """
+        Args:
+            values: Array 1D con la señal
+            starts: Inicios de los intervalos
+            stops: Fines (exclusivos) de los intervalos
+        """
+        values = np.asarray(values)
+        self.starts = np.clip(np.asarray(starts, dtype=np.intp), 0, len(values))
+        self.stops = np.clip(np.asarray(stops, dtype=np.intp), self.starts, len(values))
+        self.count = self.stops - self.starts
+        self._empty = self.count == 0
+
+        # Intervalos intercalados (inicio, fin): reduceat reduce cada par y los
+        # resultados impares (entre intervalos) se descartan. Una muestra extra
+        # al final permite que 'fin' valga len(values).
+        self._indices = np.column_stack((self.starts, self.stops)).ravel()
+        self._values = np.append(values, values[-1:] if len(values) else 0)
+        # Desplazar por la media global evita cancelaciones en varianza y tendencia
+        self._offset = float(np.mean(values)) if len(values) else 0.0
+        self._cache = {}
+
+    def _reduce(self, ufunc, values):
+        """Aplicar ufunc.reduceat a cada intervalo (NaN en los vacíos)."""
+        if len(self._indices) == 0:
+            return np.empty(0)
+        result = ufunc.reduceat(values, self._indices)[::2].astype(float)
+        result[self._empty] = np.nan
+        return result
+
+    def _cached(self, name, compute):
+        if name not in self._cache:
+            self._cache[name] = compute()
+        return self._cache[name]
+
+    def _centered(self):
+        return self._cached('centered', lambda: self._values.astype(float) - self._offset)
+
+    def _centered_sum(self):
+        return self._cached('centered_sum', lambda: self._reduce(np.add, self._centered()))
+
+    def sum(self):
+        """Suma de cada intervalo."""
+        return self._centered_sum() + self._offset * self.count
+
+    def mean(self):
+        """Media de cada intervalo."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self._centered_sum() / self.count + self._offset
+
+    def std(self):
+        """Desviación típica poblacional (ddof=0, como np.std) de cada intervalo."""
+        def compute():
+            centered = self._centered()
+            squares = self._reduce(np.add, centered * centered)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                local_mean = self._centered_sum() / self.count
+                variance = squares / self.count - local_mean ** 2
+            return np.sqrt(np.maximum(variance, 0))
+        return self._cached('std', compute)
+
+    def min(self):
+        """Mínimo de cada intervalo."""
+        return self._cached('min', lambda: self._reduce(np.minimum, self._values))
+
+    def max(self):
+        """Máximo de cada intervalo."""
+        return self._cached('max', lambda: self._reduce(np.maximum, self._values))
+
+    def peak_to_peak(self):
+        """Amplitud (máximo - mínimo) de cada intervalo."""
+        return self.max() - self.min()
+
+    def slope(self):
+        """
+        Pendiente de la recta de regresión de cada intervalo frente al índice
+        local de muestra (0, 1, 2...), igual que stats.linregress(arange(n), x).
+        NaN en intervalos de menos de 2 muestras.
+        """
+        def compute():
+            centered = self._centered()
+            weighted = self._reduce(np.add, np.arange(len(centered)) * centered)
+            m = self.count.astype(float)
+            # Σ (k - k̄)·y con k local = i - inicio y k̄ = (m - 1) / 2
+            covariance = weighted - (self.starts + (m - 1) / 2) * self._centered_sum()
+            with np.errstate(invalid='ignore', divide='ignore'):
+                slope = covariance / (m * (m * m - 1) / 12)
+            slope[m < 2] = np.nan
+            return slope
+        return self._cached('slope', compute)
+
+
+def window_max(values, starts, stops):
+    """
+    Máximo de muchos intervalos largos y solapados (p.ej. una ventana por muestra).
+
+    Usa máximos por potencias de dos: el nivel k guarda max(values[i:i + 2^k])
+    y cada intervalo se cubre con dos bloques del nivel adecuado. Coste
+    O(n log n) con memoria O(n), independiente de la longitud de las ventanas.
+
+    Args:
+        values: Array 1D con la señal
+        starts: Inicios de los intervalos
+        stops: Fines (exclusivos) de los intervalos
+
+    Returns:
+        np.ndarray: Máximo de cada intervalo (NaN si está vacío)
+    """
+    values = np.asarray(values, dtype=float)
+    starts = np.asarray(starts, dtype=np.intp)
+    stops = np.asarray(stops, dtype=np.intp)
+    lengths = stops - starts
+
+    result = np.full(len(starts), np.nan)
+    valid = lengths > 0
+    if not valid.any():
+        return result
+
+    levels = np.zeros(len(starts), dtype=np.intp)
+    levels[valid] = np.floor(np.log2(lengths[valid])).astype(np.intp)
+
+    level_values = values
+    width = 1
+    for level in range(int(levels[valid].max()) + 1):
+        selected = valid & (levels == level)
+        if selected.any():
+            result[selected] = np.maximum(level_values[starts[selected]],
+                                          level_values[stops[selected] - width])
+        level_values = np.maximum(level_values[:-width], level_values[width:])
+        width *= 2
+    return result
@@ -6,56 +6,51 @@ import sqlite3
 from scipy import signal, stats
 from collections import deque
 
+from analysis.segment_stats import SegmentedStats, segment_bounds, window_bounds, window_max
+
 class SessionAnalyzer:
     """Analizador principal para sesiones EMDR con métricas avanzadas"""
     
-    def __init__(self, sample_rate: int = 125):
+    def __init__(self, sample_rate: int = 125, n_segments: int = 6,
+                 segment_seconds: Optional[float] = None):
+        """
+        Args:
+            sample_rate: Frecuencia de muestreo (Hz)
+            n_segments: Segmentos iguales del análisis temporal
+            segment_seconds: Si se indica, segmentos de esta duración (p.ej. 30 s)
+                             en lugar de n_segments
+        """
         self.sample_rate = sample_rate
+        self.n_segments = n_segments
+        self.segment_seconds = segment_seconds
+        
+    def load_session_data(self, session_id: int) -> Optional["SessionSignals"]:
+        """
+        Carga una sesión desde la base de datos con acceso perezoso a sus señales
         
-    def load_session_data(self, session_id: int) -> Optional[Dict]:
-        """Carga datos de una sesión desde la base de datos"""
-        from src.database.database_manager import DatabaseManager
+        Devuelve un SessionSignals: se usa como el diccionario de sesión
+        ('timestamps', 'eog_data', 'ppg_data', 'bpm_data', 'id', 'patient_id',
+        'fecha', 'comentarios'...), pero cada canal se lee y decodifica (con su
+        tipo de almacenamiento) solo cuando se accede a él.
+        """
+        from database.session_signals import SessionSignals
         
         try:
-            # Obtener metadatos de la sesión
-            session = DatabaseManager.get_session(session_id)
-            if not session:
-                return None
-                
-            # Deserializar datos binarios
-            session_data = {
-                'id': session['id'],
-                'patient_id': session['id_paciente'],
-                'fecha': session['fecha'],
-                'comentarios': session['comentarios'],
-                'timestamps': self._deserialize_blob(session['datos_ms']),
-                'eog_data': self._deserialize_blob(session['datos_eog']),
-                'ppg_data': self._deserialize_blob(session['datos_ppg']),
-                'bpm_data': self._deserialize_blob(session['datos_bpm'])
-            }
-            
-            return session_data
+            return SessionSignals.load(session_id)
             
         except Exception as e:
             print(f"Error cargando sesión {session_id}: {e}")
             return None
     
-    def _deserialize_blob(self, blob_data) -> np.ndarray:
-        """Deserializa datos BLOB a numpy array"""
-        if blob_data is None:
-            return np.array([])
-        
-        # Convertir BLOB a numpy array (ajustar según formato usado)
-        # Asumiendo que se guardó como array de float64
-        return np.frombuffer(blob_data, dtype=np.float64)
-    
     def calculate_comprehensive_metrics(self, session_data: Dict) -> Dict:
         """Calcula métricas comprehensivas de la sesión"""
         
         timestamps = session_data['timestamps']
-        eog_data = session_data['eog_data']
-        ppg_data = session_data['ppg_data']
-        bpm_data = session_data['bpm_data']
+        # Las señales se almacenan como int16/float32: las métricas se calculan
+        # en float64 para evitar desbordamientos (cuadrados, diferencias)
+        eog_data = np.asarray(session_data['eog_data'], dtype=np.float64)
+        ppg_data = np.asarray(session_data['ppg_data'], dtype=np.float64)
+        bpm_data = np.asarray(session_data['bpm_data'], dtype=np.float64)
         
         # Convertir timestamps a tiempo relativo en segundos
         time_seconds = (timestamps - timestamps[0]) / 1000.0
@@ -185,21 +180,18 @@ class SessionAnalyzer:
             
         smoothed_bpm = signal.savgol_filter(bpm_data, window_size, 3)
         
-        # Detectar aumentos súbitos (> 10 BPM en < 30 segundos)
-        stress_peaks = []
+        # Detectar aumentos súbitos (> 10 BPM en < 30 segundos): máximo de la
+        # ventana de 30 segundos hacia adelante de cada muestra, todas a la vez
         threshold = 10  # BPM
         
-        for i in range(len(smoothed_bpm) - 1):
-            current_time = time_seconds[i]
-            
-            # Buscar ventana de 30 segundos hacia adelante
-            future_idx = np.where(time_seconds <= current_time + 30)[0]
-            if len(future_idx) > 0:
-                future_max = np.max(smoothed_bpm[i:future_idx[-1]])
-                if future_max - smoothed_bpm[i] > threshold:
-                    stress_peaks.append(current_time)
-        
-        return stress_peaks
+        starts = np.arange(len(smoothed_bpm) - 1)
+        stops = np.searchsorted(time_seconds, time_seconds[:-1] + 30, side='right') - 1
+        future_max = window_max(smoothed_bpm, starts, stops)
+        
+        with np.errstate(invalid='ignore'):
+            is_peak = future_max - smoothed_bpm[:-1] > threshold
+        
+        return time_seconds[:-1][is_peak].tolist()
     
     def _calculate_relaxation_metrics(self, bpm_data: np.ndarray, time_seconds: np.ndarray) -> Dict:
         """Calcula métricas de tendencias de relajación"""
@@ -207,25 +199,24 @@ class SessionAnalyzer:
         if len(bpm_data) < 20:
             return {'error': 'Datos insuficientes para análisis de relajación'}
         
-        # Análisis por ventanas deslizantes de 5 minutos
+        # Análisis por ventanas deslizantes de 5 minutos (avance de 1 minuto)
         window_duration = 300  # 5 minutos en segundos
-        window_metrics = []
-        
-        current_time = 0
-        while current_time + window_duration <= time_seconds[-1]:
-            # Seleccionar datos en la ventana
-            window_mask = (time_seconds >= current_time) & (time_seconds <= current_time + window_duration)
-            window_bpm = bpm_data[window_mask]
-            
-            if len(window_bpm) > 10:
-                window_metrics.append({
-                    'time_start': current_time,
-                    'mean_bpm': np.mean(window_bpm),
-                    'std_bpm': np.std(window_bpm),
-                    'trend_slope': self._calculate_local_trend(window_bpm)
-                })
-            
-            current_time += 60  # Avanzar 1 minuto
+        n_windows = int((time_seconds[-1] - window_duration) // 60) + 1 if time_seconds[-1] >= window_duration else 0
+        window_times = np.arange(n_windows) * 60
+        
+        starts, stops = window_bounds(time_seconds, window_times, window_duration)
+        window_stats = SegmentedStats(bpm_data, starts, stops)
+        means, stds, slopes = window_stats.mean(), window_stats.std(), window_stats.slope()
+        
+        window_metrics = [
+            {
+                'time_start': int(window_times[i]),
+                'mean_bpm': float(means[i]),
+                'std_bpm': float(stds[i]),
+                'trend_slope': float(slopes[i])
+            }
+            for i in np.flatnonzero(window_stats.count > 10)
+        ]
         
         # Identificar períodos de relajación (BPM decreciente y estable)
         relaxation_periods = []
@@ -238,13 +229,16 @@ class SessionAnalyzer:
         total_relaxation_time = len(relaxation_periods) * 60  # en segundos
         relaxation_percentage = (total_relaxation_time / time_seconds[-1]) * 100
         
+        # BPM basal (percentil 10) y baseline de recuperación (percentil 25) en una sola pasada
+        baseline_bpm, recovery_baseline = np.percentile(bpm_data, [10, 25])
+        
         return {
             'window_analysis': window_metrics,
             'relaxation_periods': relaxation_periods,
             'total_relaxation_time_minutes': float(total_relaxation_time / 60),
             'relaxation_percentage': float(relaxation_percentage),
-            'baseline_bpm': float(np.percentile(bpm_data, 10)),  # BPM basal (percentil 10)
-            'recovery_rate': self._calculate_recovery_rate(bpm_data, time_seconds)
+            'baseline_bpm': float(baseline_bpm),  # BPM basal (percentil 10)
+            'recovery_rate': self._calculate_recovery_rate(bpm_data, time_seconds, recovery_baseline)
         }
     
     def _calculate_local_trend(self, data: np.ndarray) -> float:
@@ -256,25 +250,25 @@ class SessionAnalyzer:
         slope, _, _, _, _ = stats.linregress(x, data)
         return float(slope)
     
-    def _calculate_recovery_rate(self, bpm_data: np.ndarray, time_seconds: np.ndarray) -> float:
+    def _calculate_recovery_rate(self, bpm_data: np.ndarray, time_seconds: np.ndarray,
+                                 baseline: Optional[float] = None) -> float:
         """Calcula la tasa de recuperación cardiovascular"""
         
         # Buscar el BPM máximo y ver qué tan rápido vuelve al baseline
-        max_bpm_idx = np.argmax(bpm_data)
+        max_bpm_idx = int(np.argmax(bpm_data))
         max_bpm = bpm_data[max_bpm_idx]
-        baseline = np.percentile(bpm_data, 25)  # Baseline más conservador
+        if baseline is None:
+            baseline = np.percentile(bpm_data, 25)  # Baseline más conservador
         
         # Buscar cuánto tarda en volver al 80% del camino al baseline
         target_bpm = max_bpm - 0.8 * (max_bpm - baseline)
         
-        # Buscar después del pico máximo
-        post_peak_data = bpm_data[max_bpm_idx:]
-        post_peak_times = time_seconds[max_bpm_idx:]
-        
-        recovery_idx = np.where(post_peak_data <= target_bpm)[0]
+        # Primera muestra después del pico máximo que alcanza el objetivo
+        recovered = bpm_data[max_bpm_idx:] <= target_bpm
+        recovery_idx = int(np.argmax(recovered))
         
-        if len(recovery_idx) > 0:
-            recovery_time = post_peak_times[recovery_idx[0]] - post_peak_times[0]
+        if recovered[recovery_idx]:
+            recovery_time = time_seconds[max_bpm_idx + recovery_idx] - time_seconds[max_bpm_idx]
             return float(recovery_time)  # tiempo en segundos
         
         return float('inf')  # No se recuperó en la sesión
@@ -319,37 +313,42 @@ class SessionAnalyzer:
         }
     
     def _calculate_temporal_analysis(self, bpm_data: np.ndarray, ppg_data: np.ndarray, 
-                                   eog_data: np.ndarray, time_seconds: np.ndarray) -> Dict:
-        """Análisis temporal por segmentos de la sesión"""
-        
-        # Dividir sesión en 6 segmentos de ~8 minutos cada uno
-        n_segments = 6
-        segment_duration = time_seconds[-1] / n_segments
-        
-        segment_analysis = []
-        
-        for i in range(n_segments):
-            start_time = i * segment_duration
-            end_time = (i + 1) * segment_duration
-            
-            # Seleccionar datos del segmento
-            segment_mask = (time_seconds >= start_time) & (time_seconds <= end_time)
-            
-            seg_bpm = bpm_data[segment_mask]
-            seg_ppg = ppg_data[segment_mask]
-            seg_eog = eog_data[segment_mask]
-            
-            if len(seg_bpm) > 5:
-                segment_metrics = {
-                    'segment': i + 1,
-                    'time_start_minutes': float(start_time / 60),
-                    'time_end_minutes': float(end_time / 60),
-                    'mean_bpm': float(np.mean(seg_bpm)),
-                    'std_bpm': float(np.std(seg_bpm)),
-                    'ppg_amplitude': float(np.max(seg_ppg) - np.min(seg_ppg)) if len(seg_ppg) > 0 else 0,
-                    'eog_activity': float(np.std(seg_eog)) if len(seg_eog) > 0 else 0
-                }
-                segment_analysis.append(segment_metrics)
+                                   eog_data: np.ndarray, time_seconds: np.ndarray,
+                                   n_segments: Optional[int] = None,
+                                   segment_seconds: Optional[float] = None,
+                                   segment_edges: Optional[List[float]] = None) -> Dict:
+        """
+        Análisis temporal por segmentos de la sesión
+        
+        Por defecto usa la segmentación del analizador (6 segmentos iguales o
+        segment_seconds); segment_edges permite límites explícitos en segundos
+        (p.ej. el inicio de cada set bilateral).
+        """
+        
+        if segment_edges is None and n_segments is None and segment_seconds is None:
+            n_segments, segment_seconds = self.n_segments, self.segment_seconds
+        
+        # Límites de todos los segmentos con searchsorted y reducciones en una pasada
+        starts, stops, edges = segment_bounds(time_seconds, n_segments=n_segments,
+                                              segment_seconds=segment_seconds,
+                                              edges=segment_edges)
+        bpm_stats = SegmentedStats(bpm_data, starts, stops)
+        ppg_amplitude = SegmentedStats(ppg_data, starts, stops).peak_to_peak()
+        eog_activity = SegmentedStats(eog_data, starts, stops).std()
+        mean_bpm, std_bpm = bpm_stats.mean(), bpm_stats.std()
+        
+        segment_analysis = [
+            {
+                'segment': int(i) + 1,
+                'time_start_minutes': float(edges[i] / 60),
+                'time_end_minutes': float(edges[i + 1] / 60),
+                'mean_bpm': float(mean_bpm[i]),
+                'std_bpm': float(std_bpm[i]),
+                'ppg_amplitude': float(ppg_amplitude[i]),
+                'eog_activity': float(eog_activity[i])
+            }
+            for i in np.flatnonzero(bpm_stats.count > 5)
+        ]
         
         return {
             'segments': segment_analysis,
@@ -0,0 +1,214 @@
+"""
+Conexiones SQLite reutilizadas por hilo, con pragmas ajustados y transacciones explícitas.
+
+Antes cada método de DatabaseManager abría una conexión nueva, activaba las
+llaves foráneas y la cerraba tras una sola consulta; en la base de datos
+compartida en una unidad de red, abrir la conexión era la mayor parte del
+tiempo de las consultas pequeñas. Ahora cada hilo conserva su conexión,
+configurada una sola vez:
+
+    - journal_mode=WAL y synchronous=NORMAL: lectores y escritor no se
+      bloquean y cada commit no fuerza un fsync del archivo principal
+      (en WAL, NORMAL no arriesga la integridad ante un corte de energía)
+    - cache_size y mmap_size: páginas calientes en memoria entre consultas
+    - cached_statements: las sentencias parametrizadas se preparan una vez
+      por conexión y se reutilizan
+    - busy_timeout: esperar en lugar de fallar si otro proceso escribe
+
+WAL necesita memoria compartida entre procesos y no funciona sobre
+unidades de red; en ese caso se mantiene el journal clásico (DELETE) con
+synchronous=FULL, porque con ese journal NORMAL puede corromper la base de
+datos ante un corte de energía, y no se usa mmap. Se conserva la
+reutilización de la conexión.
+
+Uso:
+    conn = connection_manager.connection()       # conexión del hilo actual
+
+    with connection_manager.transaction():       # varias operaciones, un commit
+        DatabaseManager.add_session(...)
+        DatabaseManager.save_session_summaries(...)
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+
+from database import db_connection
+
+# Configuración de cada conexión
+CACHE_SIZE_KIB = 64 * 1024           # 64 MB de caché de páginas
+MMAP_SIZE_BYTES = 256 * 1024 * 1024  # 256 MB mapeados en memoria
+CACHED_STATEMENTS = 256              # Sentencias preparadas por conexión
+BUSY_TIMEOUT_SECONDS = 30
+
+
+def is_network_path(path):
+    """True si la ruta está en una unidad de red (UNC o unidad mapeada en Windows)."""
+    path = os.path.abspath(path)
+    if path.startswith(('\\\\', '//')):
+        return True
+    if sys.platform == 'win32':
+        import ctypes
+        drive = os.path.splitdrive(path)[0]
+        if drive:
+            DRIVE_REMOTE = 4
+            return ctypes.windll.kernel32.GetDriveTypeW(drive + '\\') == DRIVE_REMOTE
+    return False
+
+
+class _TransactionConnection:
+    """
+    Conexión vista por los métodos llamados dentro de transaction(): sus
+    commit() individuales se ignoran para que el conjunto se confirme (o se
+    deshaga) de una vez al salir del bloque.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def commit(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class ConnectionManager:
+    """Una conexión configurada por hilo (y por proceso) para la base de datos."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _open(self, path):
+        """Abrir y configurar una conexión nueva."""
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS,
+                               cached_statements=CACHED_STATEMENTS)
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+
+        if is_network_path(path):
+            conn.execute("PRAGMA journal_mode = DELETE")
+            conn.execute("PRAGMA synchronous = FULL")
+        else:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE_BYTES}")
+        return conn
+
+    def connection(self):
+        """
+        Conexión del hilo actual (se abre la primera vez).
+
+        Se vuelve a abrir si cambió la ruta de la base de datos o si el
+        proceso es un hijo creado con fork (una conexión SQLite no puede
+        compartirse entre procesos).
+
+        Returns:
+            sqlite3.Connection
+        """
+        local = self._local
+        path = db_connection.DB_PATH
+        conn = getattr(local, 'conn', None)
+
+        if conn is not None and (local.pid != os.getpid() or local.path != path):
+            if local.pid == os.getpid():
+                conn.close()
+            conn = None
+
+        if conn is None:
+            conn = self._open(path)
+            local.conn, local.path, local.pid = conn, path, os.getpid()
+            local.depth = 0
+            local.calls = 0
+        return conn
+
+    @property
+    def in_transaction(self):
+        """True si el hilo actual está dentro de un bloque transaction()."""
+        return getattr(self._local, 'depth', 0) > 0 and self._local.pid == os.getpid()
+
+    def current(self):
+        """
+        Conexión para un método de DatabaseManager: la del hilo, o su vista
+        transaccional si hay un bloque transaction() abierto.
+        """
+        conn = self.connection()
+        return _TransactionConnection(conn) if self.in_transaction else conn
+
+    @contextmanager
+    def borrow(self):
+        """
+        Prestar la conexión del hilo a una operación (la usa secure_connection).
+
+        Fuera de un bloque transaction(), al terminar la operación más externa
+        se deshace cualquier cambio que no se haya confirmado, igual que
+        ocurría al cerrar la conexión por operación.
+
+        Yields:
+            Conexión del hilo (o su vista transaccional)
+        """
+        conn = self.current()
+        local = self._local
+        local.calls = getattr(local, 'calls', 0) + 1
+        try:
+            yield conn
+        finally:
+            local.calls -= 1
+            raw = self.connection()
+            if local.calls == 0 and not self.in_transaction and raw.in_transaction:
+                raw.rollback()
+
+    @contextmanager
+    def transaction(self, immediate=True):
+        """
+        Agrupar varias operaciones en una sola transacción.
+
+        Los bloques anidados se integran en el más externo. Si se produce
+        una excepción se deshace todo y la excepción se propaga.
+
+        Args:
+            immediate: Tomar el bloqueo de escritura al empezar (BEGIN IMMEDIATE)
+                       para no fallar a mitad de la transacción
+
+        Yields:
+            sqlite3.Connection: Conexión del hilo
+        """
+        conn = self.connection()
+        local = self._local
+        if local.depth > 0:
+            local.depth += 1
+            try:
+                yield conn
+            finally:
+                local.depth -= 1
+            return
+
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+        local.depth = 1
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+        finally:
+            local.depth = 0
+
+    def close(self):
+        """Cerrar la conexión del hilo actual (p.ej. al terminar un hilo de trabajo)."""
+        local = self._local
+        conn = getattr(local, 'conn', None)
+        if conn is not None and local.pid == os.getpid():
+            conn.close()
+        local.conn = None
+        local.depth = 0
+
+
+# Instancia compartida por toda la aplicación
+connection_manager = ConnectionManager()
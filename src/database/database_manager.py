@@ -1,32 +1,46 @@
+import functools
+import re
 import sqlite3
 from datetime import datetime, date
 import hashlib
 import secrets
-from typing import List, Dict, Tuple, Optional, Union, Any
+from typing import List, Dict, Tuple, Optional, Union, Any, Sequence
+
+import numpy as np
 
 # Importar la conexión base
 from database.db_connection import get_connection
+from database.connection_manager import connection_manager
+from database.signal_codec import (encode_signal, decode_legacy_signal, is_encoded,
+                                   read_chunked, SignalReader)
+from utils.decimation import minmax_decimate
+
+# Tipo de almacenamiento de cada señal de la sesión y frecuencia de muestreo
+SIGNAL_DTYPES = {
+    "ms": np.int32,     # Timestamps en milisegundos
+    "eog": np.int16,    # Valores crudos del ADC
+    "ppg": np.int16,    # Valores crudos del ADC
+    "bpm": np.float32,  # BPM calculado en línea
+}
+SIGNAL_SAMPLE_RATE = 125
 
 # Definir el decorador fuera de la clase
 def secure_connection(func):
-    """Decorador para asegurar conexiones y manejo de excepciones"""
+    """
+    Decorador que entrega a cada método la conexión reutilizada del hilo y maneja las excepciones
+    Dentro de connection_manager.transaction() los errores se propagan para deshacer el bloque
+    """
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = None
         try:
-            conn = get_connection()
-            # Habilitar llaves foráneas
-            conn.execute("PRAGMA foreign_keys = ON")
-            # Añadir la conexión a los argumentos
-            result = func(*args, conn=conn, **kwargs)
-            return result
+            with connection_manager.borrow() as conn:
+                # Añadir la conexión a los argumentos
+                return func(*args, conn=conn, **kwargs)
         except sqlite3.Error as e:
-            if conn:
-                conn.rollback()
             print(f"Error en la base de datos: {e}")
+            if connection_manager.in_transaction:
+                raise
             return None
-        finally:
-            if conn:
-                conn.close()
     return wrapper
 
 class DatabaseManager:
@@ -36,6 +50,21 @@ class DatabaseManager:
     """
 
     # ===== MÉTODOS AUXILIARES =====
+    @staticmethod
+    def transaction(immediate: bool = True):
+        """
+        Agrupa varias operaciones de DatabaseManager en una sola transacción
+        Uso:
+            with DatabaseManager.transaction():
+                DatabaseManager.add_diagnosis(...)
+                DatabaseManager.update_patient(...)
+        Args:
+            immediate: Tomar el bloqueo de escritura al empezar (BEGIN IMMEDIATE)
+        Returns:
+            Context manager; al salir hace commit, o rollback si hubo una excepción
+        """
+        return connection_manager.transaction(immediate)
+
     @staticmethod
     def calculate_age(birth_date_str):
         """
@@ -74,6 +103,22 @@ class DatabaseManager:
             print(f"Error calculando edad para fecha {birth_date_str}: {e}")
             return 0
 
+    @staticmethod
+    def build_fts_query(text: str) -> Optional[str]:
+        """
+        Convierte el texto escrito por el usuario en una consulta FTS5 por prefijos
+        Cada palabra debe aparecer como inicio de algún término ("ana ram" encuentra
+        "Ana Ramírez"); los operadores de FTS5 del texto no se interpretan
+        Args:
+            text: Texto de búsqueda
+        Returns:
+            Consulta para MATCH, o None si el texto no contiene palabras
+        """
+        words = re.findall(r"[^\W_]+", text or "")
+        if not words:
+            return None
+        return " ".join(f'"{word}"*' for word in words)
+
     # ===== MÉTODOS PARA PACIENTES =====
     @staticmethod
     @secure_connection
@@ -104,6 +149,57 @@ class DatabaseManager:
             for p in patients
         ]
     
+    @staticmethod
+    @secure_connection
+    def get_patients_with_session_stats(conn=None) -> List[Dict[str, Any]]:
+        """
+        Obtiene todos los pacientes (como get_all_patients) junto con sus estadísticas
+        de sesiones y diagnósticos, en una sola consulta agregada
+        Las agregaciones se resuelven con los índices (id_paciente, fecha) de sesiones e
+        (id_paciente, estado) de diagnosticos, sin leer las filas de las tablas
+        Returns:
+            Lista de pacientes con 'num_sesiones', 'ultima_sesion' (fecha o None)
+            y 'diagnosticos_activos'
+        """
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT p.id, p.apellido_paterno, p.apellido_materno, p.nombre, p.fecha_nacimiento,
+                   p.celular, p.fecha_registro, p.comentarios,
+                   COALESCE(s.num_sesiones, 0), s.ultima_sesion, COALESCE(d.activos, 0)
+            FROM pacientes p
+            LEFT JOIN (
+                SELECT id_paciente, COUNT(*) AS num_sesiones, MAX(fecha) AS ultima_sesion
+                FROM sesiones
+                GROUP BY id_paciente
+            ) s ON s.id_paciente = p.id
+            LEFT JOIN (
+                SELECT id_paciente, COUNT(*) AS activos
+                FROM diagnosticos
+                WHERE estado = 'activo'
+                GROUP BY id_paciente
+            ) d ON d.id_paciente = p.id
+            ORDER BY p.apellido_paterno, p.apellido_materno, p.nombre
+        """)
+        patients = cursor.fetchall()
+        
+        return [
+            {
+                "id": p[0], 
+                "apellido_paterno": p[1],
+                "apellido_materno": p[2],
+                "nombre": p[3],
+                "fecha_nacimiento": p[4], 
+                "edad": DatabaseManager.calculate_age(p[4]),  # Calcular edad
+                "celular": p[5],
+                "fecha_registro": p[6],
+                "comentarios": p[7],
+                "num_sesiones": p[8],
+                "ultima_sesion": p[9],
+                "diagnosticos_activos": p[10]
+            }
+            for p in patients
+        ]
+    
     @staticmethod
     @secure_connection
     def get_patient(patient_id: int, conn=None) -> Optional[Dict[str, Any]]:
@@ -221,21 +317,29 @@ class DatabaseManager:
     
     @staticmethod
     @secure_connection
-    def search_patients(query: str, conn=None) -> List[Dict[str, Any]]:
+    def search_patients(query: str, limit: Optional[int] = None, conn=None) -> List[Dict[str, Any]]:
         """
-        Busca pacientes por nombre, apellidos o comentarios
-        Retorna: Lista de pacientes que coinciden
+        Busca pacientes por nombre, apellidos o comentarios en el índice de texto completo
+        Coincidencia por prefijo de cada palabra, sin distinguir mayúsculas ni tildes
+        Args:
+            query: Texto de búsqueda
+            limit: Número máximo de resultados (None = todos)
+        Retorna: Lista de pacientes que coinciden, de mayor a menor relevancia
         """
+        fts_query = DatabaseManager.build_fts_query(query)
+        if fts_query is None:
+            return []
+        
         cursor = conn.cursor()
-        # Usar LIKE para búsqueda parcial case-insensitive
-        search_query = f"%{query}%"
         cursor.execute(
-            """SELECT id, apellido_paterno, apellido_materno, nombre, fecha_nacimiento, celular, fecha_registro, comentarios 
-               FROM pacientes 
-               WHERE nombre LIKE ? OR apellido_paterno LIKE ? OR 
-                     apellido_materno LIKE ? OR comentarios LIKE ? 
-               ORDER BY apellido_paterno, apellido_materno, nombre""",
-            (search_query, search_query, search_query, search_query)
+            """SELECT p.id, p.apellido_paterno, p.apellido_materno, p.nombre, p.fecha_nacimiento, p.celular,
+                      p.fecha_registro, p.comentarios
+               FROM pacientes_fts f
+               JOIN pacientes p ON p.id = f.rowid
+               WHERE pacientes_fts MATCH ?
+               ORDER BY f.rank
+               LIMIT ?""",
+            (fts_query, -1 if limit is None else limit)
         )
         patients = cursor.fetchall()
         
@@ -463,23 +567,31 @@ class DatabaseManager:
     
     @staticmethod
     @secure_connection
-    def search_diagnoses(query: str, conn=None) -> List[Dict[str, Any]]:
+    def search_diagnoses(query: str, limit: Optional[int] = None, conn=None) -> List[Dict[str, Any]]:
         """
-        Busca diagnósticos por código, nombre o comentarios
-        Retorna: Lista de diagnósticos que coinciden
+        Busca diagnósticos por código, nombre o comentarios en el índice de texto completo
+        Coincidencia por prefijo de cada palabra, sin distinguir mayúsculas ni tildes
+        Args:
+            query: Texto de búsqueda
+            limit: Número máximo de resultados (None = todos)
+        Retorna: Lista de diagnósticos que coinciden, de mayor a menor relevancia
         """
-        cursor = conn.cursor()
-        search_query = f"%{query}%"
+        fts_query = DatabaseManager.build_fts_query(query)
+        if fts_query is None:
+            return []
         
+        cursor = conn.cursor()
         cursor.execute("""
             SELECT d.id, d.id_paciente, d.codigo_diagnostico, d.nombre_diagnostico, 
                    d.fecha_diagnostico, d.fecha_resolucion, d.estado, d.comentarios,
                    p.apellido_paterno, p.apellido_materno, p.nombre as paciente_nombre
-            FROM diagnosticos d
+            FROM diagnosticos_fts f
+            JOIN diagnosticos d ON d.id = f.rowid
             LEFT JOIN pacientes p ON d.id_paciente = p.id
-            WHERE d.codigo_diagnostico LIKE ? OR d.nombre_diagnostico LIKE ? OR d.comentarios LIKE ?
-            ORDER BY d.fecha_diagnostico DESC
-        """, (search_query, search_query, search_query))
+            WHERE diagnosticos_fts MATCH ?
+            ORDER BY f.rank, d.fecha_diagnostico DESC
+            LIMIT ?
+        """, (fts_query, -1 if limit is None else limit))
         
         diagnoses = cursor.fetchall()
         
@@ -542,8 +654,7 @@ class DatabaseManager:
         
         if signal_data:
             cursor.execute(
-                "SELECT id, id_paciente, fecha, objetivo, sud_inicial, sud_interm, sud_final, voc, " +
-                "datos_ms, datos_eog, datos_ppg, datos_bpm, comentarios " +
+                "SELECT id, id_paciente, fecha, objetivo, sud_inicial, sud_interm, sud_final, voc, comentarios " +
                 "FROM sesiones WHERE id = ?",
                 (session_id,)
             )
@@ -552,11 +663,11 @@ class DatabaseManager:
             if not session:
                 return None
             
-            signal_data = DatabaseManager.decompress_signal_data(datos_ms=session[8],
-                                                                 datos_eog=session[9],
-                                                                 datos_ppg=session[10],
-                                                                 datos_bpm=session[11]
-                                                                )
+            chunks = DatabaseManager.get_session_signal_chunks(session_id, tuple(SIGNAL_DTYPES))
+            signal_data = {
+                channel: read_chunked(channel_chunks) if channel_chunks else None
+                for channel, channel_chunks in chunks.items()
+            }
             
             # Retornar la sesión con los datos de señales
             return {
@@ -568,11 +679,11 @@ class DatabaseManager:
                 "sud_interm": session[5],
                 "sud_final": session[6],
                 "voc": session[7],
-                "datos_ms": signal_data['ms_data_decompressed'],
-                "datos_eog": signal_data['eog_data_decompressed'],
-                "datos_ppg": signal_data['ppg_data_decompressed'],
-                "datos_bpm": signal_data['bpm_data_decompressed'],
-                "comentarios": session[12]
+                "datos_ms": signal_data['ms'],
+                "datos_eog": signal_data['eog'],
+                "datos_ppg": signal_data['ppg'],
+                "datos_bpm": signal_data['bpm'],
+                "comentarios": session[8]
             }
         else:
             cursor.execute(
@@ -597,6 +708,139 @@ class DatabaseManager:
                 "comentarios": session[8]
             }
     
+    @staticmethod
+    @secure_connection
+    def get_session_signals(
+        session_id: int,
+        channels: Sequence[str] = ("eog", "ppg", "bpm"),
+        t_start_ms: Optional[float] = None,
+        t_end_ms: Optional[float] = None,
+        max_points: Optional[int] = None,
+        conn=None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene solo los canales y el rango de tiempo pedidos de una sesión
+        Solo se leen (por el índice de tiempo de bloques_senal) y descomprimen los bloques
+        que cubren el rango
+        Args:
+            session_id: ID de la sesión
+            channels: Canales a devolver ('eog', 'ppg', 'bpm', 'ms')
+            t_start_ms: Inicio del rango en ms (None = desde el principio)
+            t_end_ms: Fin del rango en ms, inclusive (None = hasta el final)
+            max_points: Si se indica, decimación min/max de cada canal a como máximo estos puntos
+        Returns:
+            Dict con 'start_index', 'stop_index', 'total_samples', 'decimated' y, por canal,
+            {'ms': tiempos, 'values': valores}; None si la sesión no existe
+        """
+        unknown = [channel for channel in channels if channel not in SIGNAL_DTYPES]
+        if unknown:
+            raise ValueError(f"Canales desconocidos: {unknown}")
+
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM sesiones WHERE id = ?", (session_id,))
+        if not cursor.fetchone():
+            return None
+
+        low = -np.inf if t_start_ms is None else float(t_start_ms)
+        high = np.inf if t_end_ms is None else float(t_end_ms)
+
+        # Solo los bloques de timestamps cuyo intervalo de tiempo se cruza con el rango
+        cursor.execute(
+            "SELECT indice_bloque, muestra_inicio, datos FROM bloques_senal " +
+            "WHERE id_sesion = ? AND canal = 'ms' AND t_inicio_ms <= ? AND t_fin_ms >= ? " +
+            "ORDER BY t_inicio_ms",
+            (session_id, high, low)
+        )
+        ms_rows = cursor.fetchall()
+        cursor.execute(
+            "SELECT muestra_inicio + n_muestras FROM bloques_senal " +
+            "WHERE id_sesion = ? AND canal = 'ms' ORDER BY indice_bloque DESC LIMIT 1",
+            (session_id,)
+        )
+        row = cursor.fetchone()
+        total_samples = row[0] if row else 0
+
+        if not ms_rows:
+            return {"start_index": 0, "stop_index": 0, "total_samples": total_samples, "decimated": False,
+                    **{channel: None for channel in channels}}
+
+        # Ajustar el rango a las muestras dentro de los bloques del extremo
+        first_block, last_block = ms_rows[0][0], ms_rows[-1][0]
+        block_times = read_chunked([(row[1], row[2]) for row in ms_rows])
+        offset = ms_rows[0][1]
+        lo = int(np.searchsorted(block_times, low, side='left'))
+        hi = max(lo, int(np.searchsorted(block_times, high, side='right')))
+        start, stop = offset + lo, offset + hi
+        times = block_times[lo:hi]
+
+        decimated = max_points is not None and (stop - start) > max_points
+        result = {
+            "start_index": start,
+            "stop_index": stop,
+            "total_samples": total_samples,
+            "decimated": decimated,
+        }
+
+        for channel in channels:
+            if channel == "ms":
+                values = times
+            else:
+                cursor.execute(
+                    "SELECT muestra_inicio, datos FROM bloques_senal " +
+                    "WHERE id_sesion = ? AND canal = ? AND indice_bloque BETWEEN ? AND ? " +
+                    "ORDER BY indice_bloque",
+                    (session_id, channel, first_block, last_block)
+                )
+                channel_chunks = cursor.fetchall()
+                values = read_chunked(channel_chunks, start, stop) if channel_chunks else None
+            if values is None:
+                result[channel] = None
+                continue
+
+            channel_times = times
+            if decimated:
+                channel_times, values = minmax_decimate(times, values, max_points)
+            result[channel] = {"ms": channel_times, "values": values}
+
+        return result
+
+    @staticmethod
+    @secure_connection
+    def get_session_signal_chunks(
+        session_id: int,
+        channels: Sequence[str],
+        conn=None
+    ) -> Optional[Dict[str, List[Tuple[int, bytes]]]]:
+        """
+        Obtiene los bloques (sin decodificar) de los canales pedidos de una sesión
+        Solo se leen las filas de esos canales
+        Args:
+            session_id: ID de la sesión
+            channels: Canales a leer ('ms', 'eog', 'ppg', 'bpm')
+        Returns:
+            Dict canal -> lista ordenada de (muestra_inicio, BLOB del bloque), vacía si
+            el canal no tiene datos; None si la sesión no existe
+        """
+        unknown = [channel for channel in channels if channel not in SIGNAL_DTYPES]
+        if unknown:
+            raise ValueError(f"Canales desconocidos: {unknown}")
+
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM sesiones WHERE id = ?", (session_id,))
+        if not cursor.fetchone():
+            return None
+
+        chunks = {channel: [] for channel in channels}
+        cursor.execute(
+            "SELECT canal, muestra_inicio, datos FROM bloques_senal " +
+            f"WHERE id_sesion = ? AND canal IN ({', '.join('?' * len(chunks))}) " +
+            "ORDER BY canal, indice_bloque",
+            (session_id, *chunks)
+        )
+        for channel, sample_start, payload in cursor:
+            chunks[channel].append((sample_start, payload))
+        return chunks
+
     @staticmethod
     @secure_connection
     def add_session(
@@ -607,15 +851,16 @@ class DatabaseManager:
         sud_intermedio: Optional[int] = None,
         sud_final: Optional[int] = None,
         voc: Optional[int] = None,
-        datos_ms: Optional[List[int]] = None,
-        datos_eog: Optional[List[int]] = None,
-        datos_ppg: Optional[List[int]] = None,
-        datos_bpm: Optional[List[int]] = None,
+        datos_ms: Optional[Sequence[int]] = None,
+        datos_eog: Optional[Sequence[int]] = None,
+        datos_ppg: Optional[Sequence[int]] = None,
+        datos_bpm: Optional[Sequence[float]] = None,
         comentarios: Optional[str] = None,
         conn=None
     ) -> int:
         """
         Añade una nueva sesión EMDR para un paciente
+        Cada señal (lista, array o BLOB ya codificado) se guarda por bloques en bloques_senal
         Retorna: ID de la sesión creada
         """
         # Verificar que el paciente existe
@@ -630,21 +875,27 @@ class DatabaseManager:
         if not fecha:
             fecha = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        # Comprimir los datos de señales si se proporcionan
-        if not any(d is None for d in [datos_ms, datos_eog, datos_ppg, datos_bpm]):
-            datos_ms, datos_eog, datos_ppg, datos_bpm = DatabaseManager.compress_signal_data(
-                datos_ms, datos_eog, datos_ppg, datos_bpm
-            )
-        
         cursor.execute(
             "INSERT INTO sesiones (id_paciente, fecha, objetivo, sud_inicial, sud_interm, sud_final, \
-                                   voc, datos_ms, datos_eog, datos_ppg, datos_bpm, comentarios) " +
-            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (id_paciente, fecha, objetivo, sud_inicial, sud_intermedio, sud_final, 
-             voc, datos_ms, datos_eog, datos_ppg, datos_bpm, comentarios)
+                                   voc, comentarios) " +
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (id_paciente, fecha, objetivo, sud_inicial, sud_intermedio, sud_final, voc, comentarios)
+        )
+        session_id = cursor.lastrowid
+        
+        # Las señales van por bloques en su propia tabla para no cargar la fila de sesiones
+        signals = {"ms": datos_ms, "eog": datos_eog, "ppg": datos_ppg, "bpm": datos_bpm}
+        blobs = {
+            channel: DatabaseManager.encode_channel(channel, data)
+            for channel, data in signals.items() if data is not None
+        }
+        cursor.executemany(
+            "INSERT INTO bloques_senal (id_sesion, canal, indice_bloque, muestra_inicio, n_muestras, " +
+            "t_inicio_ms, t_fin_ms, datos) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            DatabaseManager.build_signal_chunks(session_id, blobs)
         )
         conn.commit()
-        return cursor.lastrowid
+        return session_id
     
     @staticmethod
     @secure_connection
@@ -719,6 +970,253 @@ class DatabaseManager:
         conn.commit()
         return cursor.rowcount > 0
     
+    # ===== MÉTODOS PARA RESULTADOS DERIVADOS (CACHÉ DE ANÁLISIS) =====
+
+    @staticmethod
+    @secure_connection
+    def get_derived_result(session_id: int, kind: str, conn=None) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene el resultado derivado guardado de una sesión
+        Args:
+            session_id: ID de la sesión
+            kind: Tipo de resultado (p.ej. 'ppg_filtrado', 'bpm_evolucion')
+        Returns:
+            Dict con 'hash_datos', 'hash_parametros', 'version', 'parametros', 'datos'
+            y 'fecha_calculo'; None si no existe
+        """
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT hash_datos, hash_parametros, version, parametros, datos, fecha_calculo
+            FROM resultados_derivados
+            WHERE id_sesion = ? AND tipo = ?
+        """, (session_id, kind))
+        row = cursor.fetchone()
+
+        if not row:
+            return None
+
+        return {
+            "hash_datos": row[0],
+            "hash_parametros": row[1],
+            "version": row[2],
+            "parametros": row[3],
+            "datos": row[4],
+            "fecha_calculo": row[5]
+        }
+
+    @staticmethod
+    @secure_connection
+    def save_derived_result(
+        session_id: int,
+        kind: str,
+        data_hash: str,
+        params_hash: str,
+        version: int,
+        params_json: str,
+        payload: bytes,
+        conn=None
+    ) -> bool:
+        """
+        Guarda (o reemplaza) el resultado derivado de una sesión
+        Solo se conserva un resultado por sesión y tipo: el último calculado
+        Retorna: True si se guardó correctamente
+        """
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT OR REPLACE INTO resultados_derivados
+                (id_sesion, tipo, hash_datos, hash_parametros, version, parametros, datos, fecha_calculo)
+            VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        """, (session_id, kind, data_hash, params_hash, version, params_json, sqlite3.Binary(payload)))
+        conn.commit()
+        return cursor.rowcount > 0
+
+    @staticmethod
+    @secure_connection
+    def invalidate_derived_results(session_id: Optional[int] = None, kind: Optional[str] = None,
+                                   conn=None) -> int:
+        """
+        Elimina resultados derivados para forzar su recálculo
+        Args:
+            session_id: Sesión afectada (None = todas)
+            kind: Tipo de resultado (None = todos)
+        Retorna: Número de resultados eliminados
+        """
+        conditions, params = [], []
+        if session_id is not None:
+            conditions.append("id_sesion = ?")
+            params.append(session_id)
+        if kind is not None:
+            conditions.append("tipo = ?")
+            params.append(kind)
+
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor = conn.cursor()
+        cursor.execute(f"DELETE FROM resultados_derivados{where}", params)
+        conn.commit()
+        return cursor.rowcount
+
+    # ===== MÉTODOS PARA ANÁLISIS DE COHORTES =====
+
+    @staticmethod
+    def _session_filter_clause(patient_id=None, date_from=None, date_to=None, objective=None,
+                               alias="s"):
+        """
+        Construye la cláusula WHERE común para filtrar sesiones
+        Args:
+            patient_id: ID del paciente
+            date_from: Fecha inicial 'YYYY-MM-DD' (inclusive)
+            date_to: Fecha final 'YYYY-MM-DD' (inclusive)
+            objective: Objetivo/tipo exacto de la sesión
+            alias: Alias de la tabla sesiones en la consulta
+        Returns:
+            Tupla (cláusula WHERE o cadena vacía, parámetros)
+        """
+        conditions, params = [], []
+        if patient_id is not None:
+            conditions.append(f"{alias}.id_paciente = ?")
+            params.append(patient_id)
+        if date_from:
+            conditions.append(f"date({alias}.fecha) >= date(?)")
+            params.append(date_from)
+        if date_to:
+            conditions.append(f"date({alias}.fecha) <= date(?)")
+            params.append(date_to)
+        if objective:
+            conditions.append(f"{alias}.objetivo = ?")
+            params.append(objective)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return where, params
+
+    @staticmethod
+    @secure_connection
+    def get_sessions_for_cohort(
+        patient_id: Optional[int] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        objective: Optional[str] = None,
+        pending_version: Optional[int] = None,
+        conn=None
+    ) -> List[Dict[str, Any]]:
+        """
+        Obtiene los metadatos (sin BLOBs) de las sesiones que cumplen los filtros
+        Args:
+            patient_id, date_from, date_to, objective: Filtros opcionales
+            pending_version: Si se indica, solo sesiones sin resumen de esa versión o cuyo
+                             resumen terminó con error (se reintentan; las sesiones sin
+                             datos suficientes no)
+        Returns:
+            Lista de sesiones ordenadas por fecha
+        """
+        where, params = DatabaseManager._session_filter_clause(patient_id, date_from, date_to, objective)
+        if pending_version is not None:
+            where += " AND " if where else " WHERE "
+            where += "(r.id_sesion IS NULL OR r.version <> ? OR r.estado = 'error')"
+            params.append(pending_version)
+
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT s.id, s.id_paciente, s.fecha, s.objetivo
+            FROM sesiones s
+            LEFT JOIN resumen_sesiones r ON r.id_sesion = s.id
+            {where}
+            ORDER BY s.fecha
+        """, params)
+
+        return [
+            {"id": row[0], "id_paciente": row[1], "fecha": row[2], "objetivo": row[3]}
+            for row in cursor.fetchall()
+        ]
+
+    @staticmethod
+    @secure_connection
+    def save_session_summaries(rows: Sequence[Dict[str, Any]], conn=None) -> int:
+        """
+        Guarda (o reemplaza) filas de la tabla resumen_sesiones en una sola transacción
+        Args:
+            rows: Diccionarios con 'id_sesion', 'version' y las columnas de métricas
+        Retorna: Número de filas guardadas
+        """
+        if not rows:
+            return 0
+
+        columns = list(rows[0].keys())
+        placeholders = ", ".join("?" for _ in columns)
+        cursor = conn.cursor()
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO resumen_sesiones ({', '.join(columns)}) VALUES ({placeholders})",
+            [tuple(row.get(column) for column in columns) for row in rows]
+        )
+        conn.commit()
+        return len(rows)
+
+    @staticmethod
+    @secure_connection
+    def get_session_summaries(
+        patient_id: Optional[int] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        objective: Optional[str] = None,
+        conn=None
+    ) -> List[Dict[str, Any]]:
+        """
+        Obtiene los resúmenes de sesión junto con los datos clínicos vigentes (SUD y VOC)
+        Los datos clínicos se leen de sesiones, así que reflejan las ediciones posteriores al análisis
+        Returns:
+            Lista de diccionarios, una fila por sesión analizada, ordenadas por fecha
+        """
+        where, params = DatabaseManager._session_filter_clause(patient_id, date_from, date_to, objective)
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT s.id_paciente, s.fecha, s.objetivo, s.sud_inicial, s.sud_interm, s.sud_final, s.voc, r.*
+            FROM resumen_sesiones r
+            JOIN sesiones s ON s.id = r.id_sesion
+            {where}
+            ORDER BY s.fecha
+        """, params)
+
+        names = [description[0] for description in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    @staticmethod
+    @secure_connection
+    def get_monthly_outcomes(
+        patient_id: Optional[int] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        objective: Optional[str] = None,
+        conn=None
+    ) -> List[Dict[str, Any]]:
+        """
+        Agrega resultados clínicos y fisiológicos por mes (revisión mensual de resultados)
+        Returns:
+            Lista por mes 'YYYY-MM' con número de sesiones y pacientes, reducción media
+            de SUD, VOC medio, BPM medio, cambio medio de BPM en la sesión y RMSSD medio
+            (cada media sobre las sesiones que tienen esa métrica)
+        """
+        # Las sesiones con error se incluyen: AVG ignora las métricas que faltan y
+        # conserva las que se llegaron a calcular
+        where, params = DatabaseManager._session_filter_clause(patient_id, date_from, date_to, objective)
+
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT strftime('%Y-%m', s.fecha) AS mes,
+                   COUNT(*) AS sesiones,
+                   COUNT(DISTINCT s.id_paciente) AS pacientes,
+                   AVG(s.sud_inicial - s.sud_final) AS reduccion_sud,
+                   AVG(s.voc) AS voc_medio,
+                   AVG(r.bpm_medio) AS bpm_medio,
+                   AVG(r.bpm_cambio_pct) AS bpm_cambio_pct,
+                   AVG(r.rmssd) AS rmssd
+            FROM resumen_sesiones r
+            JOIN sesiones s ON s.id = r.id_sesion
+            {where}
+            GROUP BY mes
+            ORDER BY mes
+        """, params)
+
+        names = [description[0] for description in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
     # ===== MÉTODOS PARA ADMINISTRADORES =====
     
     @staticmethod
@@ -1009,84 +1507,55 @@ class DatabaseManager:
             raise e
 
     @staticmethod
-    def decompress_signal_data(**kwargs: Any) -> Optional[Dict[str, Any]]:
+    def encode_channel(channel: str, data: Union[Sequence[float], bytes]) -> bytes:
         """
-        Recupera los datos fisiológicos de una sesión específica
+        Codifica una señal con el códec de señales según el tipo de su canal
+        Los BLOBs ya codificados se devuelven tal cual y los antiguos (pickle + zlib) se recodifican
         Args:
-            **kwargs: Argumentos con nombres que pueden incluir:
-                - datos_ms: bytes | None
-                - datos_eog: bytes | None  
-                - datos_ppg: bytes | None
-                - datos_bpm: bytes | None
+            channel: Canal ('ms', 'eog', 'ppg', 'bpm')
+            data: Lista o array con la señal, o BLOB
         Returns:
-            Dict con los datos descomprimidos o None si hay error
+            BLOB del códec
         """
-        try:
-            import pickle
-            import zlib
-            
-            ms_data = kwargs.get("datos_ms")
-            eog_data = kwargs.get("datos_eog")
-            ppg_data = kwargs.get("datos_ppg")
-            bpm_data = kwargs.get("datos_bpm")
-
-            # Descomprimir datos de milisegundos si existe
-            if ms_data:
-                ms_decompressed = zlib.decompress(ms_data)
-                ms_data = pickle.loads(ms_decompressed)
-            
-            # Descomprimir EOG si existe
-            if eog_data:
-                eog_decompressed = zlib.decompress(eog_data)
-                eog_data = pickle.loads(eog_decompressed)
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            if is_encoded(data):
+                return bytes(data)
+            data = decode_legacy_signal(data)
+        return encode_signal(data, dtype=SIGNAL_DTYPES[channel], sample_rate=SIGNAL_SAMPLE_RATE)
 
-            # Descomprimir PPG si existe
-            if ppg_data:
-                ppg_decompressed = zlib.decompress(ppg_data)
-                ppg_data = pickle.loads(ppg_decompressed)
-
-            # Descomprimir BPM si existe
-            if bpm_data:
-                bpm_decompressed = zlib.decompress(bpm_data)
-                bpm_data = pickle.loads(bpm_decompressed)
-
-            return {
-                "ms_data_decompressed": ms_data,
-                "eog_data_decompressed": eog_data,
-                "ppg_data_decompressed": ppg_data,
-                "bpm_data_decompressed": bpm_data
-            }
-
-        except Exception as e:
-            print(f"Error al recuperar datos de sesión: {e}")
-            return None
-    
     @staticmethod
-    def compress_signal_data(
-        datos_ms: List[int],
-        datos_eog: List[int],
-        datos_ppg: List[int],
-        datos_bpm: List[int]
-    ) -> Tuple[bytes, bytes, bytes, bytes]:
-        """
-        Comprime los datos fisiológicos de una sesión para almacenamiento
-        Retorna: Tupla con los datos comprimidos (ms, eog, ppg, bpm)
-        """
-        import numpy as np
-        import zlib
-        import pickle
+    def build_signal_chunks(session_id: int, blobs: Dict[str, bytes]) -> List[Tuple]:
+        """
+        Separa los BLOBs de una sesión en filas de bloques_senal
+        El intervalo de tiempo de cada bloque se toma de los timestamps ('ms'); sin
+        timestamps se usa la posición de la muestra a SIGNAL_SAMPLE_RATE
+        Args:
+            session_id: ID de la sesión
+            blobs: Dict canal -> BLOB del códec
+        Returns:
+            Lista de tuplas (id_sesion, canal, indice_bloque, muestra_inicio, n_muestras,
+            t_inicio_ms, t_fin_ms, datos)
+        """
+        split = {channel: SignalReader(blob).split_chunks() for channel, blob in blobs.items()}
 
-        # Convertir listas a arreglos de numpy
-        datos_ms_np = np.array(datos_ms, dtype=np.int32)
-        datos_eog_np = np.array(datos_eog, dtype=np.int32)
-        datos_ppg_np = np.array(datos_ppg, dtype=np.int32)
+        time_ranges = []
+        if split.get("ms"):
+            for _, payload in split["ms"]:
+                index = SignalReader(payload).chunk_index
+                time_ranges.append((int(index["min"][0]), int(index["max"][0])))
 
-        compressed_ms = zlib.compress(pickle.dumps(datos_ms_np))
-        compressed_eog = zlib.compress(pickle.dumps(datos_eog_np))
-        compressed_ppg = zlib.compress(pickle.dumps(datos_ppg_np))
-        compressed_bpm = zlib.compress(pickle.dumps(datos_bpm))
-        
-        return compressed_ms, compressed_eog, compressed_ppg, compressed_bpm
+        rows = []
+        for channel, chunks in split.items():
+            for chunk_number, (sample_start, payload) in enumerate(chunks):
+                n_samples = len(SignalReader(payload))
+                if chunk_number < len(time_ranges):
+                    t_start, t_end = time_ranges[chunk_number]
+                else:
+                    t_start = sample_start * 1000 // SIGNAL_SAMPLE_RATE
+                    t_end = (sample_start + n_samples - 1) * 1000 // SIGNAL_SAMPLE_RATE
+                rows.append((session_id, channel, chunk_number, sample_start, n_samples,
+                             t_start, t_end, payload))
+        return rows
 
 # Ejemplo de uso modificado para incluir diagnósticos
 if __name__ == "__main__":
@@ -68,6 +68,10 @@ def init_db():
     try:
         cursor.executescript(schema_sql)
         conn.commit()
+        
+        # Aplicar los cambios de esquema posteriores al esquema base
+        from database.migrations import apply_migrations
+        apply_migrations(conn)
         print("✅ Base de datos inicializada exitosamente.")
         print(f"📁 Ubicación: {DB_PATH}")
         return True
@@ -0,0 +1,297 @@
+"""
+Caché persistente de resultados derivados de una sesión (tabla resultados_derivados).
+
+El filtrado PPG offline y la evolución de BPM se recalculaban desde las
+señales crudas cada vez que se abría una sesión. Aquí se guardan junto a la
+sesión, identificados por:
+
+    - hash_datos      : huella (BLAKE2b) de los arrays de entrada del cálculo
+    - hash_parametros : huella del JSON canónico de los parámetros
+    - version         : versión del algoritmo (constante VERSION de la clase)
+
+Si cualquiera de los tres no coincide, el resultado guardado se considera
+obsoleto: se recalcula y se reemplaza. Cambiar un parámetro o la versión de
+un algoritmo invalida así los resultados anteriores sin pasos manuales;
+invalidate() permite además forzar el recálculo.
+
+Los procesos que no deben escribir en la base de datos (p.ej. el pool del
+análisis por lotes) pasan una lista pending_writes: los resultados nuevos
+se añaden a ella y el proceso principal los guarda con save_pending_writes().
+
+Los resultados son diccionarios con arrays NumPy, listas y escalares. Se
+serializan como un .npz comprimido: los arrays se guardan tipados y el resto
+de la estructura como JSON.
+"""
+
+import hashlib
+import inspect
+import io
+import json
+
+import numpy as np
+
+from database.database_manager import DatabaseManager
+
+_ARRAY_TAG = '__array__'
+_STRUCTURE_KEY = '__estructura__'
+
+
+def fingerprint_arrays(*arrays):
+    """
+    Huella de uno o varios arrays (tipo, forma y contenido).
+
+    Args:
+        *arrays: Arrays o secuencias a identificar
+
+    Returns:
+        str: Hash hexadecimal
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.dtype.str}{array.shape}".encode('ascii'))
+        digest.update(memoryview(array).cast('B'))
+    return digest.hexdigest()
+
+
+def canonical_params(params):
+    """JSON determinista de los parámetros (claves ordenadas, escalares nativos)."""
+    return json.dumps(_to_structure(params, None), sort_keys=True, separators=(',', ':'))
+
+
+def constructor_params(cls, **params):
+    """
+    Parámetros completos con los que se construiría 'cls' (incluidos los
+    valores por defecto), para que dos llamadas equivalentes compartan caché
+    aunque una omita argumentos que la otra escribe explícitamente.
+
+    Args:
+        cls: Clase del algoritmo (p.ej. OfflinePPGFilter)
+        **params: Argumentos del constructor
+
+    Returns:
+        dict: Argumentos con los valores por defecto aplicados
+    """
+    bound = inspect.signature(cls).bind(**params)
+    bound.apply_defaults()
+    return dict(bound.arguments)
+
+
+def _to_structure(value, arrays):
+    """Convertir un resultado en estructura JSON; los arrays se extraen a 'arrays'."""
+    if isinstance(value, np.ndarray):
+        if arrays is None:
+            return value.tolist()
+        key = f"a{len(arrays)}"
+        arrays[key] = value
+        return {_ARRAY_TAG: key}
+    if isinstance(value, dict):
+        return {str(k): _to_structure(v, arrays) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_structure(v, arrays) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _from_structure(value, arrays):
+    """Reconstruir un resultado a partir de su estructura JSON y sus arrays."""
+    if isinstance(value, dict):
+        if set(value) == {_ARRAY_TAG}:
+            return arrays[value[_ARRAY_TAG]]
+        return {k: _from_structure(v, arrays) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_from_structure(v, arrays) for v in value]
+    return value
+
+
+def pack_result(result):
+    """
+    Serializar un resultado (dict con arrays, listas y escalares).
+
+    Args:
+        result: Diccionario a guardar
+
+    Returns:
+        bytes: Contenido .npz comprimido
+    """
+    arrays = {}
+    structure = json.dumps(_to_structure(result, arrays)).encode('utf-8')
+    arrays[_STRUCTURE_KEY] = np.frombuffer(structure, dtype=np.uint8)
+
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def unpack_result(payload):
+    """
+    Reconstruir un resultado serializado con pack_result.
+
+    Las tuplas vuelven como listas; los arrays conservan su tipo.
+    """
+    with np.load(io.BytesIO(payload), allow_pickle=False) as npz:
+        arrays = {name: npz[name] for name in npz.files}
+    structure = json.loads(arrays.pop(_STRUCTURE_KEY).tobytes().decode('utf-8'))
+    return _from_structure(structure, arrays)
+
+
+class DerivedResultsCache:
+    """
+    Acceso a los resultados derivados guardados de una sesión.
+
+    Uso:
+        cache = DerivedResultsCache(session_id)
+        parametros = constructor_params(OfflinePPGFilter, fs=125, smoothing=True)
+        resultado = cache.get_or_compute(
+            'ppg_filtrado', inputs=(ppg,), params=parametros,
+            version=OfflinePPGFilter.VERSION,
+            compute=lambda: OfflinePPGFilter(**parametros).filter_signal(ppg)
+        )
+    """
+
+    def __init__(self, session_id, enabled=True, pending_writes=None):
+        """
+        Args:
+            session_id: ID de la sesión (None desactiva la caché)
+            enabled: False para calcular siempre sin leer ni guardar
+            pending_writes: Lista donde dejar los resultados nuevos en lugar de
+                            guardarlos (None = guardar directamente)
+        """
+        self.session_id = session_id
+        self.enabled = enabled and session_id is not None
+        self.pending_writes = pending_writes
+        self.last_hit = False
+
+    def get_or_compute(self, kind, inputs, params, version, compute):
+        """
+        Devolver el resultado guardado si sigue siendo válido o calcularlo.
+
+        Args:
+            kind: Tipo de resultado (p.ej. 'ppg_filtrado')
+            inputs: Tupla de arrays de los que depende el cálculo
+            params: Diccionario de parámetros del algoritmo
+            version: Versión del algoritmo
+            compute: Función sin argumentos que calcula el resultado
+
+        Returns:
+            dict: Resultado (guardado o recién calculado)
+        """
+        self.last_hit = False
+        if not self.enabled:
+            return compute()
+
+        data_hash = fingerprint_arrays(*inputs)
+        params_json = canonical_params(params)
+        params_hash = hashlib.blake2b(params_json.encode('utf-8'), digest_size=16).hexdigest()
+
+        stored = DatabaseManager.get_derived_result(self.session_id, kind)
+        if stored:
+            if (stored['hash_datos'] == data_hash and stored['hash_parametros'] == params_hash
+                    and stored['version'] == version):
+                try:
+                    result = unpack_result(stored['datos'])
+                    self.last_hit = True
+                    print(f"Resultado '{kind}' de la sesión {self.session_id} recuperado de la caché")
+                    return result
+                except Exception as e:
+                    print(f"Resultado '{kind}' en caché ilegible, se recalcula: {e}")
+            else:
+                print(f"Resultado '{kind}' de la sesión {self.session_id} obsoleto "
+                      f"(datos, parámetros o versión distintos), se recalcula")
+
+        result = compute()
+        try:
+            record = (self.session_id, kind, data_hash, params_hash, version, params_json,
+                      pack_result(result))
+            if self.pending_writes is not None:
+                self.pending_writes.append(record)
+            else:
+                DatabaseManager.save_derived_result(*record)
+        except Exception as e:
+            print(f"No se pudo guardar el resultado '{kind}' en caché: {e}")
+        return result
+
+    def invalidate(self, kind=None):
+        """
+        Eliminar resultados guardados de la sesión para forzar su recálculo.
+
+        Args:
+            kind: Tipo de resultado (None = todos los de la sesión)
+
+        Returns:
+            int: Número de resultados eliminados
+        """
+        if self.session_id is None:
+            return 0
+        return DatabaseManager.invalidate_derived_results(self.session_id, kind) or 0
+
+
+def save_pending_writes(pending_writes):
+    """
+    Guardar resultados diferidos por DerivedResultsCache(pending_writes=...).
+
+    Args:
+        pending_writes: Registros acumulados por get_or_compute()
+
+    Returns:
+        int: Número de resultados guardados
+    """
+    saved = 0
+    for record in pending_writes:
+        if DatabaseManager.save_derived_result(*record):
+            saved += 1
+    return saved
+
+
+def filter_ppg_cached(ppg_data, fs, session_id=None, pending_writes=None, cancel_check=None,
+                      **filter_params):
+    """
+    Filtrado PPG offline (OfflinePPGFilter) con caché por sesión.
+
+    Args:
+        ppg_data: Señal PPG cruda
+        fs: Frecuencia de muestreo (Hz)
+        session_id: Sesión de origen (None = sin caché)
+        pending_writes: Lista para diferir el guardado (ver DerivedResultsCache)
+        cancel_check: Punto de control de cancelación durante el filtrado
+        **filter_params: Argumentos adicionales de OfflinePPGFilter
+
+    Returns:
+        dict: Resultado de OfflinePPGFilter.filter_signal()
+    """
+    from utils.signal_processing import OfflinePPGFilter
+
+    params = constructor_params(OfflinePPGFilter, fs=fs, **filter_params)
+    return DerivedResultsCache(session_id, pending_writes=pending_writes).get_or_compute(
+        'ppg_filtrado', (ppg_data,), params, OfflinePPGFilter.VERSION,
+        lambda: OfflinePPGFilter(**params).filter_signal(ppg_data, cancel_check=cancel_check)
+    )
+
+
+def bpm_evolution_cached(filtered_ppg, ms_data, fs, session_id=None, method='windowed',
+                         pending_writes=None, cancel_check=None):
+    """
+    Evolución de BPM offline (BPMOfflineCalculation) con caché por sesión.
+
+    Args:
+        filtered_ppg: Señal PPG filtrada
+        ms_data: Timestamps en milisegundos
+        fs: Frecuencia de muestreo (Hz)
+        session_id: Sesión de origen (None = sin caché)
+        method: Método de BPMOfflineCalculation ('windowed' o 'global')
+        pending_writes: Lista para diferir el guardado (ver DerivedResultsCache)
+        cancel_check: Punto de control de cancelación durante el cálculo
+
+    Returns:
+        dict: Resultado de BPMOfflineCalculation.calculate_bpm_evolution()
+    """
+    from utils.signal_processing import BPMOfflineCalculation
+
+    params = constructor_params(BPMOfflineCalculation, fs=fs, method=method)
+    return DerivedResultsCache(session_id, pending_writes=pending_writes).get_or_compute(
+        'bpm_evolucion', (filtered_ppg, ms_data), params, BPMOfflineCalculation.VERSION,
+        lambda: BPMOfflineCalculation(**params).calculate_bpm_evolution(
+            filtered_ppg, ms_data, cancel_check=cancel_check
+        )
+    )
@@ -0,0 +1,433 @@
+"""
+Migraciones versionadas del esquema de la base de datos.
+
+schema.sql crea el esquema base (versión 0) con CREATE TABLE IF NOT EXISTS
+y está congelado: una base de datos nueva también se crea en la versión 0
+y recorre todas las migraciones (sobre tablas vacías, sin coste apreciable).
+Cada cambio posterior del esquema es una migración numerada de esta lista:
+apply_migrations() compara la versión guardada en PRAGMA user_version con
+la lista y ejecuta, en orden y una sola vez, las migraciones pendientes.
+
+Cada migración se ejecuta en su propia transacción (BEGIN IMMEDIATE) junto
+con la actualización de user_version: o se aplica completa o no se aplica.
+Si dos instancias de la aplicación arrancan a la vez sobre la base de datos
+compartida, la segunda espera el bloqueo y encuentra la migración ya hecha.
+
+Para añadir una migración: agregar una entrada al final de MIGRATIONS con
+el siguiente número de versión. Nunca modificar una migración ya publicada.
+Por eso las migraciones no usan código de la aplicación que pueda cambiar:
+la migración 3 lleva su propia copia congelada del formato v1 del códec de
+señales y de la división en bloques.
+"""
+
+import pickle
+import sqlite3
+import struct
+import zlib
+
+import numpy as np
+
+
+def _rebuild_sessions_without_signals(conn):
+    """Reconstruir sesiones sin las columnas BLOB (procedimiento de ALTER TABLE de SQLite)."""
+    conn.execute("""
+        CREATE TABLE sesiones_nueva (
+            id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+            id_paciente INTEGER NOT NULL,
+            fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+            objetivo TEXT,
+            sud_inicial INTEGER,
+            sud_interm INTEGER,
+            sud_final INTEGER,
+            voc INTEGER,
+            comentarios TEXT,
+            FOREIGN KEY (id_paciente) REFERENCES pacientes(id)
+        )
+    """)
+    conn.execute("""
+        INSERT INTO sesiones_nueva (id, id_paciente, fecha, objetivo, sud_inicial, sud_interm,
+                                    sud_final, voc, comentarios)
+        SELECT id, id_paciente, fecha, objetivo, sud_inicial, sud_interm, sud_final, voc, comentarios
+        FROM sesiones
+    """)
+    conn.execute("DROP TABLE sesiones")
+    conn.execute("ALTER TABLE sesiones_nueva RENAME TO sesiones")
+
+
+# ----- Migración 3: formato v1 del códec de señales (congelado) -----
+
+_V1_MAGIC = b'EMSG'
+_V1_VERSION = 1
+_V1_FLAG_DELTA = 0x0001
+_V1_HEADER = struct.Struct('<4sBBHfIII')
+_V1_INDEX_DTYPE = np.dtype([
+    ('offset', '<u8'), ('nbytes', '<u4'), ('first', '<f8'), ('min', '<f8'), ('max', '<f8'),
+])
+_V1_DTYPE_CODES = {np.dtype('<i2'): 0, np.dtype('<i4'): 1, np.dtype('<f4'): 2}
+_V1_DTYPES = {code: dtype for dtype, code in _V1_DTYPE_CODES.items()}
+_V1_DELTA_VIEW = {np.dtype('<i2'): np.dtype('<i2'), np.dtype('<i4'): np.dtype('<i4'),
+                  np.dtype('<f4'): np.dtype('<i4')}
+
+# Tipos, frecuencia y tamaño de bloque de las señales al publicar la migración 3
+_V3_SIGNAL_DTYPES = {"ms": np.dtype('<i4'), "eog": np.dtype('<i2'),
+                     "ppg": np.dtype('<i2'), "bpm": np.dtype('<f4')}
+_V3_SAMPLE_RATE = 125
+_V3_CHUNK_SIZE = 10 * _V3_SAMPLE_RATE
+_V3_COMPRESSION_LEVEL = 6
+
+
+def _v1_chunk_blob(dtype, flags, sample_rate, chunk_size, n_samples, entry, payload):
+    """BLOB v1 independiente de un solo bloque."""
+    header = _V1_HEADER.pack(_V1_MAGIC, _V1_VERSION, _V1_DTYPE_CODES[dtype], flags,
+                             sample_rate, n_samples, chunk_size, 1)
+    index = np.array([(0, len(payload), entry['first'], entry['min'], entry['max'])],
+                     dtype=_V1_INDEX_DTYPE)
+    return b''.join([header, index.tobytes(), bytes(payload)])
+
+
+def _v1_split(blob):
+    """Separar un BLOB v1 en bloques sin recomprimir: [(muestra_inicio, n, mín, máx, BLOB)]."""
+    blob = memoryview(blob)
+    _, version, dtype_code, flags, sample_rate, n_samples, chunk_size, n_chunks = \
+        _V1_HEADER.unpack_from(blob, 0)
+    if version != _V1_VERSION:
+        raise ValueError(f"Versión de códec no soportada: {version}")
+
+    dtype = _V1_DTYPES[dtype_code]
+    data_start = _V1_HEADER.size + n_chunks * _V1_INDEX_DTYPE.itemsize
+    index = np.frombuffer(blob[_V1_HEADER.size:data_start], dtype=_V1_INDEX_DTYPE)
+
+    chunks = []
+    for chunk_number, entry in enumerate(index):
+        start = chunk_number * chunk_size
+        n = min(chunk_size, n_samples - start)
+        offset = data_start + int(entry['offset'])
+        payload = blob[offset:offset + int(entry['nbytes'])]
+        chunks.append((start, n, float(entry['min']), float(entry['max']),
+                       _v1_chunk_blob(dtype, flags, sample_rate, chunk_size, n, entry, payload)))
+    return chunks
+
+
+def _v1_encode_legacy(channel, blob):
+    """Recodificar un BLOB antiguo (pickle + zlib) en bloques v1."""
+    data = np.asarray(pickle.loads(zlib.decompress(blob)))
+    dtype = _V3_SIGNAL_DTYPES[channel]
+    if dtype == np.dtype('<i2') and len(data):
+        info = np.iinfo(np.int16)
+        if data.min() < info.min or data.max() > info.max:
+            dtype = np.dtype('<i4')
+    values = np.ascontiguousarray(data, dtype=dtype)
+    delta_values = values.view(_V1_DELTA_VIEW[dtype])
+
+    chunks = []
+    for start in range(0, len(values), _V3_CHUNK_SIZE):
+        chunk = values[start:start + _V3_CHUNK_SIZE]
+        raw = delta_values[start:start + _V3_CHUNK_SIZE]
+        encoded = np.empty_like(raw)
+        encoded[0] = raw[0]
+        np.subtract(raw[1:], raw[:-1], out=encoded[1:])
+        payload = zlib.compress(encoded.tobytes(), _V3_COMPRESSION_LEVEL)
+
+        entry = np.array([(0, len(payload), chunk[0], chunk.min(), chunk.max())], dtype=_V1_INDEX_DTYPE)[0]
+        chunks.append((start, len(chunk), float(chunk.min()), float(chunk.max()),
+                       _v1_chunk_blob(dtype, _V1_FLAG_DELTA, float(_V3_SAMPLE_RATE), _V3_CHUNK_SIZE,
+                                      len(chunk), entry, payload)))
+    return chunks
+
+
+def _split_signals_into_chunks(conn):
+    """Pasar cada señal de senales_sesion a filas por bloque en bloques_senal."""
+    channels = ("ms", "eog", "ppg", "bpm")
+    insert = (
+        "INSERT INTO bloques_senal (id_sesion, canal, indice_bloque, muestra_inicio, n_muestras, "
+        "t_inicio_ms, t_fin_ms, datos) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+    )
+    rows = conn.execute(
+        "SELECT id_sesion, datos_ms, datos_eog, datos_ppg, datos_bpm FROM senales_sesion ORDER BY id_sesion"
+    )
+    for session_id, *blobs in rows:
+        split = {}
+        for channel, blob in zip(channels, blobs):
+            if not blob:
+                continue
+            try:
+                # Los BLOBs del códec solo se dividen; los antiguos (pickle + zlib) se recodifican
+                if len(blob) >= _V1_HEADER.size and bytes(blob[:4]) == _V1_MAGIC:
+                    split[channel] = _v1_split(blob)
+                else:
+                    split[channel] = _v1_encode_legacy(channel, blob)
+            except Exception as e:
+                raise sqlite3.DataError(f"Sesión {session_id}, canal {channel}: {e}") from e
+
+        # Intervalo de tiempo de cada bloque: el de sus timestamps, o la
+        # posición de las muestras a la frecuencia nominal si no los hay
+        time_ranges = [(int(low), int(high)) for _, _, low, high, _ in split.get("ms", [])]
+        chunk_rows = []
+        for channel, chunks in split.items():
+            for chunk_number, (start, n_samples, _, _, payload) in enumerate(chunks):
+                if chunk_number < len(time_ranges):
+                    t_start, t_end = time_ranges[chunk_number]
+                else:
+                    t_start = start * 1000 // _V3_SAMPLE_RATE
+                    t_end = (start + n_samples - 1) * 1000 // _V3_SAMPLE_RATE
+                chunk_rows.append((session_id, channel, chunk_number, start, n_samples,
+                                   t_start, t_end, payload))
+        conn.executemany(insert, chunk_rows)
+
+
+# (versión, descripción, sentencias SQL o función que recibe la conexión)
+MIGRATIONS = [
+    (1, "índices de llaves foráneas y de ordenación", (
+        # Sesiones de un paciente ordenadas por fecha (y sus agregados)
+        "CREATE INDEX IF NOT EXISTS idx_sesiones_paciente_fecha ON sesiones(id_paciente, fecha)",
+        # Filtros por rango de fechas (análisis de cohortes, resúmenes mensuales)
+        "CREATE INDEX IF NOT EXISTS idx_sesiones_fecha ON sesiones(fecha)",
+        # Diagnósticos de un paciente ordenados por fecha
+        "CREATE INDEX IF NOT EXISTS idx_diagnosticos_paciente_fecha "
+        "ON diagnosticos(id_paciente, fecha_diagnostico)",
+        # Diagnósticos activos de un paciente y recuentos por estado
+        "CREATE INDEX IF NOT EXISTS idx_diagnosticos_paciente_estado "
+        "ON diagnosticos(id_paciente, estado)",
+        "CREATE INDEX IF NOT EXISTS idx_diagnosticos_estado ON diagnosticos(estado)",
+        "CREATE INDEX IF NOT EXISTS idx_diagnosticos_terapeuta ON diagnosticos(id_terapeuta)",
+    )),
+    (2, "señales de las sesiones en una tabla aparte (senales_sesion)", (
+        """
+        CREATE TABLE senales_sesion (
+            id_sesion INTEGER PRIMARY KEY NOT NULL,
+            datos_ms BLOB,
+            datos_eog BLOB,
+            datos_ppg BLOB,
+            datos_bpm BLOB,
+            FOREIGN KEY (id_sesion) REFERENCES sesiones(id) ON DELETE CASCADE
+        )
+        """,
+        """
+        INSERT INTO senales_sesion (id_sesion, datos_ms, datos_eog, datos_ppg, datos_bpm)
+        SELECT id, datos_ms, datos_eog, datos_ppg, datos_bpm
+        FROM sesiones
+        WHERE datos_ms IS NOT NULL OR datos_eog IS NOT NULL
+           OR datos_ppg IS NOT NULL OR datos_bpm IS NOT NULL
+        """,
+        _rebuild_sessions_without_signals,
+        # Los índices de sesiones desaparecen con la tabla antigua
+        "CREATE INDEX IF NOT EXISTS idx_sesiones_paciente_fecha ON sesiones(id_paciente, fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_sesiones_fecha ON sesiones(fecha)",
+    )),
+    (3, "señales por bloques de ~10 s con su intervalo de tiempo (bloques_senal)", (
+        """
+        CREATE TABLE bloques_senal (
+            id_sesion INTEGER NOT NULL,
+            canal TEXT NOT NULL,                -- 'ms', 'eog', 'ppg' o 'bpm'
+            indice_bloque INTEGER NOT NULL,
+            muestra_inicio INTEGER NOT NULL,    -- Primera muestra del bloque en la señal
+            n_muestras INTEGER NOT NULL,
+            t_inicio_ms INTEGER NOT NULL,       -- Primer y último timestamp del bloque
+            t_fin_ms INTEGER NOT NULL,
+            datos BLOB NOT NULL,                -- BLOB del códec con un solo bloque
+            PRIMARY KEY (id_sesion, canal, indice_bloque),
+            FOREIGN KEY (id_sesion) REFERENCES sesiones(id) ON DELETE CASCADE
+        )
+        """,
+        # Lecturas por rango de tiempo directamente desde el índice
+        "CREATE INDEX idx_bloques_senal_tiempo ON bloques_senal(id_sesion, canal, t_inicio_ms)",
+        _split_signals_into_chunks,
+        "DROP TABLE senales_sesion",
+    )),
+    (4, "índices de texto completo (FTS5) de pacientes y diagnósticos", (
+        # Tablas de contenido externo: el texto se lee de pacientes/diagnosticos
+        # y los triggers mantienen el índice. remove_diacritics hace que
+        # "jose" encuentre "José" y "nunez" encuentre "Núñez".
+        """
+        CREATE VIRTUAL TABLE pacientes_fts USING fts5(
+            nombre, apellido_paterno, apellido_materno, comentarios,
+            content='pacientes', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        """,
+        """
+        CREATE TRIGGER pacientes_fts_insert AFTER INSERT ON pacientes BEGIN
+            INSERT INTO pacientes_fts (rowid, nombre, apellido_paterno, apellido_materno, comentarios)
+            VALUES (new.id, new.nombre, new.apellido_paterno, new.apellido_materno, new.comentarios);
+        END
+        """,
+        """
+        CREATE TRIGGER pacientes_fts_delete AFTER DELETE ON pacientes BEGIN
+            INSERT INTO pacientes_fts (pacientes_fts, rowid, nombre, apellido_paterno, apellido_materno, comentarios)
+            VALUES ('delete', old.id, old.nombre, old.apellido_paterno, old.apellido_materno, old.comentarios);
+        END
+        """,
+        """
+        CREATE TRIGGER pacientes_fts_update
+        AFTER UPDATE OF nombre, apellido_paterno, apellido_materno, comentarios ON pacientes BEGIN
+            INSERT INTO pacientes_fts (pacientes_fts, rowid, nombre, apellido_paterno, apellido_materno, comentarios)
+            VALUES ('delete', old.id, old.nombre, old.apellido_paterno, old.apellido_materno, old.comentarios);
+            INSERT INTO pacientes_fts (rowid, nombre, apellido_paterno, apellido_materno, comentarios)
+            VALUES (new.id, new.nombre, new.apellido_paterno, new.apellido_materno, new.comentarios);
+        END
+        """,
+        """
+        CREATE VIRTUAL TABLE diagnosticos_fts USING fts5(
+            codigo_diagnostico, nombre_diagnostico, comentarios,
+            content='diagnosticos', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        """,
+        """
+        CREATE TRIGGER diagnosticos_fts_insert AFTER INSERT ON diagnosticos BEGIN
+            INSERT INTO diagnosticos_fts (rowid, codigo_diagnostico, nombre_diagnostico, comentarios)
+            VALUES (new.id, new.codigo_diagnostico, new.nombre_diagnostico, new.comentarios);
+        END
+        """,
+        """
+        CREATE TRIGGER diagnosticos_fts_delete AFTER DELETE ON diagnosticos BEGIN
+            INSERT INTO diagnosticos_fts (diagnosticos_fts, rowid, codigo_diagnostico, nombre_diagnostico, comentarios)
+            VALUES ('delete', old.id, old.codigo_diagnostico, old.nombre_diagnostico, old.comentarios);
+        END
+        """,
+        """
+        CREATE TRIGGER diagnosticos_fts_update
+        AFTER UPDATE OF codigo_diagnostico, nombre_diagnostico, comentarios ON diagnosticos BEGIN
+            INSERT INTO diagnosticos_fts (diagnosticos_fts, rowid, codigo_diagnostico, nombre_diagnostico, comentarios)
+            VALUES ('delete', old.id, old.codigo_diagnostico, old.nombre_diagnostico, old.comentarios);
+            INSERT INTO diagnosticos_fts (rowid, codigo_diagnostico, nombre_diagnostico, comentarios)
+            VALUES (new.id, new.codigo_diagnostico, new.nombre_diagnostico, new.comentarios);
+        END
+        """,
+        # Indexar las filas existentes
+        "INSERT INTO pacientes_fts (pacientes_fts) VALUES ('rebuild')",
+        "INSERT INTO diagnosticos_fts (diagnosticos_fts) VALUES ('rebuild')",
+        # Orden por relevancia (bm25): nombres y códigos pesan más que los comentarios
+        "INSERT INTO pacientes_fts (pacientes_fts, rank) VALUES ('rank', 'bm25(10.0, 10.0, 8.0, 1.0)')",
+        "INSERT INTO diagnosticos_fts (diagnosticos_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0)')",
+    )),
+    # Las tablas de las migraciones 5 y 6 se crearon un tiempo en schema.sql:
+    # IF NOT EXISTS conserva las de las bases de datos de esa época
+    (5, "caché de resultados derivados de cada sesión (resultados_derivados)", (
+        """
+        CREATE TABLE IF NOT EXISTS resultados_derivados (
+            id_sesion INTEGER NOT NULL,
+            tipo TEXT NOT NULL,             -- Ej: 'ppg_filtrado', 'bpm_evolucion'
+            hash_datos TEXT NOT NULL,       -- Huella de las señales de entrada
+            hash_parametros TEXT NOT NULL,  -- Huella de los parámetros del algoritmo
+            version INTEGER NOT NULL,       -- Versión del algoritmo que generó el resultado
+            parametros TEXT,                -- Parámetros en JSON (informativo)
+            datos BLOB NOT NULL,
+            fecha_calculo TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+            PRIMARY KEY (id_sesion, tipo),
+            FOREIGN KEY (id_sesion) REFERENCES sesiones(id) ON DELETE CASCADE
+        )
+        """,
+    )),
+    (6, "resumen por sesión para el análisis de cohortes (resumen_sesiones)", (
+        """
+        CREATE TABLE IF NOT EXISTS resumen_sesiones (
+            id_sesion INTEGER PRIMARY KEY NOT NULL,
+            version INTEGER NOT NULL,       -- Versión del análisis que generó la fila
+            fecha_analisis TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+            duracion_min REAL,
+            muestras INTEGER,
+            fs_estimada REAL,
+            calidad_ppg TEXT,               -- 'excellent', 'good', 'fair', 'poor'
+            snr_db REAL,
+            artefactos INTEGER,
+            artefactos_seg REAL,
+            bpm_medio REAL,
+            bpm_std REAL,
+            bpm_min REAL,
+            bpm_max REAL,
+            bpm_inicio REAL,                -- Media del primer tercio de la sesión
+            bpm_final REAL,                 -- Media del último tercio de la sesión
+            bpm_cambio_pct REAL,
+            rmssd REAL,
+            sdnn REAL,
+            lf_hf REAL,
+            eog_rms REAL,
+            eog_movimientos_seg REAL,
+            error TEXT,                     -- NULL si el análisis se completó
+            FOREIGN KEY (id_sesion) REFERENCES sesiones(id) ON DELETE CASCADE
+        )
+        """,
+    )),
+    (7, "estado del resumen de sesión: sin datos separado de los errores", (
+        # 'completo', 'sin_datos', 'datos_insuficientes' o 'error' (solo este se reintenta)
+        "ALTER TABLE resumen_sesiones ADD COLUMN estado TEXT NOT NULL DEFAULT 'completo'",
+        # Los resúmenes anteriores guardaban la falta de datos como error
+        "UPDATE resumen_sesiones SET estado = 'sin_datos', error = NULL WHERE error = 'Sin datos PPG'",
+        "UPDATE resumen_sesiones SET estado = 'datos_insuficientes', error = NULL "
+        "WHERE error = 'Datos PPG insuficientes'",
+        "UPDATE resumen_sesiones SET estado = 'error' WHERE error IS NOT NULL",
+    )),
+]
+
+# Versión del esquema que espera el código actual
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """Versión del esquema guardada en la base de datos (PRAGMA user_version)."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _run_step(conn, step):
+    """Ejecutar una sentencia SQL o una función de migración."""
+    if callable(step):
+        step(conn)
+    else:
+        conn.execute(step)
+
+
+def apply_migrations(conn):
+    """
+    Aplicar en orden las migraciones pendientes.
+
+    Las llaves foráneas se desactivan durante cada migración (necesario para
+    reconstruir tablas) y se verifican con foreign_key_check antes del commit.
+
+    Args:
+        conn: Conexión sqlite3 (sin transacción abierta)
+
+    Returns:
+        int: Número de migraciones aplicadas
+
+    Raises:
+        sqlite3.Error: Si una migración falla (se deshace por completo)
+    """
+    if conn.in_transaction:
+        conn.commit()
+
+    applied = 0
+    for version, description, steps in MIGRATIONS:
+        if version <= get_schema_version(conn):
+            continue
+
+        conn.execute("PRAGMA foreign_keys = OFF")
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Otra instancia pudo aplicarla mientras se esperaba el bloqueo
+            if version <= get_schema_version(conn):
+                conn.rollback()
+                continue
+
+            print(f"🔧 Aplicando migración {version}: {description}")
+            violations_before = len(conn.execute("PRAGMA foreign_key_check").fetchall())
+            for step in steps:
+                _run_step(conn, step)
+
+            # Solo se rechazan referencias inválidas nuevas (no las heredadas)
+            violations = len(conn.execute("PRAGMA foreign_key_check").fetchall())
+            if violations > violations_before:
+                raise sqlite3.IntegrityError(
+                    f"La migración {version} deja {violations - violations_before} referencias inválidas"
+                )
+
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+            applied += 1
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("PRAGMA foreign_keys = ON")
+
+    return applied
@@ -1,3 +1,12 @@
+-- Esquema base (versión 0). Los cambios posteriores se aplican con las
+-- migraciones numeradas de database/migrations.py (PRAGMA user_version).
+--
+-- Este archivo está CONGELADO: describe la versión 0 y no debe reflejar el
+-- esquema actual. Las migraciones parten de él (p.ej. la 2 reconstruye
+-- sesiones sin las columnas datos_*), así que una base de datos nueva pasa
+-- por todas ellas; sobre tablas vacías cada paso es inmediato. Cualquier
+-- cambio de esquema va en una migración nueva, nunca aquí.
+
 -- administradores
 CREATE TABLE IF NOT EXISTS administradores (
     id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
@@ -59,4 +68,4 @@ CREATE TABLE IF NOT EXISTS sesiones (
     datos_bpm BLOB,
     comentarios TEXT,
     FOREIGN KEY (id_paciente) REFERENCES pacientes(id)
-);
\ No newline at end of file
+);
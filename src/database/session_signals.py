@@ -0,0 +1,159 @@
+"""
+Carga tipada y perezosa de las señales de una sesión.
+
+SessionSignals se comporta como el diccionario de sesión que usan los
+análisis ('timestamps', 'eog_data', 'ppg_data', 'bpm_data' y los metadatos),
+pero cada canal se lee de la base de datos y se decodifica solo la primera
+vez que se accede a él. Un análisis que solo necesita BPM no lee ni
+descomprime EOG ni PPG.
+
+Los canales se decodifican directamente en arrays preasignados con su tipo
+de almacenamiento (int32 para timestamps, int16 para EOG/PPG, float32 para
+BPM), sin pasar por float64 ni por listas de Python: cada bloque de la
+tabla bloques_senal se descomprime sobre su tramo del array.
+
+Uso:
+    session = SessionSignals.load(session_id)
+    bpm = session['bpm_data']          # solo se lee y decodifica el canal BPM
+    session.preload('ms', 'ppg')       # varios canales en una sola consulta
+    session.release('ppg')             # liberar memoria de un canal
+"""
+
+from collections.abc import Mapping
+
+import numpy as np
+
+from database.database_manager import DatabaseManager, SIGNAL_DTYPES
+from database.signal_codec import SignalReader, read_chunked
+
+
+class SessionSignals(Mapping):
+    """Metadatos de una sesión con acceso perezoso a sus canales de señal."""
+
+    # Clave del diccionario de sesión -> canal almacenado
+    SIGNAL_KEYS = {
+        'timestamps': 'ms',
+        'eog_data': 'eog',
+        'ppg_data': 'ppg',
+        'bpm_data': 'bpm',
+    }
+
+    def __init__(self, session_id, metadata):
+        """
+        Args:
+            session_id: ID de la sesión
+            metadata: Diccionario con los campos no señal de la sesión
+        """
+        self.session_id = session_id
+        self.metadata = dict(metadata)
+        self._channels = {}
+
+    @classmethod
+    def load(cls, session_id):
+        """
+        Leer los metadatos de una sesión (sin tocar sus señales).
+
+        Args:
+            session_id: ID de la sesión
+
+        Returns:
+            SessionSignals o None si la sesión no existe
+        """
+        session = DatabaseManager.get_session(session_id)
+        if not session:
+            return None
+
+        metadata = dict(session)
+        metadata['patient_id'] = session['id_paciente']
+        return cls(session_id, metadata)
+
+    @staticmethod
+    def decode_channel(channel, chunks):
+        """
+        Decodificar los bloques de un canal en un array de su tipo de almacenamiento.
+
+        Args:
+            channel: Canal ('ms', 'eog', 'ppg', 'bpm')
+            chunks: Lista ordenada de (muestra_inicio, BLOB del bloque)
+
+        Returns:
+            np.ndarray: Muestras del canal (vacío si no hay datos)
+        """
+        if not chunks:
+            return np.empty(0, dtype=np.dtype(SIGNAL_DTYPES[channel]))
+
+        # El códec puede haber ampliado int16 a int32: se respeta su tipo
+        last_start, last_blob = chunks[-1]
+        last_reader = SignalReader(last_blob)
+        out = np.empty(last_start + len(last_reader), dtype=last_reader.dtype.newbyteorder('='))
+        return read_chunked(chunks, out=out)
+
+    def preload(self, *channels):
+        """
+        Leer y decodificar varios canales con una sola consulta.
+
+        Args:
+            *channels: Canales a cargar ('ms', 'eog', 'ppg', 'bpm'); los ya
+                       cargados se omiten
+
+        Returns:
+            SessionSignals: La propia instancia
+        """
+        missing = [channel for channel in dict.fromkeys(channels) if channel not in self._channels]
+        if not missing:
+            return self
+
+        chunks = DatabaseManager.get_session_signal_chunks(self.session_id, missing)
+        if chunks is None:
+            raise LookupError(f"No se pudieron leer las señales de la sesión {self.session_id}")
+
+        for channel in missing:
+            self._channels[channel] = self.decode_channel(channel, chunks[channel])
+        return self
+
+    def channel(self, channel):
+        """
+        Muestras de un canal (se cargan la primera vez).
+
+        Args:
+            channel: Canal ('ms', 'eog', 'ppg', 'bpm')
+
+        Returns:
+            np.ndarray: Muestras del canal
+        """
+        if channel not in SIGNAL_DTYPES:
+            raise KeyError(f"Canal desconocido: {channel}")
+        if channel not in self._channels:
+            self.preload(channel)
+        return self._channels[channel]
+
+    def release(self, *channels):
+        """Olvidar canales decodificados (se volverán a leer si se piden)."""
+        for channel in channels or tuple(self._channels):
+            self._channels.pop(channel, None)
+
+    @property
+    def loaded_channels(self):
+        """Canales actualmente decodificados en memoria."""
+        return tuple(self._channels)
+
+    @property
+    def nbytes(self):
+        """Memoria ocupada por los canales decodificados (bytes)."""
+        return sum(values.nbytes for values in self._channels.values())
+
+    def __getitem__(self, key):
+        if key in self.SIGNAL_KEYS:
+            return self.channel(self.SIGNAL_KEYS[key])
+        return self.metadata[key]
+
+    def __iter__(self):
+        yield from self.metadata
+        yield from self.SIGNAL_KEYS
+
+    def __len__(self):
+        return len(self.metadata) + len(self.SIGNAL_KEYS)
+
+    def __repr__(self):
+        return (f"SessionSignals(id={self.session_id}, "
+                f"canales cargados={list(self._channels)})")
@@ -0,0 +1,406 @@
+"""
+Códec binario versionado para las señales de una sesión (BLOBs de sesiones).
+
+Sustituye a pickle+zlib del array completo por un formato tipado y
+direccionable por bloques:
+
+    header  : magic(4) | versión(u1) | tipo(u1) | flags(u2) | fs(f4) |
+              n_muestras(u4) | muestras_por_bloque(u4) | n_bloques(u4)
+    índice  : por bloque -> offset(u8) | bytes(u4) | primero(f8) | mínimo(f8) | máximo(f8)
+    bloques : cada bloque (~10 s) comprimido con zlib por separado
+
+Todas las señales se guardan codificadas en deltas sobre su representación
+entera (las float32 se reinterpretan como int32), con aritmética modular y
+reconstrucción exacta con cumsum. Timestamps regulares, señales lentas y
+BPM constante durante segundos quedan como largas rachas de valores
+repetidos que zlib comprime mucho mejor que los valores absolutos.
+
+Gracias al índice, leer un rango de muestras solo descomprime los bloques
+que lo cubren. Los mínimos/máximos por bloque permiten además dibujar una
+vista general sin descomprimir nada.
+
+En la base de datos cada bloque se guarda en su propia fila (tabla
+bloques_senal) como un BLOB independiente de un solo bloque: split_chunks()
+separa un BLOB completo sin recomprimir y read_chunked() reconstruye un
+rango a partir de las filas leídas.
+
+Los BLOBs antiguos (pickle+zlib) se siguen leyendo con decode_signal(); la
+migración 3 del esquema los convierte al códec.
+"""
+
+import struct
+import zlib
+
+import numpy as np
+
+SIGNAL_MAGIC = b'EMSG'
+SIGNAL_VERSION = 1
+
+# Flags del header
+FLAG_DELTA = 0x0001
+
+# Códigos de tipo de dato soportados
+_DTYPE_CODES = {
+    0: np.dtype('<i2'),
+    1: np.dtype('<i4'),
+    2: np.dtype('<f4'),
+}
+_CODE_BY_DTYPE = {dtype: code for code, dtype in _DTYPE_CODES.items()}
+
+# Tipo entero del mismo tamaño sobre el que se calculan los deltas
+_DELTA_VIEW = {
+    np.dtype('<i2'): np.dtype('<i2'),
+    np.dtype('<i4'): np.dtype('<i4'),
+    np.dtype('<f4'): np.dtype('<i4'),
+}
+
+_HEADER = struct.Struct('<4sBBHfIII')
+
+INDEX_DTYPE = np.dtype([
+    ('offset', '<u8'),   # Posición del bloque relativa al inicio de los datos
+    ('nbytes', '<u4'),   # Tamaño comprimido del bloque
+    ('first', '<f8'),    # Primer valor del bloque
+    ('min', '<f8'),      # Mínimo del bloque
+    ('max', '<f8'),      # Máximo del bloque
+])
+
+DEFAULT_CHUNK_SECONDS = 10
+DEFAULT_COMPRESSION_LEVEL = 6
+
+
+def is_encoded(blob):
+    """True si el BLOB está en el formato del códec (y no es pickle antiguo)."""
+    return blob is not None and len(blob) >= _HEADER.size and bytes(blob[:4]) == SIGNAL_MAGIC
+
+
+def _resolve_dtype(data, dtype):
+    """Elegir el tipo de almacenamiento, ampliando int16 a int32 si no cabe."""
+    dtype = np.dtype(dtype).newbyteorder('<')
+    if dtype not in _CODE_BY_DTYPE:
+        raise ValueError(f"Tipo de dato no soportado por el códec: {dtype}")
+
+    if dtype == np.dtype('<i2') and len(data):
+        info = np.iinfo(np.int16)
+        if data.min() < info.min or data.max() > info.max:
+            print("Advertencia: valores fuera de rango int16, se almacenan como int32")
+            dtype = np.dtype('<i4')
+    return dtype
+
+
+def encode_signal(data, dtype=np.int32, sample_rate=125, chunk_seconds=DEFAULT_CHUNK_SECONDS,
+                  level=DEFAULT_COMPRESSION_LEVEL):
+    """
+    Codificar una señal completa.
+
+    Args:
+        data: Secuencia o array 1D con la señal
+        dtype: Tipo de almacenamiento (int16, int32 o float32)
+        sample_rate: Frecuencia de muestreo (Hz), guardada en el header
+        chunk_seconds: Duración aproximada de cada bloque (s)
+        level: Nivel de compresión zlib
+
+    Returns:
+        bytes: BLOB codificado
+    """
+    data = np.asarray(data)
+    dtype = _resolve_dtype(data, dtype)
+    values = np.ascontiguousarray(data, dtype=dtype)
+
+    flags = FLAG_DELTA
+    delta_values = values.view(_DELTA_VIEW[dtype])
+    chunk_size = max(1, int(round(chunk_seconds * sample_rate)))
+    n_samples = len(values)
+    n_chunks = -(-n_samples // chunk_size)
+
+    index = np.zeros(n_chunks, dtype=INDEX_DTYPE)
+    payloads = []
+    offset = 0
+    for i in range(n_chunks):
+        chunk = values[i * chunk_size:(i + 1) * chunk_size]
+        raw = delta_values[i * chunk_size:(i + 1) * chunk_size]
+
+        # Primer valor absoluto y luego diferencias (desbordamiento modular exacto)
+        encoded = np.empty_like(raw)
+        encoded[0] = raw[0]
+        np.subtract(raw[1:], raw[:-1], out=encoded[1:])
+
+        payload = zlib.compress(encoded.tobytes(), level)
+        payloads.append(payload)
+
+        index[i] = (offset, len(payload), chunk[0], chunk.min(), chunk.max())
+        offset += len(payload)
+
+    header = _HEADER.pack(
+        SIGNAL_MAGIC, SIGNAL_VERSION, _CODE_BY_DTYPE[dtype], flags,
+        float(sample_rate), n_samples, chunk_size, n_chunks
+    )
+    return b''.join([header, index.tobytes()] + payloads)
+
+
+class SignalReader:
+    """
+    Lector de un BLOB codificado que descomprime solo los bloques necesarios.
+
+    Uso:
+        reader = SignalReader(blob)
+        ventana = reader.read(start=7500, stop=15000)   # solo 6-7 bloques
+    """
+
+    def __init__(self, blob):
+        """
+        Analizar header e índice (sin descomprimir datos).
+
+        Args:
+            blob: BLOB producido por encode_signal
+
+        Raises:
+            ValueError: Si el BLOB no tiene el formato o la versión esperados
+        """
+        if not is_encoded(blob):
+            raise ValueError("El BLOB no está en el formato del códec de señales")
+
+        self._blob = memoryview(blob)
+        magic, version, dtype_code, flags, sample_rate, n_samples, chunk_size, n_chunks = \
+            _HEADER.unpack_from(self._blob, 0)
+        if version != SIGNAL_VERSION:
+            raise ValueError(f"Versión de códec no soportada: {version}")
+
+        self.dtype = _DTYPE_CODES[dtype_code]
+        self.flags = flags
+        self.sample_rate = sample_rate
+        self.n_samples = n_samples
+        self.chunk_size = chunk_size
+        self.n_chunks = n_chunks
+
+        index_end = _HEADER.size + n_chunks * INDEX_DTYPE.itemsize
+        self.chunk_index = np.frombuffer(self._blob[_HEADER.size:index_end], dtype=INDEX_DTYPE)
+        self._data_start = index_end
+
+    def __len__(self):
+        """Número total de muestras de la señal."""
+        return self.n_samples
+
+    def read_chunk(self, chunk_number):
+        """
+        Decodificar un bloque.
+
+        Args:
+            chunk_number: Índice del bloque
+
+        Returns:
+            np.ndarray: Muestras del bloque
+        """
+        entry = self.chunk_index[chunk_number]
+        start = self._data_start + int(entry['offset'])
+        raw = zlib.decompress(self._blob[start:start + int(entry['nbytes'])])
+
+        if self.flags & FLAG_DELTA:
+            delta_dtype = _DELTA_VIEW[self.dtype]
+            return np.cumsum(np.frombuffer(raw, dtype=delta_dtype), dtype=delta_dtype).view(self.dtype)
+        return np.frombuffer(raw, dtype=self.dtype)
+
+    def read(self, start=0, stop=None, out=None):
+        """
+        Decodificar el rango de muestras [start, stop).
+
+        Cada bloque se descomprime y se reconstruye directamente sobre su
+        tramo del array de salida, sin arrays intermedios por bloque.
+
+        Args:
+            start: Primera muestra
+            stop: Muestra final (exclusiva); None para leer hasta el final
+            out: Array 1D preasignado (stop - start muestras, tipo nativo del
+                 almacenamiento) donde escribir; None para crear uno nuevo
+
+        Returns:
+            np.ndarray: Muestras del rango (tipo nativo del almacenamiento)
+        """
+        native_dtype = self.dtype.newbyteorder('=')
+        stop = self.n_samples if stop is None else min(stop, self.n_samples)
+        start = max(0, start)
+        n_out = max(0, stop - start)
+
+        if out is None:
+            out = np.empty(n_out, dtype=native_dtype)
+        elif out.shape != (n_out,) or out.dtype != native_dtype:
+            raise ValueError(f"'out' debe ser un array {native_dtype} de {n_out} muestras")
+        if n_out == 0:
+            return out
+
+        delta_dtype = _DELTA_VIEW[self.dtype].newbyteorder('=')
+        out_view = out.view(delta_dtype) if self.flags & FLAG_DELTA else out
+
+        first_chunk = start // self.chunk_size
+        last_chunk = (stop - 1) // self.chunk_size
+        for chunk_number in range(first_chunk, last_chunk + 1):
+            chunk_start = chunk_number * self.chunk_size
+            lo = max(start, chunk_start)
+            hi = min(stop, chunk_start + self.chunk_size)
+            target = out_view[lo - start:hi - start]
+
+            entry = self.chunk_index[chunk_number]
+            offset = self._data_start + int(entry['offset'])
+            raw = zlib.decompress(self._blob[offset:offset + int(entry['nbytes'])])
+
+            if self.flags & FLAG_DELTA:
+                deltas = np.frombuffer(raw, dtype=_DELTA_VIEW[self.dtype])
+                # Los deltas se acumulan desde el inicio del bloque; solo se
+                # reconstruye hasta la última muestra pedida
+                deltas = deltas[:hi - chunk_start]
+                if lo == chunk_start:
+                    np.cumsum(deltas, dtype=delta_dtype, out=target)
+                else:
+                    target[:] = np.cumsum(deltas, dtype=delta_dtype)[lo - chunk_start:]
+            else:
+                target[:] = np.frombuffer(raw, dtype=self.dtype)[lo - chunk_start:hi - chunk_start]
+
+        return out
+
+    def read_all(self):
+        """Decodificar la señal completa."""
+        return self.read(0, self.n_samples)
+
+    def split_chunks(self):
+        """
+        Separar la señal en BLOBs independientes de un bloque, sin recomprimir.
+
+        Returns:
+            list: (muestra_inicial, BLOB del bloque) por bloque, en orden
+        """
+        chunks = []
+        for chunk_number, entry in enumerate(self.chunk_index):
+            chunk_start = chunk_number * self.chunk_size
+            n_samples = min(self.chunk_size, self.n_samples - chunk_start)
+            header = _HEADER.pack(
+                SIGNAL_MAGIC, SIGNAL_VERSION, _CODE_BY_DTYPE[self.dtype], self.flags,
+                self.sample_rate, n_samples, self.chunk_size, 1
+            )
+            index = np.array([(0, entry['nbytes'], entry['first'], entry['min'], entry['max'])],
+                             dtype=INDEX_DTYPE)
+            offset = self._data_start + int(entry['offset'])
+            payload = self._blob[offset:offset + int(entry['nbytes'])]
+            chunks.append((chunk_start, b''.join([header, index.tobytes(), payload])))
+        return chunks
+
+    def chunk_bounds(self):
+        """
+        Mínimo y máximo de cada bloque (sin descomprimir).
+
+        Returns:
+            tuple: (inicio_muestra, mínimos, máximos) por bloque
+        """
+        starts = np.arange(self.n_chunks) * self.chunk_size
+        return starts, self.chunk_index['min'].copy(), self.chunk_index['max'].copy()
+
+    def locate_range(self, low, high):
+        """
+        Rango de muestras [start, stop) cuyos valores caen en [low, high].
+
+        Solo válido para señales no decrecientes (p.ej. timestamps en ms).
+        Usa el índice para elegir los bloques y decodifica solo los bloques
+        de los extremos.
+
+        Args:
+            low: Valor mínimo (p.ej. ms inicial)
+            high: Valor máximo (p.ej. ms final)
+
+        Returns:
+            tuple: (start, stop) en muestras
+        """
+        if self.n_chunks == 0 or high < low:
+            return 0, 0
+
+        mins = self.chunk_index['min']
+        maxs = self.chunk_index['max']
+
+        # Primer bloque cuyo máximo alcanza 'low'
+        first_chunk = int(np.searchsorted(maxs, low, side='left'))
+        if first_chunk >= self.n_chunks:
+            return self.n_samples, self.n_samples
+        chunk = self.read_chunk(first_chunk)
+        start = first_chunk * self.chunk_size + int(np.searchsorted(chunk, low, side='left'))
+
+        # Último bloque cuyo mínimo no supera 'high'
+        last_chunk = int(np.searchsorted(mins, high, side='right')) - 1
+        if last_chunk < 0:
+            return 0, 0
+        if last_chunk != first_chunk:
+            chunk = self.read_chunk(last_chunk)
+        stop = last_chunk * self.chunk_size + int(np.searchsorted(chunk, high, side='right'))
+
+        return start, max(start, stop)
+
+
+def read_chunked(chunks, start=0, stop=None, out=None):
+    """
+    Decodificar el rango [start, stop) de una señal guardada por bloques.
+
+    Args:
+        chunks: Secuencia ordenada y contigua de (muestra_inicial, BLOB de
+                split_chunks) que cubre el rango pedido
+        start: Primera muestra (absoluta en la señal)
+        stop: Muestra final (exclusiva); None para leer hasta el último bloque
+        out: Array 1D preasignado (tipo nativo del almacenamiento); None para
+             crear uno nuevo
+
+    Returns:
+        np.ndarray: Muestras del rango, recortado a los bloques recibidos
+    """
+    readers = [(int(chunk_start), SignalReader(blob)) for chunk_start, blob in chunks]
+    if not readers:
+        return out if out is not None else np.empty(0)
+
+    end = readers[-1][0] + len(readers[-1][1])
+    stop = end if stop is None else min(stop, end)
+    start = max(start, readers[0][0])
+    n_out = max(0, stop - start)
+
+    native_dtype = readers[0][1].dtype.newbyteorder('=')
+    if out is None:
+        out = np.empty(n_out, dtype=native_dtype)
+    elif out.shape != (n_out,) or out.dtype != native_dtype:
+        raise ValueError(f"'out' debe ser un array {native_dtype} de {n_out} muestras")
+
+    for chunk_start, reader in readers:
+        lo = max(start, chunk_start)
+        hi = min(stop, chunk_start + len(reader))
+        if hi > lo:
+            reader.read(lo - chunk_start, hi - chunk_start, out=out[lo - start:hi - start])
+    return out
+
+
+def decode_signal(blob, start=0, stop=None, dtype=None):
+    """
+    Decodificar un BLOB de señal, nuevo o antiguo.
+
+    Args:
+        blob: BLOB del códec o BLOB antiguo pickle+zlib (None devuelve None)
+        start: Primera muestra
+        stop: Muestra final (exclusiva)
+        dtype: Tipo esperado para los BLOBs antiguos (se convierte si no
+               pierde información); los del códec ya están tipados
+
+    Returns:
+        np.ndarray o None: Muestras decodificadas
+    """
+    if blob is None:
+        return None
+    if is_encoded(blob):
+        return SignalReader(blob).read(start, stop)
+
+    values = decode_legacy_signal(blob)[start:stop]
+    if dtype is not None and values.dtype != dtype:
+        typed = values.astype(dtype)
+        if np.array_equal(typed, values):
+            return typed
+    return values
+
+
+def decode_legacy_signal(blob):
+    """
+    Decodificar un BLOB antiguo (array o lista serializados con pickle + zlib).
+
+    Solo para filas anteriores al códec; la migración 3 del esquema los convierte.
+    """
+    import pickle
+    return np.asarray(pickle.loads(zlib.decompress(blob)))
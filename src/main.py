@@ -1,5 +1,5 @@
 import sys
-from PySide6.QtWidgets import QApplication
+from PySide6.QtWidgets import QApplication, QMessageBox
 
 # Importaciones para componentes específicos
 from views.auth.login import LoginWidget
@@ -8,6 +8,71 @@ from views.therapist.therapist_dashboard import TherapistDashboard
 
 # Importar e inicializar la base de datos
 from database.db_connection import init_db
+from database.database_manager import DatabaseManager
+
+# Registros de adquisición interrumpidos (recuperación tras un cierre inesperado)
+from sensor.acquisition_log import find_pending_logs, read_log, discard_log
+
+def offer_session_recovery():
+    """Ofrece importar a la base de datos las capturas que no llegaron a guardarse"""
+    pending_logs = find_pending_logs()
+    if not pending_logs:
+        return
+    
+    msg_box = QMessageBox()
+    msg_box.setWindowTitle("Recuperar sesiones")
+    msg_box.setIcon(QMessageBox.Question)
+    msg_box.setText(f"Se encontraron {len(pending_logs)} captura(s) sin guardar de un cierre inesperado.")
+    msg_box.setInformativeText("¿Desea recuperarlas en la base de datos?")
+    recover_button = msg_box.addButton("Recuperar", QMessageBox.YesRole)
+    discard_button = msg_box.addButton("Descartar", QMessageBox.DestructiveRole)
+    msg_box.addButton("Más tarde", QMessageBox.RejectRole)
+    msg_box.setDefaultButton(recover_button)
+    msg_box.exec()
+    
+    clicked = msg_box.clickedButton()
+    if clicked == discard_button:
+        for log_path in pending_logs:
+            discard_log(log_path)
+        print(f"🗑️ {len(pending_logs)} captura(s) sin guardar descartadas")
+        return
+    if clicked != recover_button:
+        return
+    
+    recovered = 0
+    for log_path in pending_logs:
+        try:
+            log_data = read_log(log_path)
+            if log_data['n_samples'] == 0:
+                discard_log(log_path)
+                continue
+            
+            columns = log_data['columns']
+            session_id = DatabaseManager.add_session(
+                id_paciente=log_data['patient_id'],
+                fecha=log_data['fecha'],
+                objetivo=log_data['objetivo'],
+                datos_ms=columns['timestamp'],
+                datos_eog=columns['eog_raw'],
+                datos_ppg=columns['ppg_raw'],
+                datos_bpm=columns['pulse_bpm'],
+                comentarios="Sesión recuperada tras un cierre inesperado"
+            )
+            if session_id is None:
+                continue
+            
+            # La sesión ya está guardada: el registro no debe volver a ofrecerse
+            discard_log(log_path)
+            recovered += 1
+            print(f"✅ Captura recuperada: {log_path.name} ({log_data['n_samples']} muestras)")
+        except (OSError, ValueError) as e:
+            print(f"❌ No se pudo recuperar {log_path.name}: {e}")
+    
+    QMessageBox.information(
+        None,
+        "Recuperar sesiones",
+        f"Se recuperaron {recovered} de {len(pending_logs)} captura(s)."
+    )
 
 def main():
     """Función principal que inicia la aplicación con autenticación"""
@@ -17,6 +82,7 @@ def main():
     # Inicializar base de datos al arrancar
     print("🔧 Inicializando base de datos...")
     init_db()
+    offer_session_recovery()
     
     # Variables para las ventanas principales
     login_window = None
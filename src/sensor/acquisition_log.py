@@ -0,0 +1,341 @@
+"""
+Registro binario de adquisición tolerante a fallos (append-only).
+
+Durante la captura, cada lote de muestras decodificadas se añade a un
+archivo con registros de ancho fijo, sincronizado periódicamente con el
+disco (fsync). Si la aplicación se cierra de forma inesperada, el archivo
+queda en disco y puede importarse a la base de datos en el siguiente inicio.
+
+Formato del archivo (little endian):
+    prefijo fijo  : magic(8) | versión(u2) | tamaño_header(u2) | tamaño_registro(u2) |
+                    frecuencia_muestreo(u2) | id_paciente(i4) | n_sesion(i4) | inicio_ms(i8)
+    metadatos     : JSON UTF-8 (fecha y objetivo de la sesión) hasta completar el header
+    registros     : index(i4) | timestamp(i4) | eog_raw(i2) | ppg_raw(i2) | pulse_bpm(f4)
+
+Un registro incompleto al final (corte de energía a mitad de escritura)
+simplemente se ignora al leer.
+
+Una vez importado, el archivo se borra. Si no se puede borrar (en Windows,
+p.ej., mientras siga abierto o mapeado), se renombra con DONE_SUFFIX o se
+deja junto a él una marca con ese sufijo; find_pending_logs() lo ignora y lo
+elimina más adelante, de modo que una sesión ya guardada nunca se ofrece
+para recuperar (lo que la duplicaría).
+
+El registro en disco no sustituye al registro en memoria (SessionRecorder),
+que sigue conservando la sesión completa: la RAM de la captura no queda
+acotada, solo se evita una segunda copia al guardar.
+"""
+
+import json
+import os
+import struct
+import time
+from pathlib import Path
+
+import numpy as np
+
+from sensor.session_recorder import SESSION_COLUMNS
+
+LOG_MAGIC = b'EMDRLOG\x00'
+LOG_VERSION = 1
+
+# Extensiones: captura en curso o interrumpida / captura cerrada lista para importar
+ACTIVE_SUFFIX = '.partial'
+FINAL_SUFFIX = '.emdrlog'
+# Captura ya importada cuyo archivo no se pudo borrar (o marca junto a él)
+DONE_SUFFIX = '.importado'
+
+_PREFIX = struct.Struct('<8sHHHHiiq')
+
+# Registro de ancho fijo con las mismas columnas que SessionRecorder
+RECORD_DTYPE = np.dtype([(name, np.dtype(dtype).newbyteorder('<')) for name, dtype in SESSION_COLUMNS])
+
+
+def get_log_directory():
+    """Carpeta de los registros de adquisición (junto a la base de datos)."""
+    from database.db_connection import DB_PATH
+    return Path(DB_PATH).parent / 'acquisition_logs'
+
+
+class AcquisitionLog:
+    """
+    Escritor del registro de una captura.
+
+    Uso:
+        log = AcquisitionLog.create(patient_id, session_number, session_datetime, objetivo)
+        log.append(index=ids, timestamp=ts, eog_raw=eog, ppg_raw=ppg, pulse_bpm=bpm)
+        log.close()
+    """
+
+    def __init__(self, path, fsync_interval=1.0):
+        """
+        Abrir un registro existente para añadir datos.
+
+        Args:
+            path: Ruta del archivo (header ya escrito)
+            fsync_interval: Segundos máximos entre sincronizaciones con el disco
+        """
+        self.path = Path(path)
+        self.fsync_interval = fsync_interval
+        self.records_written = 0
+        self.failed = False  # Alguna escritura falló: al registro le faltan muestras
+        self._file = open(self.path, 'ab')
+        self._last_sync = time.monotonic()
+
+    @classmethod
+    def create(cls, patient_id, session_number, session_datetime=None, objective=None,
+               sample_rate=125, directory=None, fsync_interval=1.0):
+        """
+        Crear un registro nuevo con su header.
+
+        Args:
+            patient_id: ID del paciente en la base de datos
+            session_number: Número de sesión del paciente
+            session_datetime: datetime de inicio de la sesión
+            objective: Objetivo/tipo de la sesión
+            sample_rate: Frecuencia de muestreo (Hz)
+            directory: Carpeta destino (por defecto get_log_directory())
+            fsync_interval: Segundos máximos entre sincronizaciones con el disco
+
+        Returns:
+            AcquisitionLog: Registro abierto para añadir datos
+        """
+        directory = Path(directory) if directory else get_log_directory()
+        directory.mkdir(parents=True, exist_ok=True)
+
+        started_ms = int(time.time() * 1000)
+        path = directory / f"sesion_p{patient_id}_s{session_number}_{started_ms}{ACTIVE_SUFFIX}"
+
+        metadata = json.dumps({
+            'fecha': session_datetime.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3] if session_datetime else None,
+            'objetivo': objective,
+        }).encode('utf-8')
+        header_size = _PREFIX.size + len(metadata)
+
+        prefix = _PREFIX.pack(
+            LOG_MAGIC, LOG_VERSION, header_size, RECORD_DTYPE.itemsize, int(sample_rate),
+            int(patient_id), int(session_number or 0), started_ms
+        )
+        with open(path, 'wb') as f:
+            f.write(prefix + metadata)
+            f.flush()
+            os.fsync(f.fileno())
+
+        return cls(path, fsync_interval=fsync_interval)
+
+    @property
+    def closed(self):
+        """True si el archivo ya no admite escrituras."""
+        return self._file is None
+
+    def append(self, **columns):
+        """
+        Añadir un lote de muestras (una secuencia por columna, igual longitud).
+
+        Args:
+            **columns: index, timestamp, eog_raw, ppg_raw, pulse_bpm
+        """
+        if self._file is None or self.failed:
+            return
+
+        n_new = len(columns['index'])
+        if n_new == 0:
+            return
+
+        records = np.empty(n_new, dtype=RECORD_DTYPE)
+        for name in RECORD_DTYPE.names:
+            records[name] = columns[name]
+        try:
+            self._file.write(records.tobytes())
+            self.records_written += n_new
+
+            if time.monotonic() - self._last_sync >= self.fsync_interval:
+                self.sync()
+        except OSError as e:
+            # El registro deja de ser completo: no seguir escribiendo con un hueco
+            print(f"Error al escribir el registro de adquisición: {e}")
+            self.failed = True
+
+    def sync(self):
+        """Forzar la escritura de los datos pendientes en el disco."""
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        """Sincronizar y cerrar el archivo (se conserva en disco)."""
+        if self._file is None:
+            return
+        self.sync()
+        self._file.close()
+        self._file = None
+
+    def finalize(self):
+        """
+        Cerrar y marcar la captura como completa (renombrado atómico).
+
+        Returns:
+            Path: Ruta final del archivo
+        """
+        self.close()
+        if self.path.suffix == ACTIVE_SUFFIX:
+            final_path = self.path.with_suffix(FINAL_SUFFIX)
+            os.replace(self.path, final_path)
+            self.path = final_path
+        return self.path
+
+    def discard(self):
+        """Cerrar y eliminar el archivo (captura descartada o ya importada)."""
+        self.close()
+        discard_log(self.path)
+
+
+def _done_marker(path):
+    """Marca que indica que el registro 'path' ya fue importado."""
+    return path.with_name(path.name + DONE_SUFFIX)
+
+
+def discard_log(path):
+    """
+    Eliminar un registro ya importado o descartado sin lanzar excepciones.
+
+    Si el archivo no se puede borrar, se renombra con DONE_SUFFIX; si
+    tampoco se puede renombrar, se crea una marca junto a él. En ambos casos
+    find_pending_logs() deja de ofrecerlo.
+
+    Args:
+        path: Ruta del archivo
+
+    Returns:
+        bool: True si el archivo se eliminó
+    """
+    path = Path(path)
+    try:
+        path.unlink()
+        return True
+    except FileNotFoundError:
+        return True
+    except OSError as e:
+        print(f"No se pudo eliminar {path.name} ({e}); se marca como importado")
+
+    try:
+        os.replace(path, path.with_suffix(DONE_SUFFIX))
+    except OSError:
+        try:
+            _done_marker(path).touch()
+        except OSError as e:
+            print(f"No se pudo marcar {path.name} como importado: {e}")
+    return False
+
+
+def release_columns(columns):
+    """
+    Soltar las columnas leídas con read_log(mmap=True) y cerrar su mapeo.
+
+    En Windows un archivo mapeado no se puede borrar: hay que llamar a esta
+    función antes de discard(). Quien llama no debe conservar otras
+    referencias a las columnas (el mapeo deja de ser válido).
+
+    Args:
+        columns: Diccionario de columnas (se vacía)
+    """
+    mappings = []
+    for values in columns.values():
+        mapping = getattr(values, '_mmap', None)
+        if mapping is not None and all(mapping is not m for m in mappings):
+            mappings.append(mapping)
+    columns.clear()
+    for mapping in mappings:
+        try:
+            mapping.close()
+        except (BufferError, ValueError) as e:
+            print(f"No se pudo cerrar el mapeo del registro: {e}")
+
+
+def read_log(path, mmap=False):
+    """
+    Leer un registro completo.
+
+    Args:
+        path: Ruta del archivo
+        mmap: Si True, las columnas son vistas de un np.memmap de solo lectura
+              (no se carga la sesión en RAM); hay que soltarlas antes de
+              borrar el archivo
+
+    Returns:
+        dict: {
+            'patient_id', 'session_number', 'sample_rate', 'started_ms',
+            'fecha', 'objetivo': datos del header,
+            'n_samples': número de registros completos,
+            'columns': {nombre_columna: np.ndarray}
+        }
+
+    Raises:
+        ValueError: Si el archivo no es un registro de adquisición válido
+    """
+    path = Path(path)
+    with open(path, 'rb') as f:
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            raise ValueError(f"Header incompleto en {path.name}")
+
+        magic, version, header_size, record_size, sample_rate, patient_id, session_number, started_ms = \
+            _PREFIX.unpack(prefix)
+        if magic != LOG_MAGIC or version != LOG_VERSION or record_size != RECORD_DTYPE.itemsize:
+            raise ValueError(f"{path.name} no es un registro de adquisición compatible")
+
+        metadata = json.loads(f.read(header_size - _PREFIX.size).decode('utf-8') or '{}')
+
+        # Ignorar un posible registro final a medio escribir
+        n_samples = (path.stat().st_size - header_size) // record_size
+        if not mmap:
+            records = np.fromfile(f, dtype=RECORD_DTYPE, count=n_samples)
+
+    if mmap:
+        if n_samples > 0:
+            records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=header_size, shape=(n_samples,))
+        else:
+            records = np.empty(0, dtype=RECORD_DTYPE)
+
+    return {
+        'patient_id': patient_id,
+        'session_number': session_number,
+        'sample_rate': sample_rate,
+        'started_ms': started_ms,
+        'fecha': metadata.get('fecha'),
+        'objetivo': metadata.get('objetivo'),
+        'n_samples': len(records),
+        'columns': {name: records[name] for name in RECORD_DTYPE.names},
+    }
+
+
+def find_pending_logs(directory=None):
+    """
+    Buscar registros que no llegaron a importarse (capturas interrumpidas).
+
+    Args:
+        directory: Carpeta a revisar (por defecto get_log_directory())
+
+    Returns:
+        list[Path]: Rutas ordenadas por antigüedad
+    """
+    directory = Path(directory) if directory else get_log_directory()
+    if not directory.exists():
+        return []
+
+    # Restos de capturas ya importadas: reintentar el borrado (si es una
+    # marca, primero el registro al que acompaña)
+    for path in directory.glob('*' + DONE_SUFFIX):
+        original = path.with_name(path.name[:-len(DONE_SUFFIX)])
+        try:
+            if original.suffix in (ACTIVE_SUFFIX, FINAL_SUFFIX):
+                original.unlink(missing_ok=True)
+            path.unlink()
+        except OSError:
+            pass
+
+    pending = [p for p in directory.iterdir()
+               if p.suffix in (ACTIVE_SUFFIX, FINAL_SUFFIX) and not _done_marker(p).exists()]
+    return sorted(pending, key=lambda p: p.stat().st_mtime)
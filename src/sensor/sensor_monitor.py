@@ -1,13 +1,10 @@
 import sys
 import numpy as np
-import struct
 import threading
 import time
 import os
-from collections import deque
 import pandas as pd
 from datetime import datetime
-from scipy import signal
 
 # PyQtGraph y PySide6 imports
 from PySide6.QtWidgets import (
@@ -23,24 +20,30 @@ from models.devices import Devices, KNOWN_SLAVES
 
 # Importación del filtro en tiempo real
 from utils.signal_processing import OnlinePPGFilter, OnlineEOGFilter, PPGHeartRateCalculator
+from utils.packet_decoder import PacketDecoder
+from utils.ring_buffer import RingBuffer
+from sensor.session_recorder import SessionRecorder
+from sensor.acquisition_log import AcquisitionLog, read_log
 
 # Configuración constantes
 SAMPLE_RATE = 125  # Hz (tasa efectiva: 250 SPS ÷ 2 canales)
 DISPLAY_TIME = 5   # Segundos de datos a mostrar en la gráfica
 GRAPH_PADDING = 0.01  # Espacio entre el borde de la gráfica y los datos
-BUFFER_SIZE = 512  # Tamaño máximo de buffer
 
-# Constantes para el protocolo binario
-PACKET_HEADER = 0xAA55  # Debe coincidir con el header en el código Arduino
-PACKET_SIZE = 15        # Tamaño en bytes de cada paquete
+# Filas del buffer circular de visualización (todas escritas a la vez)
+ROW_TIME, ROW_EOG_RAW, ROW_EOG_FILTERED, ROW_PPG_RAW, ROW_PPG_FILTERED, ROW_BPM = range(6)
+DISPLAY_ROWS = 6
 
 class SignalsObject(QObject):
     device_status_updated = Signal(dict, bool)
     
 class SensorMonitor(QWidget):
-    def __init__(self, display_time=DISPLAY_TIME, parent=None):
+    def __init__(self, display_time=DISPLAY_TIME, parent=None, block_processing=True):
         super().__init__(parent)
         
+        # Procesar cada lote decodificado como un vector (True) o muestra a muestra (False)
+        self.block_processing = block_processing
+        
         # Ya no necesitamos configuración de puerto y baudrate
         self.running = False
         self.reading_thread = None
@@ -55,28 +58,21 @@ class SensorMonitor(QWidget):
         self.display_size = display_time * SAMPLE_RATE
         self.sample_interval = 1.0 / SAMPLE_RATE
         
-        # Initialize deques with zeros
-        initial_times = [-display_time + i * self.sample_interval for i in range(self.display_size)]
-        initial_values = [0] * self.display_size
-        
-        self.times = deque(initial_times, maxlen=self.display_size)
+        # Buffer circular preasignado para tiempos, EOG, PPG y BPM.
+        # El hilo lector escribe y el timer de la GUI lee vistas sin copiar;
+        # 1 s de margen extra evita que el lector sobrescriba la ventana visible
+        self.display_buffer = RingBuffer(self.display_size + SAMPLE_RATE, n_channels=DISPLAY_ROWS)
+        self._reset_display_buffer()
         
-        # Buffers para EOG
-        self.eog_values = deque(initial_values, maxlen=self.display_size)
-        self.filtered_eog_values = deque(initial_values, maxlen=self.display_size)
+        # Eje X normalizado preasignado (se reescribe en cada frame)
+        self.plot_times = np.zeros(self.display_size)
         
-        # Buffers para PPG
-        self.ppg_values = deque(initial_values, maxlen=self.display_size)
-        self.filtered_ppg_values = deque(initial_values, maxlen=self.display_size)
+        # Registro columnar de la sesión (BD y CSV)
+        self.session_recorder = SessionRecorder()
         
-        # Datos para CSV
-        self.csv_data = {
-            'index': [],
-            'timestamp': [],
-            'eog_raw': [],
-            'ppg_raw': [],
-            'pulse_bpm': [],
-        }
+        # Registro binario en disco de la captura (solo con una sesión asociada)
+        self.session_context = None
+        self.acquisition_log = None
         
         # Filtros para ambas señales
         self.eog_filter = OnlineEOGFilter(
@@ -95,12 +91,14 @@ class SensorMonitor(QWidget):
             order=4
         )
         
-        # Añadir detector de pulsos y variables para BPM
-        self.bpm_calculator = PPGHeartRateCalculator(sample_rate=SAMPLE_RATE)
+        # Añadir detector de pulsos y variables para BPM (actualización latido a latido)
+        self.bpm_calculator = PPGHeartRateCalculator(sample_rate=SAMPLE_RATE, method='beats')
         self.current_heart_rate = 0
-        self.bpm_values = deque(initial_values, maxlen=self.display_size)
+        self.beats_shown = 0  # Latidos ya señalizados en la interfaz
         self.bpm_datos = []  # Para almacenar BPM para CSV
-        self.last_packet_id = -1  # Para detectar paquetes duplicados
+        
+        # Decodificador por lotes del protocolo binario (descarta duplicados)
+        self.packet_decoder = PacketDecoder()
         
         # Variables para control del LED de pulsaciones
         self.led_is_active = False
@@ -116,6 +114,13 @@ class SensorMonitor(QWidget):
         # Setup UI
         self.setup_ui(display_time)
     
+    def _reset_display_buffer(self):
+        """Vaciar el buffer de visualización y precargar la ventana con ceros."""
+        self.display_buffer.clear()
+        initial_block = np.zeros((DISPLAY_ROWS, self.display_size))
+        initial_block[ROW_TIME] = (np.arange(self.display_size) - self.display_size) * self.sample_interval
+        self.display_buffer.extend(initial_block)
+    
     def setup_ui(self, display_time):
         """Configura la interfaz de usuario del monitor"""
         # Layout principal
@@ -766,40 +771,22 @@ class SensorMonitor(QWidget):
         # Reset filter
         self.eog_filter.reset()
         self.ppg_filter.reset()
-        self.last_packet_id = -1
+        self.packet_decoder.reset()
         
         # Crear una nueva instancia:
-        self.bpm_calculator = PPGHeartRateCalculator(sample_rate=SAMPLE_RATE)
+        self.bpm_calculator = PPGHeartRateCalculator(sample_rate=SAMPLE_RATE, method='beats')
         self.current_heart_rate = 0
+        self.beats_shown = 0
         
         # Reset LED estado
         self.led_is_active = False
         
         # Clear and reset data buffers
-        self.times.clear()
-        self.eog_values.clear()
-        self.filtered_eog_values.clear()
-        self.ppg_values.clear()
-        self.filtered_ppg_values.clear()
-        self.bpm_values.clear()  # Limpiar buffer de BPM
-        
-        initial_times = [-DISPLAY_TIME + i * self.sample_interval for i in range(self.display_size)]
-        initial_values = [0] * self.display_size
-        self.times.extend(initial_times)
-        self.eog_values.extend(initial_values)
-        self.filtered_eog_values.extend(initial_values)
-        self.ppg_values.extend(initial_values)
-        self.filtered_ppg_values.extend(initial_values)
-        self.bpm_values.extend(initial_values)  # Inicializar buffer de BPM
+        self._reset_display_buffer()
         
         # Limpiar datos previos
-        self.csv_data = {
-            'index': [],
-            'timestamp': [],
-            'eog_raw': [],
-            'ppg_raw': [],
-            'pulse_bpm': [],
-        }
+        self.session_recorder.reset()
+        self._open_acquisition_log()
         
         # Send command to ESP32 to start capture usando Devices
         Devices.start_sensor()
@@ -826,19 +813,83 @@ class SensorMonitor(QWidget):
             self.running = False
             if self.reading_thread:
                 self.reading_thread.join(timeout=1.0)
+            
+            # Dejar el registro sincronizado en disco hasta que se guarde la sesión
+            if self.acquisition_log:
+                self.acquisition_log.close()
             print("Adquisición detenida")
 
-    def _find_packet_start(self, buffer):
-        """Find the start of a packet in the buffer"""
-        if len(buffer) < 2:
-            return -1
-            
-        for i in range(len(buffer) - 1):
-            # Look for the header byte sequence (Little Endian: 0x55, 0xAA)
-            if buffer[i] == (PACKET_HEADER & 0xFF) and buffer[i + 1] == (PACKET_HEADER >> 8) & 0xFF:
-                return i
-                
-        return -1
+    def set_session_context(self, patient_id, session_number, session_datetime=None, objective=None):
+        """
+        Asociar la captura a una sesión clínica para registrarla en disco.
+        
+        Args:
+            patient_id: ID del paciente
+            session_number: Número de sesión
+            session_datetime: datetime de la sesión
+            objective: Objetivo/tipo de la sesión
+        """
+        self.session_context = {
+            'patient_id': patient_id,
+            'session_number': session_number,
+            'session_datetime': session_datetime,
+            'objective': objective,
+        }
+
+    def _open_acquisition_log(self):
+        """Crear el registro en disco de una nueva captura (descarta el anterior)."""
+        # Reiniciar la captura descarta los datos previos, igual que el registro en memoria
+        self.discard_acquisition_log()
+        
+        if not self.session_context:
+            return
+        
+        try:
+            self.acquisition_log = AcquisitionLog.create(
+                self.session_context['patient_id'],
+                self.session_context['session_number'],
+                session_datetime=self.session_context['session_datetime'],
+                objective=self.session_context['objective'],
+                sample_rate=SAMPLE_RATE
+            )
+            print(f"Registro de adquisición: {self.acquisition_log.path}")
+        except OSError as e:
+            print(f"No se pudo crear el registro de adquisición: {e}")
+            self.acquisition_log = None
+
+    def session_signal_columns(self):
+        """
+        Columnas de la captura actual para guardarlas en la base de datos.
+        
+        Si el registro en disco tiene todas las muestras, se cierra marcándolo
+        como completo y se lee mapeado en memoria, sin una segunda copia de la
+        sesión en RAM. Si alguna escritura falló o el número de registros no
+        coincide con el registro en memoria, se usan las vistas de este.
+        
+        Las columnas mapeadas deben soltarse con release_columns() antes de
+        llamar a discard_acquisition_log().
+        
+        Returns:
+            dict: {nombre_columna: np.ndarray}
+        """
+        log = self.acquisition_log
+        n_samples = len(self.session_recorder)
+        if log and not log.failed and log.records_written == n_samples:
+            try:
+                columns = read_log(log.finalize(), mmap=True)['columns']
+                if len(columns['index']) == n_samples:
+                    return columns
+            except (OSError, ValueError) as e:
+                print(f"No se pudo leer el registro de adquisición: {e}")
+        elif log:
+            print("Registro de adquisición incompleto: se guardan los datos en memoria")
+        return self.session_recorder.as_dict()
+
+    def discard_acquisition_log(self):
+        """Eliminar el registro en disco de la captura actual (ya importada o descartada)."""
+        if self.acquisition_log:
+            self.acquisition_log.discard()
+            self.acquisition_log = None
 
     def check_slave_connections(self):
         """Send command to check for connected slaves"""
@@ -957,7 +1008,6 @@ class SensorMonitor(QWidget):
 
     def _read_data(self):
         """Function that runs in a separate thread to read binary data"""
-        data_buffer = bytearray()
         serial_conn = Devices.get_master_connection()  # Obtener la conexión serial del controlador maestro
         
         if not serial_conn:
@@ -971,103 +1021,13 @@ class SensorMonitor(QWidget):
                 available = serial_conn.in_waiting
                 
                 if available > 0:
-                    # Read available data
-                    new_data = serial_conn.read(min(available, BUFFER_SIZE * PACKET_SIZE))
-                    data_buffer.extend(new_data)
+                    # Read everything pending and decode all complete packets at once,
+                    # so a backlog after a GUI stall is drained in a single call
+                    new_data = serial_conn.read(available)
+                    packets = self.packet_decoder.feed(new_data)
                     
-                    # Process while we have enough data for a complete packet
-                    while len(data_buffer) >= PACKET_SIZE:
-                        # Look for packet start
-                        packet_start = self._find_packet_start(data_buffer)
-                        
-                        if packet_start < 0:
-                            # No valid header found, keep only the last byte
-                            if len(data_buffer) > 1:
-                                data_buffer = data_buffer[-1:]
-                            break
-                            
-                        # If packet doesn't start at buffer beginning, discard preceding bytes
-                        if packet_start > 0:
-                            data_buffer = data_buffer[packet_start:]
-                            
-                        # Check if we have a complete packet
-                        if len(data_buffer) < PACKET_SIZE:
-                            break
-                            
-                        # Extract packet data
-                        try:
-                            # Header (2 bytes)
-                            header = struct.unpack('<H', data_buffer[0:2])[0]
-                            
-                            if header == PACKET_HEADER:
-                                # ID (4 bytes)
-                                packet_id = struct.unpack('<I', data_buffer[2:6])[0]
-                                
-                                # Check for duplicate packets
-                                if packet_id <= self.last_packet_id:
-                                    self.duplicate_packets += 1
-                                    # Remove processed packet from buffer and continue
-                                    data_buffer = data_buffer[PACKET_SIZE:]
-                                    continue
-                                
-                                # Update last processed ID
-                                self.last_packet_id = packet_id
-                                
-                                # Timestamp (4 bytes)
-                                timestamp_ms = struct.unpack('<I', data_buffer[6:10])[0]
-                                timestamp_s = timestamp_ms / 1000.0  # Convert to seconds
-                                
-                                # PPG crudo (2 bytes) en data_buffer[10:12]
-                                ppg_raw = struct.unpack('<h', data_buffer[10:12])[0]
-                                
-                                # EOG crudo (2 bytes) en data_buffer[12:14]
-                                eog_raw = struct.unpack('<h', data_buffer[12:14])[0]
-                                
-                                # Device ID (1 byte) is at position 14
-                                device_id = data_buffer[14]
-                                
-                                # Apply real-time filters
-                                ppg_filtered = self.ppg_filter.filter(ppg_raw)
-                                eog_filtered = self.eog_filter.filter(eog_raw)
-                                
-                                # Calcular BPM
-                                result = self.bpm_calculator.add_sample(ppg_filtered, timestamp_s)
-                                
-                                # Actualizar BPM
-                                self.current_heart_rate = result['bpm'] if result['bpm'] is not None else 0
-                                
-                                # Actualizar buffers de visualización
-                                self.times.append(timestamp_s)
-                                
-                                # PPG data (para procesamiento y datos crudos)
-                                self.ppg_values.append(ppg_raw)
-                                self.filtered_ppg_values.append(ppg_filtered)
-                                
-                                # EOG data
-                                self.eog_values.append(eog_raw)
-                                self.filtered_eog_values.append(eog_filtered)
-                                
-                                # BPM data
-                                pulse_display_value = self.current_heart_rate if self.current_heart_rate else 0
-                                self.bpm_values.append(pulse_display_value)
-                                
-                                # Guardar datos para CSV
-                                self.csv_data['index'].append(packet_id)
-                                self.csv_data['timestamp'].append(timestamp_ms)
-                                self.csv_data['eog_raw'].append(eog_raw)
-                                self.csv_data['ppg_raw'].append(ppg_raw)
-                                self.csv_data['pulse_bpm'].append(pulse_display_value)
-                            else:
-                                # Invalid header, discard initial byte and continue
-                                data_buffer = data_buffer[1:]
-                                continue
-                                
-                            # Remove processed packet from buffer
-                            data_buffer = data_buffer[PACKET_SIZE:]
-                        except Exception as e:
-                            print(f"Error processing packet: {e}")
-                            # On error, discard initial byte and continue
-                            data_buffer = data_buffer[1:]
+                    if len(packets) > 0:
+                        self._process_packets(packets)
                 
                 # Small pause to not saturate CPU
                 time.sleep(0.001)
@@ -1076,21 +1036,105 @@ class SensorMonitor(QWidget):
                 print(f"Error reading data: {e}")
                 time.sleep(0.1)  # Longer pause on error
 
+    def _process_packets(self, packets):
+        """Procesar un bloque de paquetes ya decodificados (array estructurado)"""
+        if self.block_processing:
+            self._process_packets_block(packets)
+            return
+        
+        for packet_id, timestamp_ms, ppg_raw, eog_raw in zip(
+            packets['id'].tolist(), packets['timestamp'].tolist(),
+            packets['ppg'].tolist(), packets['eog'].tolist()
+        ):
+            timestamp_s = timestamp_ms / 1000.0  # Convert to seconds
+            
+            # Apply real-time filters
+            ppg_filtered = self.ppg_filter.filter(ppg_raw)
+            eog_filtered = self.eog_filter.filter(eog_raw)
+            
+            # Calcular BPM
+            result = self.bpm_calculator.add_sample(ppg_filtered, timestamp_s)
+            
+            # Actualizar BPM
+            self.current_heart_rate = result['bpm'] if result['bpm'] is not None else 0
+            
+            # BPM data
+            pulse_display_value = self.current_heart_rate if self.current_heart_rate else 0
+            
+            # Actualizar buffer de visualización (mismo orden que las filas ROW_*)
+            self.display_buffer.append((
+                timestamp_s, eog_raw, eog_filtered, ppg_raw, ppg_filtered, pulse_display_value
+            ))
+            
+            # Registrar muestra de la sesión
+            self.session_recorder.append(
+                index=packet_id,
+                timestamp=timestamp_ms,
+                eog_raw=eog_raw,
+                ppg_raw=ppg_raw,
+                pulse_bpm=pulse_display_value
+            )
+            if self.acquisition_log:
+                self.acquisition_log.append(
+                    index=(packet_id,),
+                    timestamp=(timestamp_ms,),
+                    eog_raw=(eog_raw,),
+                    ppg_raw=(ppg_raw,),
+                    pulse_bpm=(pulse_display_value,)
+                )
+
+    def _process_packets_block(self, packets):
+        """Procesar un lote de paquetes como vectores a través de filtros y BPM"""
+        timestamps_ms = packets['timestamp']
+        timestamps_s = timestamps_ms / 1000.0  # Convert to seconds
+        ppg_raw = packets['ppg']
+        eog_raw = packets['eog']
+        
+        # Apply real-time filters (una llamada por lote, estado conservado)
+        ppg_filtered = self.ppg_filter.filter_block(ppg_raw)
+        eog_filtered = self.eog_filter.filter_block(eog_raw)
+        
+        # Calcular BPM (se recalcula en las mismas muestras que add_sample)
+        result = self.bpm_calculator.add_block(ppg_filtered, timestamps_s)
+        pulse_display_values = np.nan_to_num(result['bpm'], nan=0.0)
+        self.current_heart_rate = float(pulse_display_values[-1])
+        
+        # Actualizar buffer de visualización (mismo orden que las filas ROW_*)
+        self.display_buffer.extend(np.vstack((
+            timestamps_s, eog_raw, eog_filtered, ppg_raw, ppg_filtered, pulse_display_values
+        )))
+        
+        # Registrar el lote en la sesión (copia directa entre arrays tipados)
+        block = {
+            'index': packets['id'],
+            'timestamp': timestamps_ms,
+            'eog_raw': eog_raw,
+            'ppg_raw': ppg_raw,
+            'pulse_bpm': pulse_display_values,
+        }
+        self.session_recorder.extend(**block)
+        
+        # Añadir el lote al registro en disco (fsync periódico)
+        if self.acquisition_log:
+            self.acquisition_log.append(**block)
+
     def update_plot(self):
         """Actualizar las gráficas"""
-        if len(self.times) > 0:
-            # Convert deques to numpy arrays for plotting
-            x_data = np.array(self.times)
+        if len(self.display_buffer) > 0:
+            # Vista contigua de la ventana visible (sin copias ni asignaciones)
+            window = self.display_buffer.view_last(self.display_size)
+            x_data = window[ROW_TIME]
             
             # Datos para mostrar
-            filtered_ppg_data = np.array(self.filtered_ppg_values)
-            bpm_data = np.array(self.bpm_values)
-            filtered_eog_data = np.array(self.filtered_eog_values)
+            filtered_ppg_data = window[ROW_PPG_FILTERED]
+            bpm_data = window[ROW_BPM]
+            filtered_eog_data = window[ROW_EOG_FILTERED]
             
             if self.running:
                 # Normalizar los tiempos para que siempre estén entre -5 y 0
-                current_time = x_data[-1]
-                normalized_x = x_data - current_time  # El tiempo actual será 0, los anteriores negativos
+                # El tiempo actual será 0, los anteriores negativos
+                np.subtract(x_data, x_data[-1], out=self.plot_times)
+                normalized_x = self.plot_times
             else:
                 # Si está detenido, mantener la última normalización
                 normalized_x = x_data
@@ -1113,10 +1157,9 @@ class SensorMonitor(QWidget):
                 else:
                     self.bpm_text.setColor((66, 66, 66))   # Gris para otros casos
             
-            # Detectar picos para activar LED y actualizar display de pulsaciones
+            # Señalizar latidos nuevos y actualizar display de pulsaciones
             if self.running and len(filtered_ppg_data) > 0:
-                current_time = time.time()
-                self.detect_pulse_peaks(self.filtered_ppg_values, current_time)
+                self.detect_pulse_peaks()
                 self.update_pulse_rate_display(self.current_heart_rate)
         
         # Fijar siempre el rango X entre -5 y 0
@@ -1128,7 +1171,7 @@ class SensorMonitor(QWidget):
     def save_data_to_csv(self):
         """Save collected data to CSV file with modern dialog"""
         try:
-            if not any(self.csv_data.values()) or len(self.csv_data['index']) == 0:
+            if len(self.session_recorder) == 0:
                 print("No hay datos para guardar")
                 # Mostrar mensaje con estilo moderno
                 msg = QMessageBox(self)
@@ -1164,8 +1207,8 @@ class SensorMonitor(QWidget):
                 msg.exec()
                 return
                 
-            # Crear DataFrame directamente con el diccionario modificado
-            df = pd.DataFrame(self.csv_data)
+            # Crear DataFrame directamente con las columnas del registro
+            df = pd.DataFrame(self.session_recorder.as_dict())
             
             # Create data directory if it doesn't exist
             data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
@@ -1267,6 +1310,10 @@ class SensorMonitor(QWidget):
             if self.reading_thread.is_alive():
                 print("Advertencia: Thread de lectura no terminó correctamente")
         
+        # Cerrar el registro en disco sin borrarlo (recuperable si no se guardó)
+        if self.acquisition_log:
+            self.acquisition_log.close()
+        
         print("Limpieza de SensorMonitor completada")
     
     def reset_led(self):
@@ -1282,44 +1329,16 @@ class SensorMonitor(QWidget):
             self.led_is_active = True
             self.led_timer.start(200)  # LED activo por 200ms
     
-    def detect_pulse_peaks(self, filtered_ppg_data, timestamp):
-        """Detectar picos en la señal PPG filtrada y activar LED"""
-        if len(filtered_ppg_data) < 3:
+    def detect_pulse_peaks(self):
+        """Comprobar si el detector de latidos confirmó pulsaciones desde el último cuadro"""
+        # El detector incremental corre en el hilo de adquisición; aquí solo
+        # se compara el contador de latidos (sin find_peaks por cuadro)
+        beats_detected = self.bpm_calculator.beat_detector.n_beats
+        if beats_detected == self.beats_shown:
             return
+        self.beats_shown = beats_detected
         
-        # Usar una ventana pequeña para detección en tiempo real
-        window_size = min(len(filtered_ppg_data), int(2 * SAMPLE_RATE))  # 2 segundos
-        recent_data = list(filtered_ppg_data)[-window_size:]
-        
-        if len(recent_data) < SAMPLE_RATE:  # Necesitamos al menos 1 segundo
-            return
-        
-        try:
-            # Normalizar datos
-            data_array = np.array(recent_data)
-            data_norm = (data_array - np.mean(data_array)) / (np.std(data_array) + 1e-10)
-            
-            # Parámetros para detección de picos
-            min_distance = int(SAMPLE_RATE * 60 / 180)  # Máximo 180 BPM
-            min_height = 0.5  # Altura mínima normalizada
-            
-            # Detectar picos
-            peaks, properties = signal.find_peaks(
-                data_norm,
-                height=min_height,
-                distance=min_distance,
-                prominence=0.3
-            )
-            
-            # Si hay picos en los últimos 100ms, activar LED
-            recent_threshold = len(recent_data) - int(0.1 * SAMPLE_RATE)  # Últimos 100ms
-            recent_peaks = peaks[peaks > recent_threshold]
-            
-            # if len(recent_peaks) > 0:
-            #     self.activate_pulse_led()
-        
-        except Exception as e:
-            print(f"Error en detección de picos: {e}")
+        # self.activate_pulse_led()
     
     def update_pulse_rate_display(self, bpm_value):
         """Actualizar el display de pulsaciones por minuto"""
@@ -0,0 +1,152 @@
+"""
+Registro columnar de las muestras de una sesión.
+
+Sustituye al diccionario de listas de Python (csv_data) por arrays NumPy
+tipados y preasignados, uno por columna. La capacidad se duplica cuando se
+llena (crecimiento amortizado), de modo que una sesión de una hora a 125 Hz
+ocupa unos pocos MB en lugar de millones de objetos int/float de Python.
+
+Las columnas se exponen como vistas de solo lectura sin copia para el
+guardado en la base de datos y la exportación a CSV.
+"""
+
+import numpy as np
+
+# Columnas registradas por el monitor: (nombre, tipo)
+SESSION_COLUMNS = (
+    ('index', np.int32),       # ID del paquete
+    ('timestamp', np.int32),   # Milisegundos desde el inicio de la captura
+    ('eog_raw', np.int16),     # Valor crudo del ADC
+    ('ppg_raw', np.int16),     # Valor crudo del ADC
+    ('pulse_bpm', np.float32), # BPM vigente (0 si aún no hay estimación)
+)
+
+# 10 minutos a 125 Hz antes del primer crecimiento
+DEFAULT_INITIAL_CAPACITY = 10 * 60 * 125
+
+
+class SessionRecorder:
+    """
+    Almacén columnar de muestras con crecimiento amortizado.
+
+    Uso:
+        recorder = SessionRecorder()
+        recorder.extend(index=ids, timestamp=ts, eog_raw=eog, ppg_raw=ppg, pulse_bpm=bpm)
+        timestamps = recorder['timestamp']   # vista sin copia
+    """
+
+    def __init__(self, columns=SESSION_COLUMNS, initial_capacity=DEFAULT_INITIAL_CAPACITY):
+        """
+        Inicializar registro vacío.
+
+        Args:
+            columns: Secuencia de (nombre, dtype) de las columnas
+            initial_capacity: Número de muestras preasignadas por columna
+        """
+        self.columns = tuple((name, np.dtype(dtype)) for name, dtype in columns)
+        self.column_names = tuple(name for name, _ in self.columns)
+        self.initial_capacity = max(1, int(initial_capacity))
+        self.reset()
+
+    def reset(self):
+        """Descartar todas las muestras y volver a la capacidad inicial."""
+        self._size = 0
+        self._capacity = self.initial_capacity
+        self._arrays = {
+            name: np.empty(self._capacity, dtype=dtype)
+            for name, dtype in self.columns
+        }
+
+    def __len__(self):
+        """Número de muestras registradas."""
+        return self._size
+
+    @property
+    def capacity(self):
+        """Número de muestras que caben sin volver a asignar memoria."""
+        return self._capacity
+
+    @property
+    def nbytes(self):
+        """Memoria ocupada por las muestras registradas (bytes)."""
+        return sum(dtype.itemsize for _, dtype in self.columns) * self._size
+
+    def _reserve(self, required):
+        """Asegurar capacidad para 'required' muestras duplicando el tamaño."""
+        if required <= self._capacity:
+            return
+
+        new_capacity = self._capacity
+        while new_capacity < required:
+            new_capacity *= 2
+
+        for name, dtype in self.columns:
+            grown = np.empty(new_capacity, dtype=dtype)
+            grown[:self._size] = self._arrays[name][:self._size]
+            self._arrays[name] = grown
+        self._capacity = new_capacity
+
+    def extend(self, **values):
+        """
+        Añadir un bloque de muestras.
+
+        Args:
+            **values: Un array (o secuencia) por columna, todos de igual longitud
+
+        Raises:
+            ValueError: Si faltan columnas o las longitudes no coinciden
+        """
+        missing = set(self.column_names) - set(values)
+        if missing:
+            raise ValueError(f"Faltan columnas: {sorted(missing)}")
+
+        n_new = len(values[self.column_names[0]])
+        if any(len(values[name]) != n_new for name in self.column_names):
+            raise ValueError("Todas las columnas deben tener la misma longitud")
+        if n_new == 0:
+            return
+
+        self._reserve(self._size + n_new)
+        start, end = self._size, self._size + n_new
+        for name in self.column_names:
+            self._arrays[name][start:end] = values[name]
+
+        # Publicar el nuevo tamaño cuando todas las columnas están escritas
+        self._size = end
+
+    def append(self, **values):
+        """
+        Añadir una sola muestra.
+
+        Args:
+            **values: Un valor escalar por columna
+        """
+        self.extend(**{name: (values[name],) for name in self.column_names if name in values})
+
+    def column(self, name):
+        """
+        Vista de solo lectura (sin copia) de una columna.
+
+        Args:
+            name: Nombre de la columna
+
+        Returns:
+            np.ndarray: Muestras registradas de la columna
+        """
+        view = self._arrays[name][:self._size]
+        view.flags.writeable = False
+        return view
+
+    def __getitem__(self, name):
+        """Acceso tipo diccionario: recorder['timestamp']."""
+        return self.column(name)
+
+    def as_dict(self):
+        """
+        Todas las columnas como vistas sin copia.
+
+        Returns:
+            dict: {nombre_columna: np.ndarray}
+        """
+        size = self._size
+        return {name: self.column(name)[:size] for name in self.column_names}
@@ -19,6 +19,7 @@ import pyqtgraph as pg
 
 # Importar herramientas de análisis y base de datos
 from database.database_manager import DatabaseManager
+from utils.pyramid_plot import PyramidCurve
 from scipy import signal
 
 class SessionViewer(QMainWindow):
@@ -136,10 +137,10 @@ class SessionViewer(QMainWindow):
         self.signals_splitter.addWidget(self.ppg_plot_widget)
         self.signals_splitter.addWidget(self.bpm_plot_widget)
         
-        # Configurar curvas para datos
-        self.eog_curve = self.eog_plot_widget.plot(pen=pg.mkPen('#2196F3', width=2))
-        self.ppg_curve = self.ppg_plot_widget.plot(pen=pg.mkPen('#E91E63', width=2))
-        self.bpm_curve = self.bpm_plot_widget.plot(pen=pg.mkPen('#FF9800', width=2))
+        # Configurar curvas para datos (pirámide min/max según el zoom)
+        self.eog_curve = PyramidCurve(self.eog_plot_widget, pen=pg.mkPen('#2196F3', width=2))
+        self.ppg_curve = PyramidCurve(self.ppg_plot_widget, pen=pg.mkPen('#E91E63', width=2))
+        self.bpm_curve = PyramidCurve(self.bpm_plot_widget, pen=pg.mkPen('#FF9800', width=2))
         
         # Añadir etiquetas y leyendas
         eog_label = pg.TextItem(text="EOG - Movimiento Ocular", color=(0,0,0), anchor=(0,0))
@@ -158,6 +159,10 @@ class SessionViewer(QMainWindow):
         self.eog_plot_widget.setXLink(self.bpm_plot_widget)
         self.ppg_plot_widget.setXLink(self.bpm_plot_widget)
         
+        # Recalcular el nivel de detalle en cada zoom/desplazamiento
+        for curve in (self.eog_curve, self.ppg_curve, self.bpm_curve):
+            curve.follow_view()
+        
         # Panel de información de sesión
         session_info_box = QGroupBox("Información de Sesión")
         session_info_layout = QGridLayout(session_info_box)
@@ -423,9 +428,9 @@ class SessionViewer(QMainWindow):
             self.ppg_curve.clear()
             self.bpm_curve.clear()  # Siempre limpiar la curva BPM
                 
-            # Actualizar gráficos con nuevos datos
-            self.eog_curve.setData(self.time_data, self.eog_data)
-            self.ppg_curve.setData(self.time_data, self.ppg_data)
+            # Construir las pirámides una vez por sesión; cada vista dibuja solo su nivel
+            self.eog_curve.set_data(self.time_data, self.eog_data)
+            self.ppg_curve.set_data(self.time_data, self.ppg_data)
             
             # Procesar datos BPM con manejo especial
             if self.bpm_data is not None:
@@ -447,7 +452,7 @@ class SessionViewer(QMainWindow):
                     filtered_values = bpm_values[valid_indices]
                     
                     # Establecer datos en la curva BPM
-                    self.bpm_curve.setData(filtered_time, filtered_values)
+                    self.bpm_curve.set_data(filtered_time, filtered_values)
                     
                     # Ajustar rango Y para BPM
                     bpm_min, bpm_max = np.min(filtered_values), np.max(filtered_values)
@@ -475,6 +480,10 @@ class SessionViewer(QMainWindow):
             # Ajustar rango de tiempo
             self.eog_plot_widget.setXRange(self.time_data[0], self.time_data[-1])
             
+            # Dibujar la vista completa aunque el rango X no haya cambiado
+            for curve in (self.eog_curve, self.ppg_curve, self.bpm_curve):
+                curve.show_range(self.time_data[0], self.time_data[-1])
+            
             print("Gráficos actualizados correctamente")
             
         except Exception as e:
@@ -0,0 +1,399 @@
+"""
+Servicio compartido de trabajos de análisis en segundo plano.
+
+Las ventanas y diálogos de análisis offline ya no crean cada uno su propia
+subclase de QThread: envían trabajos tipados (carga de señales, filtrado,
+BPM, métricas) a un único pool acotado de hilos (QThreadPool) y reciben
+progreso, resultado, error o cancelación como callbacks en el hilo de la
+interfaz.
+
+Se usan hilos y no procesos: los arrays de una sesión (decenas de MB) se
+comparten sin copiarlos ni serializarlos, y el trabajo pesado de NumPy/SciPy
+(filtfilt, find_peaks, zlib) libera el GIL mientras calcula.
+
+La cancelación es cooperativa: el trabajo se detiene en el siguiente punto
+de control (entre etapas y, en el filtrado y el BPM, entre bloques y
+ventanas del cálculo) y, una vez cancelado, sus callbacks ya no se llaman
+aunque el cálculo en curso termine.
+
+Uso:
+    service = AnalysisJobService.instance()
+    job = service.submit(
+        FilterPPGJob(ppg, fs, session_id=sid),
+        owner=self,
+        on_finished=self.on_ppg_filtered,
+        on_progress=self.progress_bar.setValue,
+        on_failed=self.on_error
+    )
+    ...
+    service.cancel_owner(self)   # al cerrar la ventana
+"""
+
+import os
+import threading
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal, Slot
+
+
+class JobCancelled(Exception):
+    """Se lanza en un punto de control cuando el trabajo fue cancelado."""
+
+
+class JobSignals(QObject):
+    """Señales de un trabajo; cada una incluye el propio trabajo como primer argumento."""
+
+    progress = Signal(object, int)
+    finished = Signal(object, object)
+    failed = Signal(object, str)
+    cancelled = Signal(object)
+
+
+class AnalysisJob(QRunnable):
+    """
+    Clase base abstracta de los trabajos de análisis ejecutables en el pool.
+
+    No se instancia directamente: las subclases implementan execute() y
+    llaman a report_progress() entre etapas; report_progress() también es el
+    punto de control de cancelación. Los cálculos largos reciben además
+    check_cancelled como cancel_check para detenerse a mitad de cálculo.
+    (QRunnable no admite ABCMeta, así que la comprobación se hace en __init__.)
+    """
+
+    # Nombre legible para los mensajes de error
+    name = "análisis"
+
+    def __init__(self):
+        if type(self).execute is AnalysisJob.execute:
+            raise TypeError(f"{type(self).__name__} debe implementar execute()")
+        super().__init__()
+        # El servicio conserva la referencia hasta que el trabajo termina
+        self.setAutoDelete(False)
+        self.signals = JobSignals()
+        self._cancel_event = threading.Event()
+
+    @property
+    def is_cancelled(self):
+        """True si se pidió cancelar el trabajo."""
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """Pedir la cancelación (se hace efectiva en el siguiente punto de control)."""
+        self._cancel_event.set()
+
+    def check_cancelled(self):
+        """Punto de control: lanzar JobCancelled si se pidió cancelar."""
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def report_progress(self, percent):
+        """
+        Informar del progreso y comprobar cancelación.
+
+        Args:
+            percent: Progreso de 0 a 100
+        """
+        self.check_cancelled()
+        self.signals.progress.emit(self, int(percent))
+
+    def execute(self):
+        """Realizar el trabajo y devolver su resultado (en el hilo del pool). Abstracto."""
+        raise NotImplementedError(f"{type(self).__name__} debe implementar execute()")
+
+    def run(self):
+        """Punto de entrada del pool: ejecutar y publicar el desenlace."""
+        try:
+            self.check_cancelled()
+            result = self.execute()
+            self.check_cancelled()
+        except JobCancelled:
+            self.signals.cancelled.emit(self)
+            return
+        except Exception as e:
+            self.signals.failed.emit(self, f"Error en {self.name}: {e}")
+            return
+        self.signals.finished.emit(self, result)
+
+
+class LoadSessionSignalsJob(AnalysisJob):
+    """Leer y decodificar los canales pedidos de una sesión (con sus timestamps)."""
+
+    name = "la carga de señales"
+
+    def __init__(self, session_id, channels=("ppg",)):
+        """
+        Args:
+            session_id: ID de la sesión
+            channels: Canales a decodificar ('eog', 'ppg', 'bpm')
+        """
+        super().__init__()
+        self.session_id = session_id
+        self.channels = tuple(channels)
+
+    def execute(self):
+        """
+        Returns:
+            dict o None: {'ms': timestamps, canal: valores}; None si la sesión no existe
+        """
+        from database.database_manager import DatabaseManager
+
+        self.report_progress(10)
+        signals = DatabaseManager.get_session_signals(self.session_id, channels=self.channels)
+        self.report_progress(90)
+
+        if signals is None:
+            return None
+
+        result = {'ms': None}
+        for channel in self.channels:
+            data = signals.get(channel)
+            result[channel] = data['values'] if data else None
+            if data and result['ms'] is None:
+                result['ms'] = data['ms']
+        return result
+
+
+class FilterPPGJob(AnalysisJob):
+    """Filtrado PPG offline (OfflinePPGFilter) con caché de resultados por sesión."""
+
+    name = "el filtrado PPG"
+
+    def __init__(self, ppg_data, fs, session_id=None, **filter_params):
+        """
+        Args:
+            ppg_data: Señal PPG cruda
+            fs: Frecuencia de muestreo (Hz)
+            session_id: Sesión de origen (None = sin caché)
+            **filter_params: Argumentos adicionales de OfflinePPGFilter
+        """
+        super().__init__()
+        self.ppg_data = ppg_data
+        self.fs = fs
+        self.session_id = session_id
+        self.filter_params = filter_params
+
+    def execute(self):
+        """
+        Returns:
+            dict: Resultado de OfflinePPGFilter.filter_signal()
+        """
+        from database.derived_cache import filter_ppg_cached
+
+        self.report_progress(10)
+        result = filter_ppg_cached(self.ppg_data, self.fs, session_id=self.session_id,
+                                   cancel_check=self.check_cancelled, **self.filter_params)
+        self.report_progress(100)
+        return result
+
+
+class FilterEOGJob(AnalysisJob):
+    """Filtrado EOG offline (OfflineEOGFilter)."""
+
+    name = "el filtrado EOG"
+
+    def __init__(self, eog_data, fs, **filter_params):
+        """
+        Args:
+            eog_data: Señal EOG (cruda o en µV)
+            fs: Frecuencia de muestreo (Hz)
+            **filter_params: Argumentos adicionales de OfflineEOGFilter
+        """
+        super().__init__()
+        self.eog_data = eog_data
+        self.fs = fs
+        self.filter_params = filter_params
+
+    def execute(self):
+        """
+        Returns:
+            dict: Resultado de OfflineEOGFilter.filter_signal()
+        """
+        from utils.signal_processing import OfflineEOGFilter
+
+        self.report_progress(25)
+        offline_filter = OfflineEOGFilter(fs=self.fs, **self.filter_params)
+        self.report_progress(50)
+        result = offline_filter.filter_signal(self.eog_data, cancel_check=self.check_cancelled)
+        self.report_progress(100)
+        return result
+
+
+class BPMEvolutionJob(AnalysisJob):
+    """Evolución de BPM offline (BPMOfflineCalculation) con caché por sesión."""
+
+    name = "el cálculo de BPM"
+
+    def __init__(self, filtered_ppg, ms_data, fs, session_id=None, method='windowed'):
+        """
+        Args:
+            filtered_ppg: Señal PPG filtrada
+            ms_data: Timestamps en milisegundos
+            fs: Frecuencia de muestreo (Hz)
+            session_id: Sesión de origen (None = sin caché)
+            method: Método de BPMOfflineCalculation ('windowed' o 'global')
+        """
+        super().__init__()
+        self.filtered_ppg = filtered_ppg
+        self.ms_data = ms_data
+        self.fs = fs
+        self.session_id = session_id
+        self.method = method
+
+    def execute(self):
+        """
+        Returns:
+            dict: Resultado de BPMOfflineCalculation.calculate_bpm_evolution()
+        """
+        from database.derived_cache import bpm_evolution_cached
+
+        self.report_progress(5)
+        result = bpm_evolution_cached(self.filtered_ppg, self.ms_data, self.fs,
+                                      session_id=self.session_id, method=self.method,
+                                      cancel_check=self.check_cancelled)
+        self.report_progress(100)
+        return result
+
+
+class SessionMetricsJob(AnalysisJob):
+    """Métricas completas de una sesión (SessionAnalyzer)."""
+
+    name = "el cálculo de métricas"
+
+    def __init__(self, session_id, sample_rate=125):
+        """
+        Args:
+            session_id: ID de la sesión
+            sample_rate: Frecuencia de muestreo (Hz)
+        """
+        super().__init__()
+        self.session_id = session_id
+        self.sample_rate = sample_rate
+
+    def execute(self):
+        """
+        Returns:
+            dict o None: Métricas de SessionAnalyzer; None si la sesión no existe
+        """
+        from analysis.session_analyzer import SessionAnalyzer
+
+        analyzer = SessionAnalyzer(sample_rate=self.sample_rate)
+        self.report_progress(10)
+        session_data = analyzer.load_session_data(self.session_id)
+        if session_data is None:
+            return None
+        self.report_progress(40)
+        return analyzer.calculate_comprehensive_metrics(session_data)
+
+
+def _default_worker_count():
+    """Hilos del pool: dejar un núcleo libre para la interfaz (entre 1 y 4)."""
+    return max(1, min(4, (os.cpu_count() or 2) - 1))
+
+
+class AnalysisJobService(QObject):
+    """
+    Pool acotado de trabajos de análisis con entrega de resultados a Qt.
+
+    Las señales de cada trabajo se conectan a slots de este objeto, que vive
+    en el hilo de la interfaz, así que los callbacks se ejecutan siempre en
+    ese hilo.
+    """
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        """Servicio compartido por toda la aplicación (se crea la primera vez)."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, max_workers=None, parent=None):
+        """
+        Args:
+            max_workers: Hilos simultáneos (None = núcleos disponibles - 1, máximo 4)
+            parent: QObject padre
+        """
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_workers or _default_worker_count())
+        # trabajo -> (owner, on_finished, on_progress, on_failed, on_cancelled)
+        self._jobs = {}
+
+    def submit(self, job, owner=None, on_finished=None, on_progress=None, on_failed=None,
+               on_cancelled=None):
+        """
+        Encolar un trabajo.
+
+        Args:
+            job: AnalysisJob a ejecutar
+            owner: Objeto al que pertenece (para cancel_owner)
+            on_finished: callback(resultado)
+            on_progress: callback(porcentaje)
+            on_failed: callback(mensaje)
+            on_cancelled: callback()
+
+        Returns:
+            AnalysisJob: El mismo trabajo (para cancelarlo individualmente)
+        """
+        self._jobs[job] = (owner, on_finished, on_progress, on_failed, on_cancelled)
+        job.signals.progress.connect(self._on_progress)
+        job.signals.finished.connect(self._on_finished)
+        job.signals.failed.connect(self._on_failed)
+        job.signals.cancelled.connect(self._on_cancelled)
+        self.pool.start(job)
+        return job
+
+    def cancel(self, job):
+        """Cancelar un trabajo; si aún no empezó, se retira de la cola."""
+        if job not in self._jobs:
+            return
+        job.cancel()
+        if self.pool.tryTake(job):
+            self._jobs.pop(job, None)
+
+    def cancel_owner(self, owner):
+        """Cancelar todos los trabajos pendientes o en curso de 'owner'."""
+        for job, callbacks in list(self._jobs.items()):
+            if callbacks[0] is owner:
+                self.cancel(job)
+
+    def active_jobs(self, owner=None):
+        """Trabajos en cola o en ejecución (de 'owner' si se indica)."""
+        return [job for job, callbacks in self._jobs.items()
+                if owner is None or callbacks[0] is owner]
+
+    def wait_for_done(self, msecs=-1):
+        """Esperar a que terminen todos los trabajos (p.ej. al cerrar la aplicación)."""
+        return self.pool.waitForDone(msecs)
+
+    def _callback(self, job, position, release=False):
+        """Callback registrado del trabajo, o None si fue cancelado o ya terminó."""
+        callbacks = self._jobs.pop(job, None) if release else self._jobs.get(job)
+        if callbacks is None or job.is_cancelled:
+            return None
+        return callbacks[position]
+
+    @Slot(object, int)
+    def _on_progress(self, job, percent):
+        callback = self._callback(job, 2)
+        if callback:
+            callback(percent)
+
+    @Slot(object, object)
+    def _on_finished(self, job, result):
+        callback = self._callback(job, 1, release=True)
+        if callback:
+            callback(result)
+
+    @Slot(object, str)
+    def _on_failed(self, job, message):
+        callback = self._callback(job, 3, release=True)
+        print(message)
+        if callback:
+            callback(message)
+
+    @Slot(object)
+    def _on_cancelled(self, job):
+        callbacks = self._jobs.pop(job, None)
+        if callbacks and callbacks[4]:
+            callbacks[4]()
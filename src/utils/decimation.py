@@ -0,0 +1,182 @@
+"""
+Reducción de puntos para visualización de señales largas.
+
+La decimación min/max conserva, para cada intervalo, la muestra mínima y la
+máxima en su orden temporal original: los picos y valles siguen visibles
+aunque se dibujen pocos puntos, a diferencia de un submuestreo simple.
+"""
+
+import numpy as np
+
+
+def minmax_decimate(times, values, max_points):
+    """
+    Reducir una señal a como máximo max_points puntos conservando extremos.
+
+    Args:
+        times: Array 1D de tiempos (misma longitud que values)
+        values: Array 1D de valores
+        max_points: Número máximo de puntos a devolver (>= 2)
+
+    Returns:
+        tuple: (tiempos, valores) decimados; sin cambios si ya caben
+    """
+    times = np.asarray(times)
+    values = np.asarray(values)
+    n_samples = len(values)
+
+    if max_points is None or n_samples <= max_points or max_points < 2:
+        return times, values
+
+    # Cada intervalo aporta dos puntos (mínimo y máximo)
+    n_bins = max_points // 2
+    bin_size = -(-n_samples // n_bins)
+    n_bins = -(-n_samples // bin_size)
+
+    # Rellenar el último intervalo repitiendo la última muestra
+    padded = np.empty(n_bins * bin_size, dtype=values.dtype)
+    padded[:n_samples] = values
+    padded[n_samples:] = values[-1]
+    bins = padded.reshape(n_bins, bin_size)
+
+    offsets = np.arange(n_bins) * bin_size
+    idx_min = np.minimum(offsets + bins.argmin(axis=1), n_samples - 1)
+    idx_max = np.minimum(offsets + bins.argmax(axis=1), n_samples - 1)
+
+    # Conservar el orden temporal dentro de cada intervalo
+    first = np.minimum(idx_min, idx_max)
+    second = np.maximum(idx_min, idx_max)
+    indices = np.column_stack((first, second)).ravel()
+
+    return times[indices], values[indices]
+
+
+class MinMaxPyramid:
+    """
+    Pirámide de envolventes min/max precalculada para una señal completa.
+
+    El nivel 0 es la señal original; cada nivel siguiente agrupa 'factor'
+    intervalos del anterior (factores 1, 8, 64, 512...). Cada intervalo
+    guarda su muestra mínima y su máxima en orden temporal, así que dibujar
+    cualquier nivel conserva picos y valles. Se construye una vez al cargar
+    la sesión; después, obtener una ventana es un searchsorted y un slice.
+
+    Uso:
+        pyramid = MinMaxPyramid(tiempos, valores)
+        x, y = pyramid.window(t_inicio, t_fin, pixel_width=1200)
+    """
+
+    def __init__(self, times, values, factor=8, min_bins=512):
+        """
+        Construir todos los niveles.
+
+        Args:
+            times: Array 1D de tiempos no decrecientes
+            values: Array 1D de valores (misma longitud que times)
+            factor: Muestras (o intervalos) agrupados por cada nivel
+            min_bins: No crear niveles con menos intervalos que este valor
+        """
+        self.times = np.asarray(times)
+        self.values = np.asarray(values)
+        if len(self.times) != len(self.values):
+            raise ValueError("times y values deben tener la misma longitud")
+
+        self.factor = int(factor)
+        self.factors = [1]
+        self._levels = [(self.times, self.values)]
+
+        n_samples = len(self.values)
+        if n_samples == 0:
+            return
+
+        # Índices (mínimo, máximo) de cada intervalo del nivel actual
+        idx_min = idx_max = np.arange(n_samples)
+        bin_factor = 1
+        while len(idx_min) // self.factor >= min_bins:
+            idx_min, idx_max = self._reduce(idx_min, idx_max)
+            bin_factor *= self.factor
+
+            first = np.minimum(idx_min, idx_max)
+            second = np.maximum(idx_min, idx_max)
+            indices = np.column_stack((first, second)).ravel()
+
+            self.factors.append(bin_factor)
+            self._levels.append((self.times[indices], self.values[indices]))
+
+    def _reduce(self, idx_min, idx_max):
+        """Agrupar 'factor' intervalos consecutivos en uno (último incompleto relleno)."""
+        n_bins = -(-len(idx_min) // self.factor)
+        pad = n_bins * self.factor - len(idx_min)
+        if pad:
+            idx_min = np.concatenate((idx_min, np.repeat(idx_min[-1], pad)))
+            idx_max = np.concatenate((idx_max, np.repeat(idx_max[-1], pad)))
+
+        groups_min = idx_min.reshape(n_bins, self.factor)
+        groups_max = idx_max.reshape(n_bins, self.factor)
+        rows = np.arange(n_bins)
+        new_min = groups_min[rows, self.values[groups_min].argmin(axis=1)]
+        new_max = groups_max[rows, self.values[groups_max].argmax(axis=1)]
+        return new_min, new_max
+
+    def __len__(self):
+        """Número de muestras de la señal original."""
+        return len(self.values)
+
+    @property
+    def n_levels(self):
+        """Número de niveles (incluido el nivel 0 a resolución completa)."""
+        return len(self._levels)
+
+    @property
+    def nbytes(self):
+        """Memoria adicional ocupada por los niveles decimados (bytes)."""
+        return sum(t.nbytes + v.nbytes for t, v in self._levels[1:])
+
+    def level_for(self, n_samples, pixel_width):
+        """
+        Nivel más grueso que aún aporta al menos un intervalo por píxel.
+
+        Args:
+            n_samples: Muestras originales visibles en la ventana
+            pixel_width: Ancho del área de dibujo en píxeles
+
+        Returns:
+            int: Índice del nivel
+        """
+        pixel_width = max(1, int(pixel_width))
+        level = 0
+        for i, bin_factor in enumerate(self.factors):
+            if n_samples / bin_factor >= pixel_width:
+                level = i
+            else:
+                break
+        return level
+
+    def window(self, t_start, t_end, pixel_width):
+        """
+        Puntos a dibujar para el intervalo [t_start, t_end].
+
+        Args:
+            t_start: Tiempo inicial de la ventana
+            t_end: Tiempo final de la ventana
+            pixel_width: Ancho del área de dibujo en píxeles
+
+        Returns:
+            tuple: (tiempos, valores) del nivel elegido; vistas sin copia
+        """
+        start = int(np.searchsorted(self.times, t_start, side='left'))
+        stop = int(np.searchsorted(self.times, t_end, side='right'))
+        if stop <= start:
+            return self.times[:0], self.values[:0]
+
+        level = self.level_for(stop - start, pixel_width)
+        bin_factor = self.factors[level]
+        times, values = self._levels[level]
+
+        if level == 0:
+            return times[start:stop], values[start:stop]
+
+        # Cada intervalo ocupa dos posiciones (mínimo y máximo)
+        first_bin = start // bin_factor
+        last_bin = -(-stop // bin_factor)
+        return times[2 * first_bin:2 * last_bin], values[2 * first_bin:2 * last_bin]
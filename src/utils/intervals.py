@@ -0,0 +1,155 @@
+"""
+Operaciones vectorizadas sobre intervalos de muestras.
+
+Los detectores de artefactos trabajan con máscaras booleanas (muestras que
+superan un umbral) o con ventanas alrededor de picos. Aquí se convierten en
+intervalos semiabiertos [inicio, fin) representados por dos arrays de
+índices, y se filtran, fusionan y reparan sin bucles de Python: el coste es
+el de unas pocas pasadas de NumPy aunque la señal tenga millones de muestras.
+"""
+
+import numpy as np
+
+
+def mask_to_runs(mask):
+    """
+    Rachas consecutivas de valores True de una máscara.
+
+    Args:
+        mask: Array 1D booleano (o convertible a booleano)
+
+    Returns:
+        tuple: (inicios, fines) como arrays int; fin exclusivo
+    """
+    mask = np.asarray(mask, dtype=bool)
+    if len(mask) == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+    # Los bordes de la máscara se rellenan con False para cerrar las rachas
+    edges = np.diff(np.concatenate(([False], mask, [False])).view(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+    return starts, stops
+
+
+def filter_runs(starts, stops, min_length=0, max_length=None):
+    """
+    Conservar los intervalos cuya longitud está en [min_length, max_length].
+
+    Args:
+        starts: Inicios de los intervalos
+        stops: Fines (exclusivos) de los intervalos
+        min_length: Longitud mínima en muestras
+        max_length: Longitud máxima en muestras (None = sin límite)
+
+    Returns:
+        tuple: (inicios, fines) filtrados
+    """
+    starts = np.asarray(starts)
+    stops = np.asarray(stops)
+    lengths = stops - starts
+    keep = lengths >= min_length
+    if max_length is not None:
+        keep &= lengths <= max_length
+    return starts[keep], stops[keep]
+
+
+def windows_around(centers, before, after, length):
+    """
+    Intervalos [centro - before, centro + after) recortados a [0, length).
+
+    Args:
+        centers: Índices centrales (p.ej. picos)
+        before: Muestras antes del centro
+        after: Muestras después del centro
+        length: Longitud de la señal
+
+    Returns:
+        tuple: (inicios, fines)
+    """
+    centers = np.asarray(centers, dtype=np.intp)
+    starts = np.maximum(centers - before, 0)
+    stops = np.minimum(centers + after, length)
+    return starts, stops
+
+
+def merge_intervals(starts, stops, gap=0):
+    """
+    Fusionar intervalos solapados o separados por menos de 'gap' muestras.
+
+    Args:
+        starts: Inicios de los intervalos (cualquier orden)
+        stops: Fines (exclusivos) de los intervalos
+        gap: Separación máxima (muestras) entre intervalos que se unen
+
+    Returns:
+        tuple: (inicios, fines) ordenados y sin solapes
+    """
+    starts = np.asarray(starts, dtype=np.intp)
+    stops = np.asarray(stops, dtype=np.intp)
+    if len(starts) == 0:
+        return starts, stops
+
+    order = np.argsort(starts, kind='stable')
+    starts = starts[order]
+    stops = stops[order]
+
+    # Un intervalo abre grupo nuevo si empieza después del mayor fin visto hasta ahora
+    reach = np.maximum.accumulate(stops)
+    new_group = np.empty(len(starts), dtype=bool)
+    new_group[0] = True
+    new_group[1:] = starts[1:] > reach[:-1] + gap
+
+    group_starts = np.flatnonzero(new_group)
+    group_ends = np.append(group_starts[1:], len(starts)) - 1
+    return starts[group_starts], reach[group_ends]
+
+
+def intervals_to_mask(starts, stops, length):
+    """
+    Máscara booleana con True dentro de cualquiera de los intervalos.
+
+    Args:
+        starts: Inicios de los intervalos
+        stops: Fines (exclusivos) de los intervalos
+        length: Longitud de la máscara
+
+    Returns:
+        np.ndarray: Máscara booleana de longitud 'length'
+    """
+    counts = np.zeros(length + 1, dtype=np.intp)
+    np.add.at(counts, np.clip(starts, 0, length), 1)
+    np.add.at(counts, np.clip(stops, 0, length), -1)
+    return np.cumsum(counts[:-1]) > 0
+
+
+def interpolate_intervals(values, starts, stops):
+    """
+    Sustituir cada intervalo por una recta entre sus muestras vecinas.
+
+    Todos los intervalos se reparan con una sola llamada a np.interp. Los
+    intervalos que tocan el principio o el final de la señal no tienen
+    vecino a un lado y se dejan sin modificar.
+
+    Args:
+        values: Array 1D con la señal
+        starts: Inicios de los intervalos
+        stops: Fines (exclusivos) de los intervalos
+
+    Returns:
+        np.ndarray: Copia de la señal con los intervalos interpolados
+    """
+    values = np.asarray(values)
+    repaired = values.astype(np.result_type(values.dtype, np.float64), copy=True)
+
+    starts = np.asarray(starts, dtype=np.intp)
+    stops = np.asarray(stops, dtype=np.intp)
+    inner = (starts > 0) & (stops < len(values)) & (stops > starts)
+    if not inner.any():
+        return repaired
+
+    bad = intervals_to_mask(starts[inner], stops[inner], len(values))
+    good_idx = np.flatnonzero(~bad)
+    bad_idx = np.flatnonzero(bad)
+    repaired[bad_idx] = np.interp(bad_idx, good_idx, repaired[good_idx])
+    return repaired
@@ -0,0 +1,189 @@
+"""
+Decodificador por lotes del protocolo binario del controlador maestro.
+
+Cada paquete mide 15 bytes (little endian):
+    header (2) | id (4) | timestamp_ms (4) | ppg (2, con signo) | eog (2, con signo) | device_id (1)
+
+En lugar de buscar el header byte a byte y desempaquetar cada campo con
+struct, el decodificador acumula los bytes en un buffer preasignado con
+cursores de lectura/escritura, localiza todas las corridas de paquetes
+alineados con NumPy y las interpreta de una sola vez como un array
+estructurado.
+"""
+
+import numpy as np
+
+# Constantes del protocolo binario (deben coincidir con el firmware)
+PACKET_HEADER = 0xAA55
+PACKET_SIZE = 15
+
+# Bytes del header tal como llegan por el puerto (Little Endian: 0x55, 0xAA)
+_HEADER_LO = PACKET_HEADER & 0xFF
+_HEADER_HI = (PACKET_HEADER >> 8) & 0xFF
+
+# Disposición exacta del paquete en el cable (sin padding)
+PACKET_DTYPE = np.dtype([
+    ('header', '<u2'),
+    ('id', '<u4'),
+    ('timestamp', '<u4'),
+    ('ppg', '<i2'),
+    ('eog', '<i2'),
+    ('device_id', 'u1'),
+])
+assert PACKET_DTYPE.itemsize == PACKET_SIZE
+
+
+class PacketDecoder:
+    """
+    Decodificador incremental de paquetes con resincronización.
+
+    Uso típico en el hilo de lectura:
+        decoder = PacketDecoder()
+        packets = decoder.feed(serial_conn.read(n))
+        for ts, ppg in zip(packets['timestamp'], packets['ppg']): ...
+
+    Los bytes que no forman un paquete completo se conservan para la
+    siguiente llamada. Los bytes corruptos entre paquetes se descartan
+    y la decodificación continúa en el siguiente header válido.
+    """
+
+    def __init__(self, capacity=64 * 1024, drop_duplicates=True):
+        """
+        Inicializar decodificador.
+
+        Args:
+            capacity: Tamaño inicial del buffer interno en bytes (crece si es necesario)
+            drop_duplicates: Si True, descarta paquetes con id <= último id aceptado
+        """
+        self.drop_duplicates = drop_duplicates
+        self._buffer = np.empty(max(capacity, 2 * PACKET_SIZE), dtype=np.uint8)
+        self.reset()
+
+    def reset(self):
+        """Reiniciar cursores y contadores (p.ej. al iniciar una adquisición)."""
+        self._read_pos = 0   # Primer byte aún no consumido
+        self._write_pos = 0  # Siguiente posición libre
+        self.last_packet_id = -1
+        self.packets_decoded = 0
+        self.duplicate_packets = 0
+        self.discarded_bytes = 0
+
+    @property
+    def pending_bytes(self):
+        """Número de bytes almacenados a la espera de completar un paquete."""
+        return self._write_pos - self._read_pos
+
+    def _append(self, data):
+        """Copiar datos nuevos al buffer, compactando o creciendo si no hay espacio."""
+        incoming = np.frombuffer(memoryview(data), dtype=np.uint8)
+        n_new = len(incoming)
+        pending = self.pending_bytes
+
+        if self._write_pos + n_new > len(self._buffer):
+            # Mover el resto pendiente (normalmente < 1 paquete) al inicio
+            if pending:
+                self._buffer[:pending] = self._buffer[self._read_pos:self._write_pos]
+            self._read_pos = 0
+            self._write_pos = pending
+
+            if pending + n_new > len(self._buffer):
+                new_capacity = max(2 * len(self._buffer), pending + n_new)
+                grown = np.empty(new_capacity, dtype=np.uint8)
+                grown[:pending] = self._buffer[:pending]
+                self._buffer = grown
+
+        self._buffer[self._write_pos:self._write_pos + n_new] = incoming
+        self._write_pos += n_new
+
+    def feed(self, data):
+        """
+        Añadir bytes leídos del puerto y decodificar todos los paquetes completos.
+
+        Args:
+            data: bytes/bytearray/memoryview con los datos recibidos
+
+        Returns:
+            np.ndarray: Array estructurado (PACKET_DTYPE) con los paquetes
+                        válidos, en orden de llegada. Puede estar vacío.
+        """
+        if data:
+            self._append(data)
+
+        window = self._buffer[self._read_pos:self._write_pos]
+        n_bytes = len(window)
+        if n_bytes < PACKET_SIZE:
+            return np.empty(0, dtype=PACKET_DTYPE)
+
+        # Posiciones candidatas a header (0x55 seguido de 0xAA)
+        is_header = np.zeros(n_bytes, dtype=bool)
+        is_header[:-1] = (window[:-1] == _HEADER_LO) & (window[1:] == _HEADER_HI)
+        candidates = np.flatnonzero(is_header)
+
+        # Último inicio de paquete posible dentro de los datos disponibles
+        last_start = n_bytes - PACKET_SIZE
+
+        runs = []
+        consumed = 0
+        c_idx = 0
+        while c_idx < len(candidates):
+            start = int(candidates[c_idx])
+            if start > last_start:
+                break
+
+            # Contar paquetes consecutivos alineados a partir de 'start'
+            max_packets = (n_bytes - start) // PACKET_SIZE
+            aligned = is_header[start:start + max_packets * PACKET_SIZE:PACKET_SIZE]
+            broken = np.flatnonzero(~aligned)
+            run_length = int(broken[0]) if len(broken) else max_packets
+
+            run_end = start + run_length * PACKET_SIZE
+            self.discarded_bytes += start - consumed
+            runs.append(window[start:run_end].view(PACKET_DTYPE))
+            consumed = run_end
+
+            # Resincronizar en el siguiente header posterior a la corrida
+            c_idx = int(np.searchsorted(candidates, run_end))
+
+        if not runs:
+            # Sin paquetes completos: conservar desde el primer header candidato,
+            # o solo el último byte si no hay ninguno (puede ser medio header)
+            if len(candidates):
+                keep_from = int(candidates[0])
+            else:
+                keep_from = n_bytes - 1
+            self.discarded_bytes += keep_from
+            self._read_pos += keep_from
+            return np.empty(0, dtype=PACKET_DTYPE)
+
+        # Copiar los paquetes antes de liberar el espacio del buffer
+        packets = runs[0].copy() if len(runs) == 1 else np.concatenate(runs)
+
+        # Descartar basura tras la última corrida salvo un posible header parcial
+        tail_candidates = candidates[candidates >= consumed]
+        if len(tail_candidates):
+            keep_from = int(tail_candidates[0])
+        else:
+            keep_from = max(consumed, n_bytes - 1)
+        self.discarded_bytes += keep_from - consumed
+        self._read_pos += keep_from
+
+        if self.drop_duplicates:
+            packets = self._drop_duplicates(packets)
+
+        self.packets_decoded += len(packets)
+        return packets
+
+    def _drop_duplicates(self, packets):
+        """Descartar paquetes cuyo id no supera al mayor id aceptado previamente."""
+        ids = packets['id'].astype(np.int64)
+        previous_max = np.maximum.accumulate(np.concatenate(([self.last_packet_id], ids[:-1])))
+        keep = ids > previous_max
+
+        n_dropped = len(packets) - int(np.count_nonzero(keep))
+        if n_dropped:
+            self.duplicate_packets += n_dropped
+            packets = packets[keep]
+
+        if len(packets):
+            self.last_packet_id = int(packets['id'][-1])
+        return packets
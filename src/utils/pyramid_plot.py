@@ -0,0 +1,112 @@
+"""
+Curvas de pyqtgraph alimentadas desde una MinMaxPyramid.
+
+En lugar de limpiar la gráfica y volver a dibujar el array completo en cada
+navegación, la curva se crea una sola vez y en cada cambio de ventana solo
+se actualizan sus datos con el nivel de la pirámide que corresponde al
+ancho en píxeles del área visible.
+"""
+
+import numpy as np
+
+from utils.decimation import MinMaxPyramid
+
+# Ancho usado cuando la vista aún no tiene geometría (antes de mostrarse)
+DEFAULT_PIXEL_WIDTH = 1000
+
+
+class PyramidCurve:
+    """
+    Curva persistente de una gráfica que dibuja una ventana de la pirámide.
+
+    Uso:
+        curve = PyramidCurve(plot_widget, pen=pg.mkPen('#00A99D'))
+        curve.set_data(tiempos, valores)          # construye la pirámide
+        curve.show_range(t_inicio, t_fin)         # ventana concreta
+        curve.follow_view()                       # o seguir el zoom/pan del ratón
+    """
+
+    def __init__(self, plot, **plot_kwargs):
+        """
+        Crear la curva (vacía) en la gráfica.
+
+        Args:
+            plot: PlotWidget o PlotItem de pyqtgraph
+            **plot_kwargs: Argumentos de estilo para plot() (pen, name...)
+        """
+        self.plot = plot
+        self.plot_kwargs = plot_kwargs
+        self.pyramid = None
+        self.transform = None
+        self.curve = plot.plot([], [], **plot_kwargs)
+        self._following = False
+
+    @property
+    def view_box(self):
+        """ViewBox de la gráfica que contiene la curva."""
+        return self.plot.getViewBox()
+
+    def attach(self):
+        """Volver a añadir la curva si la gráfica se limpió con clear()."""
+        if self.curve.scene() is None:
+            self.plot.addItem(self.curve)
+
+    def set_data(self, times, values):
+        """
+        Construir la pirámide de una señal nueva (una vez por señal).
+
+        Args:
+            times: Array 1D de tiempos no decrecientes
+            values: Array 1D de valores
+        """
+        self.set_pyramid(MinMaxPyramid(times, values))
+
+    def set_pyramid(self, pyramid):
+        """Usar una pirámide ya construida (p.ej. compartida entre gráficas)."""
+        self.pyramid = pyramid
+
+    def set_transform(self, transform):
+        """
+        Transformación aplicada a los valores de cada ventana antes de dibujar.
+
+        Args:
+            transform: Callable(values) -> values, o None
+        """
+        self.transform = transform
+
+    def pixel_width(self):
+        """Ancho actual del área de dibujo en píxeles."""
+        width = int(self.view_box.width())
+        return width if width > 0 else DEFAULT_PIXEL_WIDTH
+
+    def show_range(self, t_start, t_end):
+        """
+        Dibujar la ventana [t_start, t_end] con el nivel adecuado.
+
+        Returns:
+            tuple: (tiempos, valores) dibujados
+        """
+        if self.pyramid is None:
+            return np.empty(0), np.empty(0)
+
+        times, values = self.pyramid.window(t_start, t_end, self.pixel_width())
+        if self.transform is not None and len(values):
+            values = self.transform(values)
+        self.curve.setData(times, values)
+        return times, values
+
+    def clear(self):
+        """Vaciar la curva y descartar su pirámide (la curva sigue en la gráfica)."""
+        self.pyramid = None
+        self.curve.setData([], [])
+
+    def follow_view(self):
+        """Actualizar el nivel automáticamente cuando cambie el rango X de la vista."""
+        if self._following:
+            return
+        self.view_box.sigXRangeChanged.connect(self._on_x_range_changed)
+        self._following = True
+
+    def _on_x_range_changed(self, view_box, x_range):
+        """Slot de sigXRangeChanged."""
+        self.show_range(*x_range)
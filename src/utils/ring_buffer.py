@@ -0,0 +1,159 @@
+"""
+Buffer circular preasignado para datos de visualización en tiempo real.
+
+Pensado para un único hilo productor (lectura serial) y un único hilo
+consumidor (timer de la GUI) sin locks:
+
+- El almacenamiento está duplicado (espejo): cada muestra se escribe en la
+  posición i y en i + capacidad, de modo que las últimas n muestras siempre
+  forman un bloque contiguo y view_last(n) devuelve una vista sin copiar.
+- El productor escribe primero los datos y al final publica el nuevo
+  contador de escritura (una asignación de entero, atómica bajo el GIL).
+  El consumidor lee el contador una sola vez por vista.
+- Si la capacidad es mayor que la ventana que se lee, el productor escribe
+  sobre posiciones que la vista no cubre; ese margen evita lecturas
+  parcialmente sobrescritas mientras se dibuja.
+"""
+
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Buffer circular de tamaño fijo con uno o varios canales.
+
+    Con n_channels == 1 las vistas son 1D (n,); con varios canales son
+    2D (n_channels, n) y todos los canales comparten el mismo contador,
+    así una vista siempre contiene muestras alineadas entre canales.
+    """
+
+    def __init__(self, capacity, n_channels=1, dtype=np.float64, fill_value=0.0):
+        """
+        Inicializar buffer.
+
+        Args:
+            capacity: Número máximo de muestras retenidas por canal
+            n_channels: Número de canales escritos a la vez
+            dtype: Tipo de dato del almacenamiento
+            fill_value: Valor inicial de todas las posiciones
+        """
+        if capacity <= 0:
+            raise ValueError("La capacidad debe ser mayor que cero")
+
+        self.capacity = int(capacity)
+        self.n_channels = int(n_channels)
+        self.dtype = np.dtype(dtype)
+
+        if self.n_channels == 1:
+            shape = (2 * self.capacity,)
+        else:
+            shape = (self.n_channels, 2 * self.capacity)
+        self._data = np.empty(shape, dtype=self.dtype)
+        self.clear(fill_value)
+
+    def clear(self, fill_value=0.0):
+        """Vaciar el buffer y rellenar todas las posiciones con fill_value."""
+        self._write_index = 0
+        self._data.fill(fill_value)
+
+    @property
+    def total_written(self):
+        """Número total de muestras escritas desde el último clear()."""
+        return self._write_index
+
+    def __len__(self):
+        """Número de muestras válidas retenidas (como máximo la capacidad)."""
+        return min(self._write_index, self.capacity)
+
+    def extend(self, values):
+        """
+        Escribir un bloque de muestras nuevas.
+
+        Args:
+            values: Array (m,) con un canal o (n_channels, m) con varios.
+                    Si m supera la capacidad solo se conservan las últimas.
+        """
+        values = np.asarray(values, dtype=self.dtype)
+        if self.n_channels > 1 and values.ndim == 1:
+            values = values[:, np.newaxis]
+
+        n_new = values.shape[-1]
+        if n_new == 0:
+            return
+
+        capacity = self.capacity
+        skipped = max(0, n_new - capacity)
+        if skipped:
+            values = values[..., skipped:]
+
+        n_write = n_new - skipped
+        start = (self._write_index + skipped) % capacity
+        first = min(n_write, capacity - start)
+
+        # Escribir en ambas mitades del espejo
+        self._data[..., start:start + first] = values[..., :first]
+        self._data[..., start + capacity:start + capacity + first] = values[..., :first]
+
+        rest = n_write - first
+        if rest:
+            self._data[..., :rest] = values[..., first:]
+            self._data[..., capacity:capacity + rest] = values[..., first:]
+
+        # Publicar al final: el consumidor nunca ve un contador adelantado
+        self._write_index += n_new
+
+    def append(self, value):
+        """
+        Escribir una sola muestra.
+
+        Args:
+            value: Escalar con un canal o secuencia de n_channels valores
+        """
+        if self.n_channels == 1:
+            self.extend((value,))
+        else:
+            self.extend(np.asarray(value, dtype=self.dtype)[:, np.newaxis])
+
+    def view_last(self, n=None):
+        """
+        Vista contigua de solo lectura de las últimas n muestras (sin copia).
+
+        Las posiciones aún no escritas conservan el valor de relleno, igual
+        que un deque precargado.
+
+        Args:
+            n: Número de muestras (por defecto la capacidad completa)
+
+        Returns:
+            np.ndarray: Vista (n,) o (n_channels, n), de la más antigua a la más reciente
+        """
+        if n is None:
+            n = self.capacity
+        elif not 0 <= n <= self.capacity:
+            raise ValueError(f"n debe estar entre 0 y {self.capacity}")
+
+        end = self._write_index % self.capacity + self.capacity
+        view = self._data[..., end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def copy_last(self, n=None, out=None):
+        """
+        Copiar las últimas n muestras, opcionalmente a un array preasignado.
+
+        Args:
+            n: Número de muestras (por defecto la capacidad completa)
+            out: Array destino con la forma adecuada (se reutiliza, sin asignar)
+
+        Returns:
+            np.ndarray: Copia de las últimas n muestras
+        """
+        view = self.view_last(n)
+        if out is None:
+            return view.copy()
+        np.copyto(out, view)
+        return out
+
+    def latest(self):
+        """Última muestra escrita (por canal si hay varios)."""
+        return self.view_last(1)[..., 0]
@@ -8,6 +8,342 @@ import numpy as np
 from scipy import signal
 from collections import deque
 
+from utils.intervals import (mask_to_runs, filter_runs, windows_around,
+                             merge_intervals, interpolate_intervals)
+
+
+class SOSFilterChain:
+    """
+    Cadena de filtros IIR compilada en una única cascada de secciones de
+    segundo orden (SOS) con una sola matriz de estado.
+    
+    Cada etapa (HP, notch, LP, bandpass) se diseña directamente en forma SOS,
+    lo que evita los problemas numéricos de la forma (b, a) en órdenes altos
+    o con cortes muy bajos (p.ej. HP de 0.05 Hz), y toda la cadena se aplica
+    con una sola llamada a sosfilt.
+    
+    Filtra un único canal; cada señal (EOG, PPG) tiene su propia cadena.
+    
+    Uso:
+        chain = SOSFilterChain(fs=125).highpass(0.05).notch(50, q=30).compile()
+        y = chain.filter(x)
+    """
+    
+    def __init__(self, fs=125):
+        """
+        Inicializar cadena vacía.
+        
+        Args:
+            fs: Frecuencia de muestreo en Hz
+        """
+        self.fs = fs
+        self.stages = []      # Descripción de cada etapa (para depuración)
+        self._sections = []   # Matrices SOS de cada etapa
+        self.sos = np.empty((0, 6))
+        self.zi = None
+        self.z = None
+    
+    def _add_stage(self, name, sos, **params):
+        """Añadir una etapa ya diseñada a la cadena."""
+        self.stages.append({'type': name, **params})
+        self._sections.append(np.atleast_2d(sos))
+        return self
+    
+    def highpass(self, cutoff, order=1):
+        """Añadir un Butterworth paso alto."""
+        sos = signal.butter(order, cutoff, btype='highpass', fs=self.fs, output='sos')
+        return self._add_stage('highpass', sos, cutoff=cutoff, order=order)
+    
+    def lowpass(self, cutoff, order=4):
+        """Añadir un Butterworth paso bajo."""
+        sos = signal.butter(order, cutoff, btype='lowpass', fs=self.fs, output='sos')
+        return self._add_stage('lowpass', sos, cutoff=cutoff, order=order)
+    
+    def bandpass(self, lowcut, highcut, order=4):
+        """Añadir un Butterworth pasa banda."""
+        sos = signal.butter(order, [lowcut, highcut], btype='bandpass', fs=self.fs, output='sos')
+        return self._add_stage('bandpass', sos, lowcut=lowcut, highcut=highcut, order=order)
+    
+    def notch(self, freq, q=30):
+        """Añadir un notch (p.ej. 50/60 Hz de la red eléctrica)."""
+        b, a = signal.iirnotch(freq, q, fs=self.fs)
+        return self._add_stage('notch', signal.tf2sos(b, a), freq=freq, q=q)
+    
+    def compile(self):
+        """
+        Unir todas las etapas en una sola cascada SOS e inicializar el estado.
+        
+        Returns:
+            SOSFilterChain: la propia cadena (para encadenar llamadas)
+        """
+        if self._sections:
+            self.sos = np.vstack(self._sections)
+        else:
+            self.sos = np.empty((0, 6))
+        self.reset()
+        return self
+    
+    @property
+    def n_sections(self):
+        """Número de secciones de segundo orden de la cascada."""
+        return len(self.sos)
+    
+    def reset(self):
+        """
+        Reiniciar el estado de la cadena.
+        
+        Igual que lfilter_zi en la forma (b, a), el estado inicial corresponde
+        al régimen permanente ante una entrada unitaria constante.
+        """
+        if self.n_sections == 0:
+            self.zi = None
+            self.z = None
+            return
+        
+        self.zi = signal.sosfilt_zi(self.sos)  # (n_secciones, 2)
+        self.z = self.zi.copy()
+    
+    def filter(self, data):
+        """
+        Filtrar una muestra o un bloque conservando el estado entre llamadas.
+        
+        Args:
+            data: Escalar (una muestra) o array 1D de muestras
+            
+        Returns:
+            float o np.ndarray: Datos filtrados con la misma forma que la entrada
+            
+        Raises:
+            ValueError: Si data no es un escalar ni un array 1D
+        """
+        if self.zi is None and self.n_sections > 0:
+            self.reset()
+        
+        if np.ndim(data) == 0:
+            if self.n_sections == 0:
+                return float(data)
+            filtered, self.z = signal.sosfilt(self.sos, [float(data)], zi=self.z)
+            return filtered[0]
+        
+        data = np.asarray(data, dtype=np.float64)
+        if data.ndim != 1:
+            raise ValueError(f"Se esperaba un escalar o un array 1D, no forma {data.shape}")
+        if self.n_sections == 0 or data.size == 0:
+            return data.copy()
+        
+        filtered, self.z = signal.sosfilt(self.sos, data, zi=self.z)
+        return filtered
+
+
+class ZeroPhaseFilterChain:
+    """
+    Cascada de filtros de fase cero (filtfilt) aplicada por bloques solapados.
+    
+    La señal se divide en bloques; cada bloque se amplía a ambos lados con
+    un margen igual a la suma de las longitudes efectivas de la respuesta al
+    impulso de las etapas, se filtra con la cascada completa y solo se
+    conserva su parte central. Los transitorios de los bordes artificiales
+    quedan en el margen descartado.
+    
+    Precisión frente a filtfilt en cascada sobre la señal completa:
+    - tol solo fija el margen. La diferencia medida es del orden de 1e-6
+      relativa al pico (PPG y EOG a 125 Hz), que es el propio error de
+      redondeo de filtfilt con coeficientes (b, a) de orden alto: la misma
+      señal filtrada desde otro punto de inicio difiere en esa magnitud.
+    - Los bordes reales de la señal (primer y último bloque) se filtran con
+      el método de cada etapa; los bordes interiores usan el relleno por
+      defecto, más barato, y se descartan igualmente.
+    - Gustafsson ('gust') se aplica con irlen igual al transitorio de la
+      etapa, de modo que sus condiciones iniciales dependen solo de las
+      muestras cercanas a cada borde y el bloque del borde las reproduce.
+      La referencia es, por tanto, filtfilt(..., method='gust', irlen=...).
+      Sin irlen, Gustafsson ajusta las condiciones iniciales con toda la
+      señal y no se puede calcular por bloques: frente a esa variante las
+      primeras y últimas ~transitorio muestras difieren (en PPG, hasta un
+      6% del pico); el interior coincide.
+    
+    Rendimiento: en el PPG la mayor parte de la mejora viene de usar irlen
+    en Gustafsson (1 h a 125 Hz: ~3 s sin irlen, ~0.05 s con él); los
+    bloques solo añaden paralelismo en equipos con varios núcleos. Los
+    bloques tienen al menos 8 márgenes y una señal más corta se filtra en
+    un único segmento: con el paso alto de 0.05 Hz del EOG (margen de
+    ~8 min) una sesión normal se filtra de una vez, porque el solapamiento
+    costaría más de lo que aporta el paralelismo.
+    
+    Los bloques se reparten en un pool de hilos: las rutinas de filtrado de
+    SciPy liberan el GIL, por lo que hay paralelismo real sin el coste de
+    arrancar procesos.
+    
+    Uso:
+        chain = ZeroPhaseFilterChain(fs=125)
+        chain.add_stage('bandpass', b, a, method='gust')
+        chain.add_stage('smooth', b_fir)
+        result = chain.apply(x, keep_intermediates=False)
+    """
+    
+    def __init__(self, fs=125, chunk_sec=120, workers=None, tol=1e-9):
+        """
+        Inicializar cadena vacía.
+        
+        Args:
+            fs: Frecuencia de muestreo (Hz)
+            chunk_sec: Duración de la parte útil de cada bloque (s)
+            workers: Hilos del pool (None = núcleos disponibles)
+            tol: Amplitud relativa a la que se considera extinguida la
+                 respuesta al impulso (define el margen de cada bloque)
+        """
+        self.fs = fs
+        self.chunk_size = max(1, int(chunk_sec * fs))
+        self.workers = workers
+        self.tol = tol
+        self.stages = []
+    
+    def add_stage(self, name, b, a=(1.0,), method='pad'):
+        """
+        Añadir una etapa filtfilt.
+        
+        Args:
+            name: Nombre de la etapa (clave de los intermedios)
+            b: Coeficientes del numerador
+            a: Coeficientes del denominador ((1.0,) para FIR)
+            method: Método de filtfilt en los bordes reales ('pad' o 'gust';
+                    'gust' se aplica con irlen igual al transitorio)
+            
+        Returns:
+            ZeroPhaseFilterChain: la propia cadena (para encadenar llamadas)
+        """
+        b = np.atleast_1d(np.asarray(b, dtype=np.float64))
+        a = np.atleast_1d(np.asarray(a, dtype=np.float64))
+        self.stages.append({
+            'name': name,
+            'b': b,
+            'a': a,
+            'method': method,
+            'transient': self.impulse_length(b, a, self.tol),
+        })
+        return self
+    
+    @staticmethod
+    def impulse_length(b, a, tol=1e-9):
+        """
+        Muestras hasta que la respuesta al impulso cae por debajo de tol.
+        
+        Para FIR es la longitud del filtro; para IIR se obtiene del polo de
+        mayor módulo, que domina la cola de la respuesta.
+        """
+        length = max(len(b), len(a))
+        if len(a) > 1:
+            radius = np.max(np.abs(np.roots(a)))
+            if radius >= 1.0:
+                raise ValueError("Filtro inestable: polos fuera del círculo unidad")
+            if radius > 0:
+                length += int(np.ceil(np.log(tol) / np.log(radius)))
+        return length
+    
+    @property
+    def padding(self):
+        """Margen a cada lado de un bloque: suma de los transitorios de las etapas."""
+        return sum(stage['transient'] for stage in self.stages)
+    
+    def _filter_segment(self, segment, at_start, at_end, keep, cancel_check=None):
+        """Aplicar la cascada a un segmento; devuelve la salida de cada etapa pedida."""
+        outputs = {}
+        y = segment
+        for stage in self.stages:
+            if cancel_check is not None:
+                cancel_check()
+            # Gustafsson u otros métodos solo donde el borde es real; con irlen
+            # Gustafsson solo usa las muestras cercanas al borde
+            method = stage['method'] if (at_start or at_end) else 'pad'
+            if method == 'gust':
+                y = signal.filtfilt(stage['b'], stage['a'], y, method=method, irlen=stage['transient'])
+            else:
+                y = signal.filtfilt(stage['b'], stage['a'], y, method=method)
+            if stage['name'] in keep:
+                outputs[stage['name']] = y
+        outputs[None] = y
+        return outputs
+    
+    def apply(self, data, keep_intermediates=False, reducers=None, cancel_check=None):
+        """
+        Filtrar la señal completa.
+        
+        Args:
+            data: Array 1D con la señal
+            keep_intermediates: True para devolver la salida de todas las
+                etapas, o una colección con los nombres de las etapas a conservar
+            reducers: {nombre_etapa: función(valores, inicio) -> valor sumable}
+                para obtener métricas de una etapa sin conservar su salida
+                (p.ej. suma o un bin de la DFT); los resultados de cada bloque se suman
+            cancel_check: Función sin argumentos llamada antes de cada etapa de
+                cada bloque; puede lanzar una excepción (p.ej. JobCancelled)
+                para interrumpir el filtrado
+            
+        Returns:
+            dict: {'filtered': salida final, nombre_etapa: salida intermedia...,
+                   'reduced': {nombre_etapa: métrica}}
+        """
+        data = np.asarray(data, dtype=np.float64)
+        n = len(data)
+        reducers = reducers or {}
+        if keep_intermediates is True:
+            keep = {stage['name'] for stage in self.stages}
+        else:
+            keep = set(keep_intermediates or ())
+        
+        if not self.stages:
+            return {'filtered': data.copy(), 'reduced': {}}
+        
+        # Bloques de al menos 8 márgenes para que el solapamiento no domine el coste
+        pad = self.padding
+        chunk_size = max(self.chunk_size, 8 * pad)
+        # El resto final se une al último bloque: el bloque del borde debe ser
+        # largo para que Gustafsson reproduzca las condiciones iniciales
+        n_chunks = n // chunk_size
+        needed = keep | set(reducers)
+        
+        # Señal corta: un único segmento, idéntico a filtfilt en cascada
+        if n_chunks <= 1 or n <= chunk_size + 2 * pad:
+            outputs = self._filter_segment(data, True, True, needed, cancel_check)
+            result = {name: outputs[name] for name in keep}
+            result['filtered'] = outputs[None]
+            result['reduced'] = {name: reduce(outputs[name], 0) for name, reduce in reducers.items()}
+            return result
+        
+        result = {name: np.empty(n) for name in keep}
+        result['filtered'] = np.empty(n)
+        
+        def run_chunk(i):
+            start = i * chunk_size
+            stop = n if i == n_chunks - 1 else start + chunk_size
+            seg_start = max(0, start - pad)
+            seg_stop = min(n, stop + pad)
+            
+            outputs = self._filter_segment(
+                data[seg_start:seg_stop], seg_start == 0, seg_stop == n, needed, cancel_check
+            )
+            
+            # Conservar solo la parte central (sin transitorios)
+            central = {
+                name: values[start - seg_start:stop - seg_start]
+                for name, values in outputs.items()
+            }
+            for name in keep:
+                result[name][start:stop] = central[name]
+            result['filtered'][start:stop] = central[None]
+            return {name: reduce(central[name], start) for name, reduce in reducers.items()}
+        
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            # list() propaga las excepciones de los hilos
+            partials = list(executor.map(run_chunk, range(n_chunks)))
+        
+        result['reduced'] = {
+            name: sum(partial[name] for partial in partials) for name in reducers
+        }
+        return result
+
+
 class OnlinePPGFilter:
     """Clase para implementar filtros en tiempo real."""
     
@@ -28,33 +364,28 @@ class OnlinePPGFilter:
         self.filter_type = filter_type
         self.order = order
         
-        # Crear coeficientes del filtro
+        # Crear cadena SOS del filtro (estado incluido)
         self._design_filter()
         
-        # Estado del filtro (para filtrado en tiempo real)
-        self.zi = signal.lfilter_zi(self.b, self.a)
-        self.z = self.zi.copy()
-        
     def _design_filter(self):
-        """Calcular coeficientes del filtro."""
-        nyquist = 0.5 * self.fs
+        """Diseñar el filtro como cascada SOS."""
+        self.chain = SOSFilterChain(fs=self.fs)
         
         if self.filter_type == 'bandpass':
-            low = self.lowcut / nyquist
-            high = self.highcut / nyquist
-            self.b, self.a = signal.butter(self.order, [low, high], btype='band')
+            self.chain.bandpass(self.lowcut, self.highcut, order=self.order)
         elif self.filter_type == 'lowpass':
-            cutoff = self.highcut / nyquist
-            self.b, self.a = signal.butter(self.order, cutoff, btype='low')
+            self.chain.lowpass(self.highcut, order=self.order)
         elif self.filter_type == 'highpass':
-            cutoff = self.lowcut / nyquist
-            self.b, self.a = signal.butter(self.order, cutoff, btype='high')
+            self.chain.highpass(self.lowcut, order=self.order)
         else:
             raise ValueError(f"Tipo de filtro desconocido: {self.filter_type}")
+        
+        self.chain.compile()
+        self.sos = self.chain.sos
             
     def reset(self):
         """Reiniciar el filtro."""
-        self.z = self.zi.copy()
+        self.chain.reset()
         
     def filter(self, data):
         """
@@ -66,14 +397,26 @@ class OnlinePPGFilter:
         Returns:
             Datos filtrados y nuevo estado del filtro
         """
-        if np.isscalar(data):
-            # Un solo valor
-            filtered, self.z = signal.lfilter(self.b, self.a, [data], zi=self.z)
-            return filtered[0]
-        else:
-            # Array de valores
-            filtered, self.z = signal.lfilter(self.b, self.a, data, zi=self.z)
-            return filtered
+        return self.chain.filter(data)
+    
+    def filter_block(self, data):
+        """
+        Filtrar un bloque de muestras conservando el estado entre bloques.
+        
+        Equivale a llamar filter() muestra a muestra, pero con una sola
+        llamada a sosfilt por bloque.
+        
+        Args:
+            data: Array 1D con las muestras nuevas
+            
+        Returns:
+            np.ndarray: Muestras filtradas (float64, misma longitud)
+        """
+        data = np.asarray(data, dtype=np.float64)
+        if data.size == 0:
+            return np.empty(0, dtype=np.float64)
+        
+        return self.chain.filter(data)
 
 
 class OnlineEOGFilter:
@@ -128,6 +471,13 @@ class OnlineEOGFilter:
             self.notch_enabled = False
             print(f"Advertencia: Frecuencia notch {self.notch_freq} Hz fuera de rango válido (< {nyq} Hz)")
         
+        # Etapas IIR activas compiladas en una sola cascada SOS.
+        # El HP sigue fuera de la cadena (desactivado en el procesamiento en línea)
+        self.iir_chain = SOSFilterChain(fs=self.fs)
+        if self.notch_enabled:
+            self.iir_chain.notch(self.notch_freq, q=self.notch_q)
+        self.iir_chain.compile()
+        
         # 3. Low-pass FIR con ventana Hamming
         # Fase lineal para preservar forma de sacadas
         self.b_lp = signal.firwin(
@@ -136,6 +486,8 @@ class OnlineEOGFilter:
             fs=self.fs, 
             window='hamming'
         )
+        # Coeficientes invertidos una sola vez: producto punto directo con el buffer
+        self.b_lp_reversed = self.b_lp[::-1].copy()
         
         print(f"EOG Filter configurado:")
         print(f"  - HP: {self.hp_cutoff} Hz (orden 1)")
@@ -151,13 +503,34 @@ class OnlineEOGFilter:
         # Estado HP
         self.z_hp = signal.lfilter_zi(self.b_hp, self.a_hp)
         
-        # Estado Notch (solo si está habilitado)
-        if self.notch_enabled:
-            self.z_notch = signal.lfilter_zi(self.b_notch, self.a_notch)
+        # Estado de la cascada IIR (notch, solo si está habilitado)
+        self.iir_chain.reset()
         
-        # Buffer FIR (implementación eficiente)
-        self.fir_buffer = deque(maxlen=len(self.b_lp))
-        self.fir_buffer.extend([0.0] * len(self.b_lp))
+        # Buffer FIR circular duplicado: cada muestra se escribe en pos y pos+N,
+        # así las últimas N muestras siempre forman una vista contigua
+        n_taps = len(self.b_lp)
+        self.fir_buffer = np.zeros(2 * n_taps, dtype=np.float64)
+        self.fir_pos = 0  # Posición de la muestra más antigua
+    
+    def _fir_window(self):
+        """Vista de las últimas N muestras del FIR, de la más antigua a la más reciente."""
+        n_taps = len(self.b_lp)
+        return self.fir_buffer[self.fir_pos:self.fir_pos + n_taps]
+    
+    def _fir_push(self, samples):
+        """Escribir muestras nuevas en el buffer circular (solo se guardan las últimas N)."""
+        n_taps = len(self.b_lp)
+        n_new = len(samples)
+        if n_new >= n_taps:
+            self.fir_buffer[:n_taps] = samples[-n_taps:]
+            self.fir_buffer[n_taps:] = samples[-n_taps:]
+            self.fir_pos = 0
+            return
+        
+        idx = (self.fir_pos + np.arange(n_new)) % n_taps
+        self.fir_buffer[idx] = samples
+        self.fir_buffer[idx + n_taps] = samples
+        self.fir_pos = (self.fir_pos + n_new) % n_taps
     
     def filter(self, x):
         """
@@ -177,17 +550,47 @@ class OnlineEOGFilter:
         # y, self.z_hp = signal.lfilter(self.b_hp, self.a_hp, [x], zi=self.z_hp)
         
         # 2. Notch filter: eliminar interferencia de red (solo si está habilitado)
-        if self.notch_enabled:
-            y, self.z_notch = signal.lfilter(self.b_notch, self.a_notch, [x], zi=self.z_notch)
+        y = self.iir_chain.filter(x)
         
         # 3. FIR Low-pass: filtrado final con fase lineal
-        self.fir_buffer.append(y[0])
+        n_taps = len(self.b_lp)
+        pos = self.fir_pos
+        self.fir_buffer[pos] = y
+        self.fir_buffer[pos + n_taps] = y
+        self.fir_pos = (pos + 1) % n_taps
         
-        # Convolución eficiente usando producto punto
-        filtered_output = sum(
-            sample * coeff 
-            for sample, coeff in zip(self.fir_buffer, reversed(self.b_lp))
-        )
+        # Producto punto sobre la vista contigua (más antigua -> más reciente)
+        filtered_output = float(np.dot(self._fir_window(), self.b_lp_reversed))
+        
+        return filtered_output
+    
+    def filter_block(self, x):
+        """
+        Procesar un bloque de muestras a través de la cadena de filtros.
+        
+        Produce el mismo resultado que filter() muestra a muestra: el notch
+        conserva su estado y el FIR usa como historia las últimas muestras
+        del bloque anterior.
+        
+        Args:
+            x: Array 1D con las muestras nuevas
+            
+        Returns:
+            np.ndarray: Muestras filtradas (float64, misma longitud)
+        """
+        x = np.asarray(x, dtype=np.float64)
+        if x.size == 0:
+            return np.empty(0, dtype=np.float64)
+        
+        # 1. High-pass desactivado (igual que en filter())
+        
+        # 2. Notch filter (solo si está habilitado)
+        y = self.iir_chain.filter(x)
+        
+        # 3. FIR Low-pass: convolución del bloque con la historia previa
+        history = self._fir_window()[1:]
+        filtered_output = np.convolve(np.concatenate((history, y)), self.b_lp, mode='valid')
+        self._fir_push(y)
         
         return filtered_output
     
@@ -272,7 +675,7 @@ class OfflineEOGFilter:
     """
     
     def __init__(self, fs=125, hp_cutoff=0.01, lp_cutoff=35.0, 
-                 notch_freq=50, notch_q=30, fir_order=101):
+                 notch_freq=50, notch_q=30, fir_order=101, workers=None):
         """
         Inicializar filtro EOG offline.
         
@@ -283,8 +686,10 @@ class OfflineEOGFilter:
             notch_freq: Solo 50 Hz como pediste
             notch_q: Factor de calidad del notch
             fir_order: Orden del filtro FIR (debe ser par para filtfilt)
+            workers: Hilos para el filtrado por bloques (None = núcleos disponibles)
         """
         self.fs = fs
+        self.workers = workers
         self.hp_cutoff = hp_cutoff
         self.lp_cutoff = lp_cutoff
         self.notch_freq = notch_freq
@@ -317,56 +722,80 @@ class OfflineEOGFilter:
             fs=self.fs,
             window=('kaiser', 5)
         )
+        
+        # Cascada de fase cero por bloques solapados (mismas etapas y orden)
+        self.chain = ZeroPhaseFilterChain(fs=self.fs, workers=self.workers)
+        self.chain.add_stage('dc_removed', self.b_hp, self.a_hp)
+        self.chain.add_stage('no_powerline', self.b_notch, self.a_notch)
+        self.chain.add_stage('lowpass', self.b_lp)
     
-    def filter_signal(self, eog_data):
+    def filter_signal(self, eog_data, keep_intermediates=False, cancel_check=None):
         """
         Filtrar señal EOG completa con fase cero.
         
         Args:
             eog_data: Array numpy con datos EOG raw
+            keep_intermediates: Si True, incluir también las salidas intermedias
+            cancel_check: Punto de control de cancelación (ver ZeroPhaseFilterChain.apply)
             
         Returns:
             dict: {
                 'filtered': array filtrado,
-                'dc_removed': señal sin deriva DC,
-                'no_powerline': señal sin 50Hz,
+                'dc_removed': señal sin deriva DC (solo con keep_intermediates),
+                'no_powerline': señal sin 50Hz (solo con keep_intermediates),
                 'metadata': información del procesamiento
             }
         """
         if not isinstance(eog_data, np.ndarray):
             eog_data = np.array(eog_data)
         
-        print(f"Filtrando señal EOG: {len(eog_data)} muestras ({len(eog_data)/self.fs:.1f}s)")
-        
-        # PASO 1: Eliminar deriva DC con filtfilt (FASE CERO)
-        dc_removed = signal.filtfilt(self.b_hp, self.a_hp, eog_data)
-        
-        # PASO 2: Eliminar 50 Hz con filtfilt (FASE CERO)
-        no_powerline = signal.filtfilt(self.b_notch, self.a_notch, dc_removed)
-        
-        # PASO 3: Low-pass FIR con filtfilt (FASE CERO)
-        filtered_final = signal.filtfilt(self.b_lp, [1.0], no_powerline)
+        n = len(eog_data)
+        print(f"Filtrando señal EOG: {n} muestras ({n/self.fs:.1f}s)")
+        
+        # Bin de la DFT más cercano a 50 Hz (para medir la reducción de red)
+        powerline_bin = self._powerline_bin(n)
+        
+        def powerline_component(values, start):
+            phase = -2j * np.pi * powerline_bin * (start + np.arange(len(values))) / n
+            return values @ np.exp(phase)
+        
+        # PASOS 1-3: HP (deriva DC) -> notch 50 Hz -> LP FIR, todos con FASE CERO
+        stages = ('dc_removed', 'no_powerline')
+        result = self.chain.apply(
+            eog_data,
+            keep_intermediates=stages if keep_intermediates else (),
+            reducers={
+                'dc_removed': lambda values, start: values.sum(),
+                'no_powerline': powerline_component,
+            },
+            cancel_check=cancel_check
+        )
+        filtered_final = result['filtered']
+        reduced = result['reduced']
         
         # Detectar y marcar posibles artefactos de parpadeo
         blink_artifacts = self._detect_blink_artifacts(filtered_final)
         
         metadata = {
-            'original_length': len(eog_data),
-            'duration_sec': len(eog_data) / self.fs,
-            'dc_offset_removed': np.mean(eog_data) - np.mean(dc_removed),
-            'powerline_reduction_db': self._estimate_powerline_reduction(eog_data, no_powerline),
+            'original_length': n,
+            'duration_sec': n / self.fs,
+            'dc_offset_removed': np.mean(eog_data) - reduced['dc_removed'] / n,
+            'powerline_reduction_db': self._estimate_powerline_reduction(
+                np.fft.rfft(eog_data)[powerline_bin], reduced['no_powerline']
+            ),
             'blink_artifacts_detected': len(blink_artifacts),
             'signal_quality': self._assess_signal_quality(filtered_final),
             'processing_steps': ['DC_removal', 'notch_50Hz', 'lowpass_FIR', 'phase_zero']
         }
         
-        return {
+        output = {
             'filtered': filtered_final,
-            'dc_removed': dc_removed,
-            'no_powerline': no_powerline,
             'blink_artifacts': blink_artifacts,
             'metadata': metadata
         }
+        if keep_intermediates:
+            output.update({name: result[name] for name in stages})
+        return output
     
     def _detect_blink_artifacts(self, filtered_signal):
         """
@@ -393,42 +822,36 @@ class OfflineEOGFilter:
         # Combinar picos positivos y negativos
         all_peaks = np.sort(np.concatenate([peaks_pos, peaks_neg]))
         
-        # Filtrar por duración típica de parpadeos (100-400ms)
+        # Filtrar por duración típica de parpadeos (100-400ms): ventana
+        # centrada en cada pico, recortada en los bordes de la señal
         min_duration = int(0.1 * self.fs)  # 100ms
         max_duration = int(0.4 * self.fs)  # 400ms
+        starts, stops = windows_around(all_peaks, max_duration // 2, max_duration // 2,
+                                       len(filtered_signal))
+        valid = (stops - starts) >= min_duration
         
-        blink_candidates = []
-        for peak in all_peaks:
-            # Buscar retorno al baseline
-            start_idx = max(0, peak - max_duration//2)
-            end_idx = min(len(filtered_signal), peak + max_duration//2)
-            
-            # Verificar si la duración está en rango típico
-            if (end_idx - start_idx) >= min_duration:
-                blink_candidates.append(peak)# Buscar retorno al baseline
-            start_idx = max(0, peak - max_duration//2)
-            end_idx = min(len(filtered_signal), peak + max_duration//2)
-            
-            # Verificar si la duración está en rango típico
-            if (end_idx - start_idx) >= min_duration:
-                blink_candidates.append(peak)
+        # Un pico que supera el umbral en ambos signos cuenta una sola vez
+        blink_candidates = np.unique(all_peaks[valid]).tolist()
         
         print(f"Detectados {len(blink_candidates)} posibles artefactos de parpadeo")
         return blink_candidates
     
-    def _estimate_powerline_reduction(self, original, filtered):
-        """Estimar reducción de ruido de 50Hz en dB."""
+    def _powerline_bin(self, n_samples):
+        """Índice del bin de la rfft de n_samples puntos más cercano a 50 Hz."""
+        freqs = np.fft.rfftfreq(n_samples, 1/self.fs)
+        return int(np.argmin(np.abs(freqs - 50)))
+    
+    def _estimate_powerline_reduction(self, original_bin, filtered_bin):
+        """
+        Estimar reducción de ruido de 50Hz en dB.
+        
+        Args:
+            original_bin: Coeficiente DFT cerca de 50 Hz de la señal original
+            filtered_bin: Mismo coeficiente tras el notch
+        """
         try:
-            # FFT de ambas señales
-            fft_orig = np.fft.rfft(original)
-            fft_filt = np.fft.rfft(filtered)
-            freqs = np.fft.rfftfreq(len(original), 1/self.fs)
-            
-            # Encontrar potencia cerca de 50Hz
-            f_idx = np.argmin(np.abs(freqs - 50))
-            
-            power_orig = np.abs(fft_orig[f_idx])**2
-            power_filt = np.abs(fft_filt[f_idx])**2
+            power_orig = np.abs(original_bin)**2
+            power_filt = np.abs(filtered_bin)**2
             
             if power_orig > 0 and power_filt > 0:
                 reduction_db = 10 * np.log10(power_orig / power_filt)
@@ -470,25 +893,13 @@ class OfflineEOGFilter:
         if remove_blinks and result['blink_artifacts']:
             print(f"Limpiando {len(result['blink_artifacts'])} artefactos...")
             
-            cleaned_signal = result['filtered'].copy()
-            
-            # Interpolar sobre cada artefacto
-            for artifact_idx in result['blink_artifacts']:
-                # Definir ventana de interpolación
-                window_size = int(0.3 * self.fs)  # 300ms
-                start_idx = max(0, artifact_idx - window_size//2)
-                end_idx = min(len(cleaned_signal), artifact_idx + window_size//2)
-                
-                # Interpolar linealmente
-                if start_idx > 0 and end_idx < len(cleaned_signal):
-                    x_interp = np.array([start_idx, end_idx])
-                    y_interp = np.array([cleaned_signal[start_idx], cleaned_signal[end_idx]])
-                    
-                    # Crear interpolación
-                    x_fill = np.arange(start_idx, end_idx)
-                    y_fill = np.interp(x_fill, x_interp, y_interp)
-                    
-                    cleaned_signal[start_idx:end_idx] = y_fill
+            # Ventanas de 300ms alrededor de cada artefacto; las solapadas se
+            # fusionan y todas se interpolan linealmente de una vez
+            window_size = int(0.3 * self.fs)
+            starts, stops = windows_around(result['blink_artifacts'], window_size // 2,
+                                           window_size // 2, len(result['filtered']))
+            starts, stops = merge_intervals(starts, stops)
+            cleaned_signal = interpolate_intervals(result['filtered'], starts, stops)
             
             result['cleaned'] = cleaned_signal
             result['metadata']['artifact_removal'] = True
@@ -553,8 +964,11 @@ class OfflinePPGFilter:
     CLAVE: PPG requiere preservar componentes de 0.5-5 Hz (30-300 BPM)
     """
     
+    # Incrementar al cambiar el algoritmo (invalida resultados en caché)
+    VERSION = 2
+    
     def __init__(self, fs=125, hp_cutoff=0.5, lp_cutoff=5.0, notch_enabled=False,
-                 notch_freq=50, notch_q=30, smoothing=True):    # notch_q: Factor de calidad
+                 notch_freq=50, notch_q=30, smoothing=True, workers=None):    # notch_q: Factor de calidad
         """
         Inicializar filtro PPG offline.
         
@@ -565,8 +979,10 @@ class OfflinePPGFilter:
             notch_freq: Frecuencia notch (50/60 Hz)
             notch_q: Factor de calidad del notch
             smoothing: Aplicar suavizado adicional
+            workers: Hilos para el filtrado por bloques (None = núcleos disponibles)
         """
         self.fs = fs
+        self.workers = workers
         self.hp_cutoff = hp_cutoff
         self.lp_cutoff = lp_cutoff
         self.notch_enabled = notch_enabled
@@ -626,13 +1042,23 @@ class OfflinePPGFilter:
         
         # 4. Detector de artefactos (opcional)
         self.artifact_threshold_std = 4.0  # Umbral en desviaciones estándar
+        
+        # Cascada de fase cero por bloques solapados (mismas etapas y orden)
+        self.chain = ZeroPhaseFilterChain(fs=self.fs, workers=self.workers)
+        self.chain.add_stage('bandpass_only', self.b_bandpass, self.a_bandpass, method='gust')  # Metodo de Gustafsson
+        if self.notch_enabled:
+            self.chain.add_stage('notch_applied', self.b_notch, self.a_notch)
+        if self.smoothing:
+            self.chain.add_stage('smoothed', self.b_smooth)
     
-    def filter_signal(self, ppg_data):
+    def filter_signal(self, ppg_data, keep_intermediates=False, cancel_check=None):
         """
         Filtrar señal PPG completa con fase cero.
         
         Args:
             ppg_data: Array numpy con datos PPG raw
+            keep_intermediates: Si True, incluir 'bandpass_only' y 'notch_applied'
+            cancel_check: Punto de control de cancelación (ver ZeroPhaseFilterChain.apply)
             
         Returns:
             dict: Resultado completo del filtrado
@@ -642,26 +1068,14 @@ class OfflinePPGFilter:
         
         print(f"Filtrando señal PPG: {len(ppg_data)} muestras ({len(ppg_data)/self.fs:.1f}s)")
         
-        # PASO 1: Bandpass principal (elimina DC + ruido HF)
-        bandpass_filtered = signal.filtfilt(
-            self.b_bandpass, self.a_bandpass, ppg_data, method='gust'   # Metodo de Gustafsson
+        # PASOS 1-3: Bandpass principal -> notch 50 Hz (si está habilitado)
+        # -> suavizado opcional, por bloques solapados y en paralelo
+        stages = ('bandpass_only', 'notch_applied') if self.notch_enabled else ('bandpass_only',)
+        chain_result = self.chain.apply(
+            ppg_data, keep_intermediates=stages if keep_intermediates else (),
+            cancel_check=cancel_check
         )
-        
-        # PASO 2: Notch 50 Hz (si está habilitado)
-        if self.notch_enabled:
-            notch_filtered = signal.filtfilt(
-                self.b_notch, self.a_notch, bandpass_filtered
-            )
-        else:
-            notch_filtered = bandpass_filtered.copy()
-        
-        # PASO 3: Suavizado opcional
-        if self.smoothing:
-            final_filtered = signal.filtfilt(
-                self.b_smooth, [1.0], notch_filtered
-            )
-        else:
-            final_filtered = notch_filtered.copy()
+        final_filtered = chain_result['filtered']
         
         # PASO 4: Detección de artefactos
         artifacts = self._detect_movement_artifacts(final_filtered)
@@ -669,10 +1083,8 @@ class OfflinePPGFilter:
         # PASO 5: Análisis de calidad
         quality_metrics = self._assess_ppg_quality(ppg_data, final_filtered)
         
-        return {
+        result = {
             'filtered': final_filtered,
-            'bandpass_only': bandpass_filtered,
-            'notch_applied': notch_filtered,
             'artifacts': artifacts,
             'quality': quality_metrics,
             'metadata': {
@@ -683,6 +1095,12 @@ class OfflinePPGFilter:
                 'processing_chain': self._get_processing_chain()
             }
         }
+        
+        if keep_intermediates:
+            result['bandpass_only'] = chain_result['bandpass_only']
+            # Sin notch, la salida del notch es la del bandpass (como antes)
+            result['notch_applied'] = chain_result.get('notch_applied', chain_result['bandpass_only'])
+        return result
     
     def _detect_movement_artifacts(self, filtered_signal):
         """
@@ -699,21 +1117,13 @@ class OfflinePPGFilter:
         # Encontrar regiones que excedan el umbral
         above_threshold = np.abs(filtered_signal) > threshold
         
-        # Agrupar regiones consecutivas
-        artifact_regions = []
-        in_artifact = False
-        start_idx = 0
-        
-        for i, is_artifact in enumerate(above_threshold):
-            if is_artifact and not in_artifact:
-                start_idx = i
-                in_artifact = True
-            elif not is_artifact and in_artifact:
-                # Verificar duración mínima (evitar false positives)
-                duration_ms = (i - start_idx) / self.fs * 1000
-                if duration_ms > 200:  # Mínimo 200ms
-                    artifact_regions.append((start_idx, i, duration_ms))
-                in_artifact = False
+        # Agrupar regiones consecutivas con duración mínima de 200ms
+        # (evitar false positives)
+        starts, stops = mask_to_runs(above_threshold)
+        starts, stops = filter_runs(starts, stops, min_length=int(0.2 * self.fs) + 1)
+        durations_ms = (stops - starts) / self.fs * 1000
+        
+        artifact_regions = list(zip(starts.tolist(), stops.tolist(), durations_ms.tolist()))
         
         print(f"Detectados {len(artifact_regions)} artefactos de movimiento")
         return artifact_regions
@@ -891,19 +1301,413 @@ class OfflinePPGFilter:
             return hr_peaks if conf_peaks > conf_fft else hr_fft
 
 
+class StreamingBeatDetector:
+    """
+    Detector de latidos PPG incremental, con coste O(1) por muestra.
+    
+    Estrategia:
+    - Línea base y envolvente de amplitud como medias exponenciales (~2 s)
+    - Umbral adaptativo: fracción de la envolvente sobre la línea base
+    - Pico confirmado cuando la señal desciende desde el máximo local
+    - Rearme con histéresis: la señal debe bajar una fracción de la
+      envolvente por debajo de la línea base (el ruido alrededor de la
+      línea base no rearma el detector)
+    - Picos secundarios (onda dícrota, armónicos, ruido) descartados por
+      amplitud (fracción de la del último latido, atenuada con el tiempo) y
+      por un periodo refractario que se adapta al RR medio
+    - Anillo de intervalos RR recientes con rechazo de valores atípicos
+    
+    Cada latido se notifica en cuanto se confirma su pico, y el BPM se
+    actualiza en ese mismo instante (sin ventanas ni FFT periódicas).
+    
+    NOTA: Recibe señal PPG ya filtrada (paso banda), no aplica filtrado adicional.
+    """
+    
+    # Estados de la máquina de detección
+    _ARMED = 0        # Esperando que la señal supere el umbral
+    _IN_PULSE = 1     # Siguiendo el máximo local de la onda
+    _DISARMED = 2     # Pico confirmado; esperando cruce de la línea base
+    
+    def __init__(self, sample_rate=125, min_bpm=40, max_bpm=180, rr_capacity=8,
+                 min_intervals=3, threshold_factor=0.7, drop_factor=0.3,
+                 outlier_tolerance=0.3, adaptation_sec=2.0, warmup_sec=1.0,
+                 rearm_factor=0.2, peak_fraction=0.5, peak_half_life_sec=2.0,
+                 refractory_fraction=0.6):
+        """
+        Inicializar detector.
+        
+        Args:
+            sample_rate: Frecuencia de muestreo (Hz)
+            min_bpm: BPM mínimo válido (intervalo RR máximo)
+            max_bpm: BPM máximo válido (periodo refractario)
+            rr_capacity: Intervalos RR recientes usados para el BPM
+            min_intervals: Intervalos RR necesarios antes de informar BPM
+            threshold_factor: Umbral de inicio de pulso (fracción de la envolvente)
+            drop_factor: Descenso desde el máximo que confirma el pico (fracción de la envolvente)
+            outlier_tolerance: Desviación relativa máxima de un RR respecto a la media
+            adaptation_sec: Constante de tiempo de línea base y envolvente (s)
+            warmup_sec: Tiempo inicial solo de adaptación, sin detectar (s)
+            rearm_factor: Descenso bajo la línea base que rearma el detector
+                          (fracción de la envolvente)
+            peak_fraction: Amplitud mínima de un pico respecto a la del último latido
+            peak_half_life_sec: Semivida de la amplitud de referencia (s)
+            refractory_fraction: Periodo refractario como fracción del RR medio
+                                 (nunca menor que el del BPM máximo)
+        """
+        self.fs = sample_rate
+        self.min_bpm = min_bpm
+        self.max_bpm = max_bpm
+        self.refractory_sec = 60.0 / max_bpm
+        self.max_rr_sec = 60.0 / min_bpm
+        self.min_intervals = min_intervals
+        self.threshold_factor = threshold_factor
+        self.drop_factor = drop_factor
+        self.rearm_factor = rearm_factor
+        self.peak_fraction = peak_fraction
+        self.peak_half_life_sec = peak_half_life_sec
+        self.refractory_fraction = refractory_fraction
+        self.outlier_tolerance = outlier_tolerance
+        self.alpha = 1.0 / (adaptation_sec * sample_rate)
+        self.warmup_samples = int(warmup_sec * sample_rate)
+        
+        # Anillo de intervalos RR (segundos)
+        self.rr_intervals = np.zeros(rr_capacity)
+        
+        self.reset()
+    
+    def reset(self):
+        """Reiniciar el estado de detección y el historial RR."""
+        self.baseline = None
+        self.envelope = 0.0
+        self.samples_seen = 0
+        self.state = self._ARMED
+        self.peak_dev = 0.0
+        self.peak_time = 0.0
+        
+        self.last_beat_time = None
+        self.last_peak_dev = 0.0
+        self.n_beats = 0
+        self.consecutive_outliers = 0
+        self._clear_intervals()
+    
+    def _clear_intervals(self):
+        """Vaciar el anillo de intervalos RR (tras una pausa o cambio brusco)."""
+        self.rr_pos = 0
+        self.rr_count = 0
+        self.bpm = None
+        self.confidence = 0.0
+    
+    def update(self, value, timestamp_sec):
+        """
+        Procesar una muestra.
+        
+        Args:
+            value: Valor PPG filtrado
+            timestamp_sec: Tiempo de la muestra en segundos
+            
+        Returns:
+            bool: True si esta muestra confirma un latido
+        """
+        if self.baseline is None:
+            self.baseline = value
+        
+        # Línea base y envolvente (medias exponenciales)
+        dev = value - self.baseline
+        self.baseline += self.alpha * dev
+        self.envelope += self.alpha * (abs(dev) - self.envelope)
+        
+        self.samples_seen += 1
+        if self.samples_seen < self.warmup_samples:
+            return False
+        
+        if self.state == self._ARMED:
+            if dev > self.threshold_factor * self.envelope:
+                self.state = self._IN_PULSE
+                self.peak_dev = dev
+                self.peak_time = timestamp_sec
+            return False
+        
+        if self.state == self._IN_PULSE:
+            if dev > self.peak_dev:
+                self.peak_dev = dev
+                self.peak_time = timestamp_sec
+                return False
+            if dev < self.peak_dev - self.drop_factor * self.envelope or dev < 0:
+                # Un candidato descartado (p.ej. un repunte de ruido en el flanco
+                # de subida) no desarma: el pico real puede llegar a continuación
+                beat = self._register_beat(self.peak_time, self.peak_dev)
+                self.state = self._DISARMED if beat else self._ARMED
+                return beat
+            return False
+        
+        # _DISARMED: rearmar al bajar claramente de la línea base
+        if dev < -self.rearm_factor * self.envelope:
+            self.state = self._ARMED
+        return False
+    
+    def process_block(self, values, timestamps_sec):
+        """
+        Procesar un bloque de muestras.
+        
+        Args:
+            values: Array 1D de valores PPG filtrados
+            timestamps_sec: Array 1D de tiempos en segundos (misma longitud)
+            
+        Returns:
+            dict: {
+                'beat': array booleano, True en las muestras que confirman un latido,
+                'bpm': array con el BPM vigente tras cada muestra (NaN si no hay),
+                'confidence': array con la confianza vigente tras cada muestra
+            }
+        """
+        n = len(values)
+        beat = np.zeros(n, dtype=bool)
+        
+        # Estado vigente al inicio del bloque y en cada latido
+        change_idx = [-1]
+        change_bpm = [np.nan if self.bpm is None else self.bpm]
+        change_conf = [self.confidence]
+        
+        update = self.update
+        for i, (value, timestamp) in enumerate(zip(np.asarray(values).tolist(),
+                                                   np.asarray(timestamps_sec).tolist())):
+            if update(value, timestamp):
+                beat[i] = True
+                change_idx.append(i)
+                change_bpm.append(np.nan if self.bpm is None else self.bpm)
+                change_conf.append(self.confidence)
+        
+        # Propagar cada valor hasta el siguiente latido
+        pos = np.searchsorted(change_idx, np.arange(n), side='right') - 1
+        return {
+            'beat': beat,
+            'bpm': np.asarray(change_bpm)[pos],
+            'confidence': np.asarray(change_conf)[pos]
+        }
+    
+    def _register_beat(self, beat_time, peak_dev):
+        """Registrar un pico confirmado; False si es secundario o cae en el periodo refractario."""
+        if self.last_beat_time is not None:
+            rr = beat_time - self.last_beat_time
+            
+            # Referencia: amplitud del último latido, atenuada con el tiempo para
+            # seguir las bajadas de amplitud (y olvidar un pico de ruido aislado)
+            reference = self.last_peak_dev * 0.5 ** (rr / self.peak_half_life_sec)
+            if peak_dev < self.peak_fraction * reference:
+                return False
+            
+            refractory = self.refractory_sec
+            if self.bpm is not None:
+                refractory = max(refractory, self.refractory_fraction * 60.0 / self.bpm)
+            if rr < refractory:
+                return False
+            if rr > self.max_rr_sec:
+                # Pausa o pérdida de señal: el historial ya no es representativo
+                self._clear_intervals()
+            else:
+                self._add_interval(rr)
+        
+        self.last_peak_dev = peak_dev
+        self.last_beat_time = beat_time
+        self.n_beats += 1
+        return True
+    
+    def _add_interval(self, rr):
+        """Añadir un intervalo RR al anillo y recalcular BPM y confianza."""
+        capacity = len(self.rr_intervals)
+        
+        if self.rr_count >= self.min_intervals:
+            mean_rr = self.rr_intervals[:self.rr_count].mean()
+            if abs(rr - mean_rr) > self.outlier_tolerance * mean_rr:
+                # Latido perdido o falso; tras varios seguidos, aceptar el nuevo ritmo
+                self.consecutive_outliers += 1
+                if self.consecutive_outliers < self.min_intervals:
+                    return
+                self._clear_intervals()
+        self.consecutive_outliers = 0
+        
+        self.rr_intervals[self.rr_pos] = rr
+        self.rr_pos = (self.rr_pos + 1) % capacity
+        self.rr_count = min(self.rr_count + 1, capacity)
+        
+        if self.rr_count >= self.min_intervals:
+            recent = self.rr_intervals[:self.rr_count]
+            mean_rr = recent.mean()
+            cv_rr = recent.std() / mean_rr  # Coeficiente de variación
+            self.bpm = 60.0 / mean_rr
+            self.confidence = max(0.0, 1.0 - cv_rr * 3)  # Penalizar irregularidad
+
+
+class SlidingDFTEstimator:
+    """
+    Estimador espectral de BPM con DFT deslizante restringida a la banda cardíaca.
+    
+    Mantiene, para una rejilla fina de frecuencias entre min_bpm y max_bpm,
+    la suma S(f) = sum x[n]·e^(-j·2π·f·n/fs) sobre las últimas N muestras.
+    Cada muestra nueva suma su término y resta el de la muestra que sale de
+    la ventana, con coste O(bins) por muestra en lugar de una FFT completa
+    O(N log N) en cada actualización.
+    
+    La ventana de Hann se aplica en frecuencia combinando cada bin con sus
+    vecinos a ±fs/N, y el pico se refina con interpolación parabólica.
+    """
+    
+    def __init__(self, sample_rate=125, window_sec=10, min_bpm=40, max_bpm=180,
+                 resolution_hz=0.02):
+        """
+        Inicializar estimador.
+        
+        Args:
+            sample_rate: Frecuencia de muestreo (Hz)
+            window_sec: Duración de la ventana deslizante (s)
+            min_bpm: BPM mínimo de la banda analizada
+            max_bpm: BPM máximo de la banda analizada
+            resolution_hz: Separación deseada entre bins de la rejilla (Hz)
+        """
+        self.fs = sample_rate
+        self.window_size = int(window_sec * sample_rate)
+        self.min_freq = min_bpm / 60.0
+        self.max_freq = max_bpm / 60.0
+        
+        # Rejilla fina cuyo paso divide la separación natural fs/N, de modo que
+        # los vecinos a ±fs/N (ventana de Hann) también están en la rejilla
+        bin_spacing = sample_rate / self.window_size
+        self.oversampling = max(1, int(round(bin_spacing / resolution_hz)))
+        self.resolution = bin_spacing / self.oversampling
+        
+        first = int(np.floor(self.min_freq / self.resolution)) - self.oversampling
+        last = int(np.ceil(self.max_freq / self.resolution)) + self.oversampling
+        self.freqs = np.arange(max(first, 0), last + 1) * self.resolution
+        self.omega = 2 * np.pi * self.freqs / sample_rate
+        
+        # Factor para quitar una muestra que sale de la ventana: e^(+j·ω·N)
+        self._leave_factor = np.exp(1j * self.omega * self.window_size)
+        
+        self.reset()
+    
+    def reset(self):
+        """Vaciar la ventana."""
+        self.sums = np.zeros(len(self.freqs), dtype=np.complex128)
+        self._history = np.zeros(self.window_size)
+        self._pos = 0
+        self.samples_seen = 0
+    
+    @property
+    def n_bins(self):
+        """Número de frecuencias mantenidas."""
+        return len(self.freqs)
+    
+    def update(self, values):
+        """
+        Añadir un bloque de muestras (o una sola) a la ventana deslizante.
+        
+        Args:
+            values: Valor o array 1D de valores PPG filtrados
+        """
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        
+        # Bloques más largos que la ventana: procesar por tramos
+        for start in range(0, len(values), self.window_size):
+            self._update_chunk(values[start:start + self.window_size])
+    
+    def _update_chunk(self, values):
+        """Actualizar con un tramo de como máximo N muestras."""
+        n_new = len(values)
+        if n_new == 0:
+            return
+        
+        positions = (self._pos + np.arange(n_new)) % self.window_size
+        leaving = self._history[positions]
+        
+        # Fasores de las muestras nuevas (numeración absoluta de muestra)
+        sample_numbers = self.samples_seen + np.arange(n_new)
+        phasors = np.exp(-1j * np.outer(sample_numbers, self.omega))
+        
+        # Las muestras que salen tienen número n - N: mismo fasor por e^(+j·ω·N)
+        self.sums += values @ phasors - (leaving @ phasors) * self._leave_factor
+        
+        self._history[positions] = values
+        self._pos = (self._pos + n_new) % self.window_size
+        self.samples_seen += n_new
+    
+    def spectrum(self):
+        """
+        Potencia con ventana de Hann en la rejilla de la banda cardíaca.
+        
+        Returns:
+            tuple: (frecuencias en Hz, potencia)
+        """
+        o = self.oversampling
+        
+        # Referir la fase al inicio de la ventana para combinar bins vecinos
+        window_start = self.samples_seen - self.window_size
+        rotation = np.exp(-2j * np.pi * window_start / self.window_size)
+        
+        windowed = (0.5 * self.sums[o:-o]
+                    - 0.25 * self.sums[:-2 * o] * rotation
+                    - 0.25 * self.sums[2 * o:] * np.conj(rotation))
+        freqs = self.freqs[o:-o]
+        power = np.abs(windowed) ** 2
+        
+        mask = (freqs >= self.min_freq) & (freqs <= self.max_freq)
+        return freqs[mask], power[mask]
+    
+    def estimate(self):
+        """
+        BPM del pico espectral dominante con interpolación parabólica.
+        
+        Returns:
+            tuple: (bpm o None, confianza)
+        """
+        freqs, power = self.spectrum()
+        if len(power) < 3 or not np.any(power > 0):
+            return None, 0.0
+        
+        peak = int(np.argmax(power))
+        peak_freq = freqs[peak]
+        
+        # Interpolación parabólica sobre log-potencia (resolución sub-bin)
+        if 0 < peak < len(power) - 1:
+            a, b, c = np.log(power[peak - 1:peak + 2] + 1e-20)
+            denominator = a - 2 * b + c
+            if denominator < 0:
+                peak_freq += 0.5 * (a - c) / denominator * self.resolution
+        
+        # Confianza basada en la relación señal/ruido (igual que la rama FFT)
+        snr = power[peak] / (np.mean(power) + 1e-10)
+        confidence = min(1.0, np.log10(snr + 1) / 2)
+        
+        return float(peak_freq * 60.0), float(confidence)
+
+
 class PPGHeartRateCalculator:
     """
     Calculador de BPM optimizado para monitoreo EMDR en tiempo real.
     
-    Estrategia:
-    - Primer cálculo: 8 segundos (permite setup sin prisa)
-    - Actualizaciones: cada 2 segundos con ventana deslizante de 10s
-    - Detección de artefactos y validación automática
+    Métodos:
+    - 'window': primer cálculo a los 8 segundos y actualizaciones cada
+      2 segundos con ventana deslizante de 10s (picos + FFT)
+    - 'beats': detector de latidos incremental (StreamingBeatDetector);
+      el BPM se actualiza en cada latido, sin cálculos periódicos
+    
+    El detector de latidos funciona siempre en el modo 'beats'; en el modo
+    'window' solo si se pide con detect_beats=True (su bucle por muestra es
+    el coste dominante de add_block). 'beat' indica las muestras en que se
+    confirma una pulsación y es siempre False si el detector no está activo.
+    
+    Rama espectral del modo 'window' (spectral_method):
+    - 'fft': FFT completa de la ventana en cada actualización
+    - 'sdft': DFT deslizante solo en la banda cardíaca (SlidingDFTEstimator),
+      actualizada muestra a muestra y con interpolación sub-bin
     
     NOTA: Recibe señal PPG ya filtrada, no aplica filtrado adicional.
     """
     
-    def __init__(self, sample_rate=125, min_bpm=40, max_bpm=180):
+    METHODS = ('window', 'beats')
+    SPECTRAL_METHODS = ('fft', 'sdft')
+    
+    def __init__(self, sample_rate=125, min_bpm=40, max_bpm=180, method='window',
+                 spectral_method='fft', detect_beats=None):
         """
         Inicializar calculador de BPM.
         
@@ -911,10 +1715,27 @@ class PPGHeartRateCalculator:
             sample_rate: Frecuencia de muestreo (Hz)
             min_bpm: BPM mínimo válido  
             max_bpm: BPM máximo válido
+            method: 'window' (ventana periódica) o 'beats' (latido a latido)
+            spectral_method: 'fft' o 'sdft' (rama espectral del modo 'window')
+            detect_beats: Activar el detector de latidos en el modo 'window'
+                          (None = solo en el modo 'beats')
         """
+        if method not in self.METHODS:
+            raise ValueError(f"Método de BPM no soportado: {method}")
+        if spectral_method not in self.SPECTRAL_METHODS:
+            raise ValueError(f"Método espectral no soportado: {spectral_method}")
+        
         self.fs = sample_rate
         self.min_bpm = min_bpm
         self.max_bpm = max_bpm
+        self.method = method
+        self.spectral_method = spectral_method
+        self.detect_beats = method == 'beats' or bool(detect_beats)
+        
+        # Detector de latidos incremental (O(1) por muestra)
+        self.beat_detector = StreamingBeatDetector(
+            sample_rate=sample_rate, min_bpm=min_bpm, max_bpm=max_bpm
+        )
         
         # Configuración de ventanas
         self.initial_window_sec = 8      # Primera medición
@@ -924,6 +1745,14 @@ class PPGHeartRateCalculator:
         # Buffer para datos filtrados (NO hay buffer raw ni filtro interno)
         self.ppg_buffer = deque(maxlen=20 * sample_rate)  # 20 segundos de datos
         
+        # DFT deslizante de la banda cardíaca (misma ventana que el cálculo)
+        self.spectral_estimator = None
+        if spectral_method == 'sdft':
+            self.spectral_estimator = SlidingDFTEstimator(
+                sample_rate=sample_rate, window_sec=self.update_window_sec,
+                min_bpm=min_bpm, max_bpm=max_bpm
+            )
+        
         # Estado
         self.last_bpm = None
         self.last_update_time = 0
@@ -931,8 +1760,12 @@ class PPGHeartRateCalculator:
         self.confidence_score = 0.0
         
         print(f"PPG BPM Calculator iniciado:")
-        print(f"  - Primer cálculo: {self.initial_window_sec}s")
-        print(f"  - Actualizaciones: cada {self.update_interval_sec}s (ventana {self.update_window_sec}s)")
+        if method == 'beats':
+            print(f"  - Actualizaciones: en cada latido (detector incremental)")
+        else:
+            print(f"  - Primer cálculo: {self.initial_window_sec}s")
+            print(f"  - Actualizaciones: cada {self.update_interval_sec}s (ventana {self.update_window_sec}s)")
+            print(f"  - Rama espectral: {spectral_method}")
         print(f"  - Rango BPM válido: {min_bpm}-{max_bpm}")
         print(f"  - Recibe señal PPG ya filtrada")
     
@@ -945,11 +1778,21 @@ class PPGHeartRateCalculator:
             timestamp_sec: Tiempo en segundos
             
         Returns:
-            dict: {'bpm': float/None, 'confidence': float, 'updated': bool}
+            dict: {'bpm': float/None, 'confidence': float, 'updated': bool, 'beat': bool}
         """
+        beat = False
+        if self.detect_beats:
+            beat = self.beat_detector.update(filtered_ppg_value, timestamp_sec)
+        
+        if self.method == 'beats':
+            self.samples_received += 1
+            return self._beat_result(beat)
+        
         # Almacenar muestra filtrada directamente
         self.ppg_buffer.append(filtered_ppg_value)
         self.samples_received += 1
+        if self.spectral_estimator is not None:
+            self.spectral_estimator.update(filtered_ppg_value)
         
         # Determinar si calcular BPM
         should_calculate = False
@@ -972,14 +1815,143 @@ class PPGHeartRateCalculator:
                 'bpm': result['bpm'],
                 'confidence': result['confidence'],
                 'updated': True,
-                'quality': result['quality']
+                'quality': result['quality'],
+                'beat': beat
             }
         
         return {
             'bpm': self.last_bpm,
             'confidence': self.confidence_score,
             'updated': False,
-            'quality': 'pending'
+            'quality': 'pending',
+            'beat': beat
+        }
+    
+    def _beat_result(self, beat):
+        """Resultado de add_sample() en modo 'beats'."""
+        detector = self.beat_detector
+        updated = beat and detector.bpm is not None
+        if updated:
+            self.last_bpm = detector.bpm
+            self.confidence_score = detector.confidence
+        
+        return {
+            'bpm': self.last_bpm,
+            'confidence': self.confidence_score,
+            'updated': updated,
+            'quality': 'beat' if updated else 'pending',
+            'beat': beat
+        }
+    
+    def add_block(self, filtered_ppg_values, timestamps_sec):
+        """
+        Añadir un bloque de muestras PPG filtradas.
+        
+        Los cálculos de BPM se disparan en las mismas muestras en que lo
+        haría add_sample(); entre disparos el bloque se añade al buffer de
+        una sola vez.
+        
+        Args:
+            filtered_ppg_values: Array 1D de valores PPG ya filtrados
+            timestamps_sec: Array 1D de tiempos en segundos (misma longitud)
+            
+        Returns:
+            dict: {
+                'bpm': array con el BPM vigente tras cada muestra (NaN si no hay),
+                'confidence': array con la confianza vigente tras cada muestra,
+                'updated': array booleano, True en las muestras que recalcularon,
+                'beat': array booleano, True en las muestras que confirman un latido
+            }
+        """
+        values = np.asarray(filtered_ppg_values, dtype=np.float64)
+        timestamps = np.asarray(timestamps_sec, dtype=np.float64)
+        n = len(values)
+        
+        if self.method == 'beats':
+            return self._beat_block_result(self.beat_detector.process_block(values, timestamps))
+        
+        beat = np.zeros(n, dtype=bool)
+        if self.detect_beats:
+            beat = self.beat_detector.process_block(values, timestamps)['beat']
+        
+        bpm_out = np.full(n, np.nan)
+        confidence_out = np.zeros(n)
+        updated = np.zeros(n, dtype=bool)
+        
+        start = 0
+        while start < n:
+            # Localizar la siguiente muestra que dispara un cálculo
+            if self.last_bpm is None:
+                needed = int(self.initial_window_sec * self.fs) - self.samples_received
+                trigger = start + max(needed - 1, 0)
+            else:
+                due = np.flatnonzero(
+                    timestamps[start:] - self.last_update_time >= self.update_interval_sec
+                )
+                trigger = start + int(due[0]) if len(due) else n
+            
+            # Tramo sin cálculos: valores vigentes constantes
+            stop = min(trigger, n)
+            if stop > start:
+                self.ppg_buffer.extend(values[start:stop].tolist())
+                self.samples_received += stop - start
+                if self.spectral_estimator is not None:
+                    self.spectral_estimator.update(values[start:stop])
+                if self.last_bpm is not None:
+                    bpm_out[start:stop] = self.last_bpm
+                confidence_out[start:stop] = self.confidence_score
+            
+            if trigger >= n:
+                break
+            
+            # Muestra que dispara el cálculo
+            if self.last_bpm is None:
+                print(f"Primera medición BPM (después de {self.initial_window_sec}s)")
+            self.ppg_buffer.append(values[trigger])
+            self.samples_received += 1
+            if self.spectral_estimator is not None:
+                self.spectral_estimator.update(values[trigger])
+            result = self._calculate_bpm()
+            self.last_update_time = timestamps[trigger]
+            
+            if result['bpm'] is not None:
+                bpm_out[trigger] = result['bpm']
+            confidence_out[trigger] = result['confidence']
+            updated[trigger] = True
+            start = trigger + 1
+        
+        return {
+            'bpm': bpm_out,
+            'confidence': confidence_out,
+            'updated': updated,
+            'beat': beat
+        }
+    
+    def _beat_block_result(self, beats):
+        """Resultado de add_block() en modo 'beats' (el BPM vigente se mantiene entre latidos)."""
+        n = len(beats['beat'])
+        self.samples_received += n
+        
+        # Mantener la última estimación válida mientras el detector no tenga una
+        valid = ~np.isnan(beats['bpm'])
+        source = np.where(valid, np.arange(n), -1)
+        np.maximum.accumulate(source, out=source)
+        known = source >= 0
+        
+        bpm_out = np.full(n, np.nan if self.last_bpm is None else self.last_bpm)
+        confidence_out = np.full(n, self.confidence_score)
+        bpm_out[known] = beats['bpm'][source[known]]
+        confidence_out[known] = beats['confidence'][source[known]]
+        
+        if n and known[-1]:
+            self.last_bpm = float(bpm_out[-1])
+            self.confidence_score = float(confidence_out[-1])
+        
+        return {
+            'bpm': bpm_out,
+            'confidence': confidence_out,
+            'updated': beats['beat'] & valid,
+            'beat': beats['beat']
         }
     
     def _calculate_bpm(self):
@@ -1004,8 +1976,11 @@ class PPGHeartRateCalculator:
         # Método 1: Detección de picos (principal)
         bpm_peaks, confidence_peaks = self._calculate_bpm_peaks(data)
         
-        # Método 2: FFT (validación)
-        bpm_fft, confidence_fft = self._calculate_bpm_fft(data)
+        # Método 2: espectral (validación): FFT completa o DFT deslizante ya actualizada
+        if self.spectral_estimator is not None:
+            bpm_fft, confidence_fft = self.spectral_estimator.estimate()
+        else:
+            bpm_fft, confidence_fft = self._calculate_bpm_fft(data)
         
         # Fusión inteligente de resultados
         final_bpm, final_confidence, quality = self._fuse_bpm_estimates(
@@ -1146,12 +2121,17 @@ class PPGHeartRateCalculator:
             'last_bpm': self.last_bpm,
             'confidence': self.confidence_score,
             'ready_for_first': self.samples_received >= self.initial_window_sec * self.fs,
-            'time_coverage_sec': len(self.ppg_buffer) / self.fs
+            'time_coverage_sec': len(self.ppg_buffer) / self.fs,
+            'method': self.method,
+            'beats_detected': self.beat_detector.n_beats
         }
     
     def reset(self):
         """Reiniciar el calculador."""
         self.ppg_buffer.clear()
+        self.beat_detector.reset()
+        if self.spectral_estimator is not None:
+            self.spectral_estimator.reset()
         self.last_bpm = None
         self.last_update_time = 0
         self.samples_received = 0
@@ -1169,19 +2149,39 @@ class BPMOfflineCalculation:
     - Extensión automática para artefactos: 5 segundos
     - Suavizado de serie temporal integrado
     
+    Modos:
+    - 'windowed': detección de picos en cada ventana (resultado de referencia);
+      las ventanas se extraen con searchsorted en lugar de máscaras completas
+    - 'global': detección de picos una sola vez sobre toda la señal, con
+      umbrales adaptativos locales, y estadísticas RR por ventana mediante
+      sumas acumuladas (O(N) en total). Experimental y solo a petición: sus
+      umbrales no reproducen la media/std de cada ventana y con ruido o
+      armónicos el BPM difiere del de 'windowed' (en PPG sintético de 10 min,
+      media 0.6 BPM y hasta ~3 BPM)
+    
     Uso típico:
         calculator = BPMOfflineCalculation()
         result = calculator.calculate_bpm_evolution(filtered_ppg, ms_data)
     """
     
-    def __init__(self, fs=125):
+    METHODS = ('windowed', 'global')
+    
+    # Incrementar al cambiar el algoritmo (invalida resultados en caché)
+    VERSION = 1
+    
+    def __init__(self, fs=125, method='windowed'):
         """
         Inicializar calculador BPM offline.
         
         Args:
             fs: Frecuencia de muestreo estimada (Hz)
+            method: 'windowed' (picos por ventana) o 'global' (picos una sola vez)
         """
+        if method not in self.METHODS:
+            raise ValueError(f"Método de BPM offline no soportado: {method}")
+        
         self.fs = fs
+        self.method = method
         
         # Parámetros fijos optimizados para análisis offline
         self.initial_window_sec = 15     # Ventana inicial (primeros 60s)
@@ -1198,14 +2198,18 @@ class BPMOfflineCalculation:
         print(f"  - Intervalo de cálculo: {self.calculation_interval_sec}s")
         print(f"  - Extensión por artefactos: {self.artifact_extension_sec}s")
         print(f"  - Frecuencia de muestreo: {self.fs} Hz")
+        print(f"  - Método: {self.method}")
     
-    def calculate_bpm_evolution(self, filtered_ppg_data, ms_data):
+    def calculate_bpm_evolution(self, filtered_ppg_data, ms_data, cancel_check=None):
         """
         Calcular evolución de BPM a lo largo de toda la señal filtrada.
         
         Args:
             filtered_ppg_data: Array numpy con señal PPG ya filtrada
             ms_data: Array numpy con timestamps en milisegundos
+            cancel_check: Función sin argumentos llamada entre etapas (y en cada
+                ventana del método 'windowed'); puede lanzar una excepción para
+                interrumpir el cálculo
             
         Returns:
             dict: {
@@ -1227,59 +2231,27 @@ class BPMOfflineCalculation:
         time_sec = ms_data / 1000.0
         total_duration = time_sec[-1] - time_sec[0]
         
-        # Preparar arrays de resultado
-        bpm_times = []
-        bpm_values = []
-        confidence_values = []
-        
         # Empezar después de la ventana inicial mínima
         start_time = time_sec[0] + self.initial_window_sec
         end_time = time_sec[-1]
-        current_time = start_time
         
         print(f"Calculando BPM desde {start_time:.1f}s hasta {end_time:.1f}s")
         print(f"Transición de ventana en {self.transition_time_sec}s")
         
-        while current_time <= end_time:
-            # **VENTANA ADAPTATIVA**: Determinar tamaño de ventana según tiempo transcurrido
-            time_from_start = current_time - time_sec[0]
-            
-            if time_from_start <= self.transition_time_sec:
-                # Primeros 60 segundos: ventana de 15s
-                current_window_size = self.initial_window_sec
-            else:
-                # Después de 60 segundos: ventana de 60s
-                current_window_size = self.extended_window_sec
-            
-            # Definir ventana de análisis
-            window_start = current_time - current_window_size
-            window_end = current_time
-            
-            # Extraer datos de la ventana
-            mask = (time_sec >= window_start) & (time_sec <= window_end)
-            window_ppg = filtered_ppg_data[mask]
-            window_time = time_sec[mask]
-            
-            if len(window_ppg) > 0:
-                # Calcular BPM para esta ventana
-                bpm_result = self._calculate_bpm_for_window(window_ppg, window_time)
-                
-                if bpm_result['bpm'] is not None:
-                    bpm_times.append(current_time)
-                    bpm_values.append(bpm_result['bpm'])
-                    confidence_values.append(bpm_result['confidence'])
-                else:
-                    # Extender ventana por artefactos
-                    extended_result = self._calculate_with_extended_window(
-                        time_sec, filtered_ppg_data, current_time, window_start, window_end
-                    )
-                    if extended_result['bpm'] is not None:
-                        bpm_times.append(current_time)
-                        bpm_values.append(extended_result['bpm'])
-                        confidence_values.append(extended_result['confidence'])
-            
-            # Avanzar en el tiempo
-            current_time += self.calculation_interval_sec
+        step_times, window_starts = self._window_schedule(time_sec, start_time, end_time)
+        
+        if cancel_check is not None:
+            cancel_check()
+        if self.method == 'global':
+            bpm_times, bpm_values, confidence_values = self._evolution_global(
+                filtered_ppg_data, time_sec, step_times, window_starts
+            )
+        else:
+            bpm_times, bpm_values, confidence_values = self._evolution_windowed(
+                filtered_ppg_data, time_sec, step_times, window_starts, cancel_check
+            )
+        if cancel_check is not None:
+            cancel_check()
         
         # Aplicar suavizado a la serie temporal de BPM
         if len(bpm_values) > 5:
@@ -1299,6 +2271,7 @@ class BPMOfflineCalculation:
                 'extended_window_sec': self.extended_window_sec,
                 'transition_time_sec': self.transition_time_sec,
                 'calculation_interval_sec': self.calculation_interval_sec,
+                'method': self.method,
                 'mean_bpm': np.mean(bpm_smoothed) if len(bpm_smoothed) > 0 else None,
                 'std_bpm': np.std(bpm_smoothed) if len(bpm_smoothed) > 0 else None
             }
@@ -1310,6 +2283,169 @@ class BPMOfflineCalculation:
         
         return result
     
+    def _window_schedule(self, time_sec, start_time, end_time):
+        """
+        Instantes de cálculo y comienzo de la ventana adaptativa de cada uno.
+        
+        Returns:
+            tuple: (tiempos de cálculo, inicios de ventana) como arrays
+        """
+        step_times = []
+        current_time = start_time
+        while current_time <= end_time:
+            step_times.append(current_time)
+            current_time += self.calculation_interval_sec
+        step_times = np.array(step_times)
+        
+        # **VENTANA ADAPTATIVA**: 15s los primeros 60 segundos, 60s después
+        window_sizes = np.where(
+            step_times - time_sec[0] <= self.transition_time_sec,
+            self.initial_window_sec,
+            self.extended_window_sec
+        )
+        return step_times, step_times - window_sizes
+    
+    def _extended_bounds(self, time_sec, window_starts, window_ends):
+        """Límites de la ventana extendida por artefactos (recortados a la señal)."""
+        extended_starts = np.maximum(window_starts - self.artifact_extension_sec, time_sec[0])
+        extended_ends = np.minimum(window_ends + self.artifact_extension_sec, time_sec[-1])
+        return extended_starts, extended_ends
+    
+    def _evolution_windowed(self, filtered_ppg_data, time_sec, step_times, window_starts,
+                            cancel_check=None):
+        """Serie de BPM detectando picos en cada ventana."""
+        bpm_times = []
+        bpm_values = []
+        confidence_values = []
+        
+        # Índices de cada ventana por búsqueda binaria (time_sec es creciente)
+        lo = np.searchsorted(time_sec, window_starts, side='left')
+        hi = np.searchsorted(time_sec, step_times, side='right')
+        extended_starts, extended_ends = self._extended_bounds(time_sec, window_starts, step_times)
+        ext_lo = np.searchsorted(time_sec, extended_starts, side='left')
+        ext_hi = np.searchsorted(time_sec, extended_ends, side='right')
+        
+        for i, current_time in enumerate(step_times.tolist()):
+            if cancel_check is not None:
+                cancel_check()
+            if hi[i] <= lo[i]:
+                continue
+            
+            # Calcular BPM para esta ventana
+            bpm_result = self._calculate_bpm_for_window(
+                filtered_ppg_data[lo[i]:hi[i]], time_sec[lo[i]:hi[i]]
+            )
+            if bpm_result['bpm'] is None:
+                # Extender ventana por artefactos
+                bpm_result = self._calculate_bpm_for_window(
+                    filtered_ppg_data[ext_lo[i]:ext_hi[i]], time_sec[ext_lo[i]:ext_hi[i]]
+                )
+            
+            if bpm_result['bpm'] is not None:
+                bpm_times.append(current_time)
+                bpm_values.append(bpm_result['bpm'])
+                confidence_values.append(bpm_result['confidence'])
+        
+        return bpm_times, bpm_values, confidence_values
+    
+    def _evolution_global(self, filtered_ppg_data, time_sec, step_times, window_starts):
+        """Serie de BPM con una única detección de picos y sumas acumuladas de RR."""
+        peaks = self._detect_peaks_global(filtered_ppg_data)
+        peak_times = time_sec[peaks]
+        
+        # Intervalos RR (muestras / fs, como en la detección por ventana)
+        rr_intervals = np.diff(peaks) / self.fs
+        valid = (rr_intervals >= 0.4) & (rr_intervals <= 1.5)
+        valid_rr = np.where(valid, rr_intervals, 0.0)
+        rr_sums = (
+            np.concatenate(([0], np.cumsum(valid))),
+            np.concatenate(([0.0], np.cumsum(valid_rr))),
+            np.concatenate(([0.0], np.cumsum(valid_rr ** 2))),
+        )
+        
+        bpm, confidence = self._windowed_rr_stats(
+            time_sec, peak_times, rr_sums, window_starts, step_times
+        )
+        
+        # Ventanas sin resultado: repetir con la ventana extendida
+        missing = np.isnan(bpm)
+        if np.any(missing):
+            extended_starts, extended_ends = self._extended_bounds(
+                time_sec, window_starts[missing], step_times[missing]
+            )
+            bpm[missing], confidence[missing] = self._windowed_rr_stats(
+                time_sec, peak_times, rr_sums, extended_starts, extended_ends
+            )
+        
+        found = ~np.isnan(bpm)
+        return step_times[found].tolist(), bpm[found].tolist(), confidence[found].tolist()
+    
+    def _detect_peaks_global(self, filtered_ppg_data):
+        """
+        Detectar picos en toda la señal con altura y prominencia adaptativas.
+        
+        Media y desviación estándar móviles (ventana inicial centrada,
+        calculadas con sumas acumuladas) sustituyen a las de cada ventana.
+        """
+        data = np.asarray(filtered_ppg_data, dtype=np.float64)
+        n = len(data)
+        half = int(self.initial_window_sec * self.fs) // 2
+        
+        sums = np.concatenate(([0.0], np.cumsum(data)))
+        sums_sq = np.concatenate(([0.0], np.cumsum(data ** 2)))
+        lo = np.maximum(np.arange(n) - half, 0)
+        hi = np.minimum(np.arange(n) + half + 1, n)
+        counts = hi - lo
+        
+        rolling_mean = (sums[hi] - sums[lo]) / counts
+        rolling_var = (sums_sq[hi] - sums_sq[lo]) / counts - rolling_mean ** 2
+        rolling_std = np.sqrt(np.maximum(rolling_var, 0.0))
+        
+        # Distancia mínima entre picos (0.4s = 150 BPM máximo)
+        peaks, _ = signal.find_peaks(
+            data,
+            distance=int(0.4 * self.fs),
+            prominence=rolling_std * 0.3,
+            height=rolling_mean
+        )
+        return peaks
+    
+    def _windowed_rr_stats(self, time_sec, peak_times, rr_sums, window_starts, window_ends):
+        """
+        BPM y confianza de varias ventanas a la vez a partir de sumas acumuladas.
+        
+        Aplica los mismos criterios que _calculate_bpm_for_window: mínimo
+        5 segundos de señal, 3 picos y 2 intervalos RR válidos, y rango 40-120 BPM.
+        
+        Returns:
+            tuple: (bpm, confianza) por ventana; NaN donde no hay resultado
+        """
+        counts, totals, totals_sq = rr_sums
+        
+        n_samples = (np.searchsorted(time_sec, window_ends, side='right')
+                     - np.searchsorted(time_sec, window_starts, side='left'))
+        first_peak = np.searchsorted(peak_times, window_starts, side='left')
+        end_peak = np.searchsorted(peak_times, window_ends, side='right')
+        n_peaks = end_peak - first_peak
+        
+        # Intervalos entre picos consecutivos de la ventana: [first_peak, end_peak - 1)
+        max_index = len(counts) - 1
+        last_rr = np.minimum(np.maximum(end_peak - 1, first_peak), max_index)
+        first_peak = np.minimum(first_peak, max_index)
+        n_valid = counts[last_rr] - counts[first_peak]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_rr = (totals[last_rr] - totals[first_peak]) / n_valid
+            var_rr = (totals_sq[last_rr] - totals_sq[first_peak]) / n_valid - mean_rr ** 2
+            bpm = 60.0 / mean_rr
+            cv = np.sqrt(np.maximum(var_rr, 0.0)) / mean_rr
+        confidence = np.clip(1.0 - cv * 3, 0.0, 1.0)
+        
+        ok = (
+            (n_samples >= self.fs * 5) & (n_peaks >= 3) & (n_valid >= 2) &
+            (bpm >= 40) & (bpm <= 120)
+        )
+        return np.where(ok, bpm, np.nan), np.where(ok, confidence, 0.0)
+    
     def _calculate_bpm_for_window(self, ppg_window, time_window):
         """Calcular BPM para una ventana específica"""
         try:
@@ -1360,27 +2496,6 @@ class BPMOfflineCalculation:
         except Exception as e:
             return {'bpm': None, 'confidence': 0.0}
     
-    def _calculate_with_extended_window(self, full_time, full_ppg, current_time, original_start, original_end):
-        """Calcular BPM con ventana extendida para manejar artefactos"""
-        try:
-            # Extender ventana hacia atrás y adelante
-            extended_start = original_start - self.artifact_extension_sec
-            extended_end = original_end + self.artifact_extension_sec
-            
-            # Asegurar límites
-            extended_start = max(extended_start, full_time[0])
-            extended_end = min(extended_end, full_time[-1])
-            
-            # Extraer datos extendidos
-            mask = (full_time >= extended_start) & (full_time <= extended_end)
-            extended_ppg = full_ppg[mask]
-            extended_time = full_time[mask]
-            
-            return self._calculate_bpm_for_window(extended_ppg, extended_time)
-            
-        except Exception as e:
-            return {'bpm': None, 'confidence': 0.0}
-    
     def _smooth_bpm_series(self, bpm_values):
         """Aplicar suavizado a la serie temporal de BPM"""
         if len(bpm_values) < 5:
@@ -2,7 +2,6 @@ import sys
 import os
 import winsound
 import numpy as np
-import struct
 import threading
 import time
 import pandas as pd
@@ -23,16 +22,12 @@ import qtawesome as qta
 # Importaciones del proyecto
 from models.devices import Devices, KNOWN_SLAVES
 from utils.signal_processing import OnlinePPGFilter, PPGHeartRateCalculator
+from utils.packet_decoder import PacketDecoder
 
 # Configuración de constantes
 SAMPLE_RATE = 125  # Hz
 DISPLAY_TIME = 8   # Segundos de datos a mostrar
 GRAPH_PADDING = 0.01
-BUFFER_SIZE = 512
-
-# Constantes para el protocolo binario
-PACKET_HEADER = 0xAA55
-PACKET_SIZE = 15
 
 
 class PulseTestWindow(QMainWindow):
@@ -82,9 +77,11 @@ class PulseTestWindow(QMainWindow):
             highcut=self.highcut_freq, 
             order=4
         )
-        self.bpm_calculator = PPGHeartRateCalculator(sample_rate=SAMPLE_RATE)
+        self.bpm_calculator = PPGHeartRateCalculator(sample_rate=SAMPLE_RATE, spectral_method='sdft')
         self.current_heart_rate = 0
-        self.last_packet_id = -1
+        
+        # Decodificador por lotes del protocolo binario (descarta duplicados)
+        self.packet_decoder = PacketDecoder()
         
         # Contador de muestras para tasa
         self.sample_count = 0
@@ -669,8 +666,8 @@ class PulseTestWindow(QMainWindow):
         try:
             # Reiniciar filtros y detector
             self.ppg_filter.reset()
-            self.bpm_calculator = PPGHeartRateCalculator(sample_rate=SAMPLE_RATE)
-            self.last_packet_id = -1
+            self.bpm_calculator = PPGHeartRateCalculator(sample_rate=SAMPLE_RATE, spectral_method='sdft')
+            self.packet_decoder.reset()
             
             # Limpiar buffers
             self.clear_data_buffers()
@@ -772,7 +769,6 @@ class PulseTestWindow(QMainWindow):
     
     def read_data_thread(self):
         """Hilo para leer datos del ESP32"""
-        data_buffer = bytearray()
         serial_conn = Devices.get_master_connection()
         
         if not serial_conn:
@@ -784,29 +780,11 @@ class PulseTestWindow(QMainWindow):
                 available = serial_conn.in_waiting
                 
                 if available > 0:
-                    new_data = serial_conn.read(min(available, BUFFER_SIZE * PACKET_SIZE))
-                    data_buffer.extend(new_data)
+                    # Decodificar de una vez todos los paquetes completos recibidos
+                    packets = self.packet_decoder.feed(serial_conn.read(available))
                     
-                    while len(data_buffer) >= PACKET_SIZE and self.acquiring:
-                        # Buscar inicio de paquete
-                        packet_start = self.find_packet_start(data_buffer)
-                        
-                        if packet_start < 0:
-                            if len(data_buffer) > 1:
-                                data_buffer = data_buffer[-1:]
-                            break
-                        
-                        if packet_start > 0:
-                            data_buffer = data_buffer[packet_start:]
-                        
-                        if len(data_buffer) < PACKET_SIZE:
-                            break
-                        
-                        # Procesar paquete
-                        if self.process_packet(data_buffer[:PACKET_SIZE]):
-                            self.sample_count += 1
-                        
-                        data_buffer = data_buffer[PACKET_SIZE:]
+                    if len(packets) > 0 and self.acquiring:
+                        self.process_packets(packets)
                 
                 time.sleep(0.001)
                 
@@ -814,78 +792,48 @@ class PulseTestWindow(QMainWindow):
                 print(f"Error leyendo datos: {e}")
                 time.sleep(0.1)
     
-    def find_packet_start(self, buffer):
-        """Encontrar inicio de paquete en el buffer"""
-        if len(buffer) < 2:
-            return -1
-        
-        for i in range(len(buffer) - 1):
-            if buffer[i] == (PACKET_HEADER & 0xFF) and buffer[i + 1] == (PACKET_HEADER >> 8) & 0xFF:
-                return i
-        
-        return -1
-    
-    def process_packet(self, packet_data):
-        """Procesar un paquete de datos"""
+    def process_packets(self, packets):
+        """Procesar un bloque de paquetes ya decodificados"""
         try:
-            # Extraer datos del paquete
-            header = struct.unpack('<H', packet_data[0:2])[0]
-            
-            if header != PACKET_HEADER:
-                return False
-            
-            packet_id = struct.unpack('<I', packet_data[2:6])[0]
-            
-            # Verificar duplicados
-            if packet_id <= self.last_packet_id:
-                return False
-            
-            self.last_packet_id = packet_id
-            
-            timestamp_ms = struct.unpack('<I', packet_data[6:10])[0]
-            timestamp_s = timestamp_ms / 1000.0
-            
-            ppg_raw = struct.unpack('<h', packet_data[10:12])[0]
-            ppg_raw_mv = ppg_raw * 0.03125  # Convertir a mV para visualización
-            device_id = packet_data[14]
-            
-            # ✅ FILTRAR VALOR RAW (SIN CONVERSIÓN)
-            ppg_filtered = self.ppg_filter.filter(ppg_raw)  # Usar valor raw
-            ppg_filtered_mv = ppg_filtered * 0.03125  # Convertir resultado para visualización
-            
-            # ✅ CALCULAR BPM CON VALOR FILTRADO (SIN CONVERSIÓN)
-            result = self.bpm_calculator.add_sample(ppg_filtered, timestamp_s)
-            
-            # ✅ EXTRAER BPM Y CONFIANZA CORRECTAMENTE
-            self.current_heart_rate = result['bpm'] if result['bpm'] is not None else 0
-            pulse_confidence = result.get('confidence', 0.0)
-            pulse_updated = result.get('updated', False)
-            
-            # Actualizar buffers de visualización
-            self.times.append(timestamp_s)
-            self.ppg_raw_values.append(ppg_raw_mv)
-            self.ppg_filtered_values.append(ppg_filtered_mv)
-            
-            # ✅ MANEJAR VALORES None EN PULSE_VALUES
-            pulse_display_value = self.current_heart_rate if self.current_heart_rate else 0
-            self.pulse_values.append(pulse_display_value)
-            
-            # ✅ GUARDAR DATOS CSV CORRECTAMENTE
-            self.csv_data['timestamp'].append(timestamp_ms)
-            self.csv_data['ppg_raw'].append(ppg_raw)  # Valor raw sin convertir
-            self.csv_data['ppg_filtered'].append(ppg_filtered)  # Valor filtrado sin convertir
-            self.csv_data['pulse_bpm'].append(self.current_heart_rate if self.current_heart_rate else 0)
-            self.csv_data['pulse_confidence'].append(pulse_confidence)
-            
-            # ✅ ACTUALIZAR LABEL DE CONFIANZA (cada 125 muestras = 1 segundo)
-            if hasattr(self, 'sample_count') and self.sample_count % 125 == 0:
-                self.update_confidence_display(pulse_confidence)
-            
-            return True
+            for timestamp_ms, ppg_raw in zip(packets['timestamp'].tolist(), packets['ppg'].tolist()):
+                timestamp_s = timestamp_ms / 1000.0
+                ppg_raw_mv = ppg_raw * 0.03125  # Convertir a mV para visualización
+                
+                # ✅ FILTRAR VALOR RAW (SIN CONVERSIÓN)
+                ppg_filtered = self.ppg_filter.filter(ppg_raw)  # Usar valor raw
+                ppg_filtered_mv = ppg_filtered * 0.03125  # Convertir resultado para visualización
+                
+                # ✅ CALCULAR BPM CON VALOR FILTRADO (SIN CONVERSIÓN)
+                result = self.bpm_calculator.add_sample(ppg_filtered, timestamp_s)
+                
+                # ✅ EXTRAER BPM Y CONFIANZA CORRECTAMENTE
+                self.current_heart_rate = result['bpm'] if result['bpm'] is not None else 0
+                pulse_confidence = result.get('confidence', 0.0)
+                
+                # Actualizar buffers de visualización
+                self.times.append(timestamp_s)
+                self.ppg_raw_values.append(ppg_raw_mv)
+                self.ppg_filtered_values.append(ppg_filtered_mv)
+                
+                # ✅ MANEJAR VALORES None EN PULSE_VALUES
+                pulse_display_value = self.current_heart_rate if self.current_heart_rate else 0
+                self.pulse_values.append(pulse_display_value)
+                
+                # ✅ GUARDAR DATOS CSV CORRECTAMENTE
+                self.csv_data['timestamp'].append(timestamp_ms)
+                self.csv_data['ppg_raw'].append(ppg_raw)  # Valor raw sin convertir
+                self.csv_data['ppg_filtered'].append(ppg_filtered)  # Valor filtrado sin convertir
+                self.csv_data['pulse_bpm'].append(self.current_heart_rate if self.current_heart_rate else 0)
+                self.csv_data['pulse_confidence'].append(pulse_confidence)
+                
+                self.sample_count += 1
+                
+                # ✅ ACTUALIZAR LABEL DE CONFIANZA (cada 125 muestras = 1 segundo)
+                if self.sample_count % 125 == 0:
+                    self.update_confidence_display(pulse_confidence)
             
         except Exception as e:
-            print(f"Error procesando paquete: {e}")
-            return False
+            print(f"Error procesando paquetes: {e}")
     
     def update_confidence_display(self, confidence):
         """Actualizar display de confianza BPM"""
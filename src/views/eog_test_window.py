@@ -2,7 +2,6 @@ import sys
 import os
 import winsound
 import numpy as np
-import struct
 import threading
 import time
 import pandas as pd
@@ -23,6 +22,7 @@ import qtawesome as qta
 # Importaciones del proyecto
 from models.devices import Devices
 from utils.signal_processing import OnlineEOGFilter
+from utils.packet_decoder import PacketDecoder
 from views.step_fixation import StepFixationThread
 from views.linear_smooth_pursuit import LinealSmoothPursuitThread
 
@@ -30,11 +30,6 @@ from views.linear_smooth_pursuit import LinealSmoothPursuitThread
 SAMPLE_RATE = 125  # Hz para EOG (mayor frecuencia que para pulso)
 DISPLAY_TIME = 5   # Segundos de datos a mostrar
 GRAPH_PADDING = 0.01
-BUFFER_SIZE = 512
-
-# Constantes para el protocolo binario
-PACKET_HEADER = 0xAA55
-PACKET_SIZE = 15
 
 
 class EOGTestWindow(QMainWindow):
@@ -100,8 +95,8 @@ class EOGTestWindow(QMainWindow):
             fir_taps=101        # Filtro FIR con fase lineal
         )
 
-        # Variables para el sistema
-        self.last_packet_id = -1
+        # Decodificador por lotes del protocolo binario (descarta duplicados)
+        self.packet_decoder = PacketDecoder()
         
         # Contador de muestras para tasa
         self.sample_count = 0
@@ -675,7 +670,7 @@ class EOGTestWindow(QMainWindow):
             
             # Reiniciar filtro EOG
             self.eog_filter.reset()
-            self.last_packet_id = -1
+            self.packet_decoder.reset()
             
             # Limpiar y resetear los buffers de datos
             self.times.clear()
@@ -751,7 +746,6 @@ class EOGTestWindow(QMainWindow):
     
     def _read_data(self):
         """Función que se ejecuta en un hilo separado para leer datos binarios"""
-        data_buffer = bytearray()
         serial_conn = Devices.get_master_connection()
         
         if not serial_conn:
@@ -768,43 +762,19 @@ class EOGTestWindow(QMainWindow):
                 available = serial_conn.in_waiting
                 
                 if available > 0:
-                    new_data = serial_conn.read(min(available, BUFFER_SIZE * PACKET_SIZE))
-                    data_buffer.extend(new_data)
-                
-                    # Procesar paquetes completos
-                    while len(data_buffer) >= PACKET_SIZE and self.acquiring:
-                        # Buscar inicio de paquete
-                        packet_start = self._find_packet_start(data_buffer)
-                        
-                        if packet_start < 0:
-                            # No se encontró header válido, descartar primer byte
-                            if len(data_buffer) > 1:
-                                data_buffer = data_buffer[-1:]
-                            break
-                        
-                        # Eliminar datos antes del header
-                        if packet_start > 0:
-                            data_buffer = data_buffer[packet_start:]
-                        
-                        # Verificar que tenemos un paquete completo
-                        if len(data_buffer) < PACKET_SIZE:
-                            break
-                        
-                        # Extraer el paquete
-                        packet = data_buffer[:PACKET_SIZE]
-                        data_buffer = data_buffer[PACKET_SIZE:]
+                    # Decodificar de una vez todos los paquetes completos recibidos
+                    packets = self.packet_decoder.feed(serial_conn.read(available))
+                    
+                    if len(packets) > 0 and self.acquiring:
+                        sample_count += self._process_packets(packets)
                         
-                        # Procesar el paquete
-                        if self._process_packet(packet):
-                            sample_count += 1
-                            
-                            # Actualizar tasa de muestras cada segundo
-                            current_time = time.time()
-                            if current_time - start_time >= 1.0:
-                                rate = sample_count / (current_time - start_time)
-                                self.current_sample_rate = rate
-                                sample_count = 0
-                                start_time = current_time
+                        # Actualizar tasa de muestras cada segundo
+                        current_time = time.time()
+                        if current_time - start_time >= 1.0:
+                            rate = sample_count / (current_time - start_time)
+                            self.current_sample_rate = rate
+                            sample_count = 0
+                            start_time = current_time
                 
                 # Pequeña pausa para no saturar el CPU
                 time.sleep(0.001)
@@ -816,71 +786,50 @@ class EOGTestWindow(QMainWindow):
         
         print("Hilo de lectura de datos terminado")
 
-    def _find_packet_start(self, buffer):
-        """Encontrar el inicio de un paquete en el buffer"""
-        if len(buffer) < 2:
-            return -1
+    def _process_packets(self, packets):
+        """
+        Procesar un bloque de paquetes EOG ya decodificados.
+        
+        Args:
+            packets: Array estructurado devuelto por PacketDecoder.feed()
             
-        for i in range(len(buffer) - 1):
-            # Buscar la secuencia de header (Little Endian: 0x55, 0xAA)
-            if buffer[i] == (PACKET_HEADER & 0xFF) and buffer[i + 1] == (PACKET_HEADER >> 8) & 0xFF:
-                return i
-                
-        return -1
-
-    def _process_packet(self, packet):
-        """Procesar un paquete de datos EOG"""
+        Returns:
+            int: Número de muestras procesadas
+        """
         try:
-            # Verificar header
-            header = struct.unpack('<H', packet[0:2])[0]
-            if header != PACKET_HEADER:
-                return False
-            
-            # Extraer ID del paquete
-            packet_id = struct.unpack('<I', packet[2:6])[0]
-            
-            # Verificar paquetes duplicados
-            if packet_id <= self.last_packet_id:
-                return False
-            
-            self.last_packet_id = packet_id
-            
-            # Extraer timestamp (4 bytes)
-            timestamp_ms = struct.unpack('<I', packet[6:10])[0]
-            timestamp_s = timestamp_ms / 1000.0
-            
-            # Extraer datos EOG (2 bytes cada uno, signed)
-            eog_raw = struct.unpack('<h', packet[12:14])[0]
-            device_id = packet[14]
-            
-            # Aplicar filtrado
-            eog_filtered = self.eog_filter.filter(eog_raw)
-            
-            # Convertir a microvoltios
-            eog_raw_uv = eog_raw * 0.0078125 * 4.03225806 # Ganacia de 16 del ADS1115 y 248 del AD620 * 1000 uV
-            eog_filtered_uv = eog_filtered * 0.0078125 * 4.03225806
+            for packet_id, timestamp_ms, eog_raw in zip(
+                packets['id'].tolist(), packets['timestamp'].tolist(), packets['eog'].tolist()
+            ):
+                timestamp_s = timestamp_ms / 1000.0
+                
+                # Aplicar filtrado
+                eog_filtered = self.eog_filter.filter(eog_raw)
+                
+                # Convertir a microvoltios
+                eog_raw_uv = eog_raw * 0.0078125 * 4.03225806 # Ganacia de 16 del ADS1115 y 248 del AD620 * 1000 uV
+                eog_filtered_uv = eog_filtered * 0.0078125 * 4.03225806
 
-            # Actualizar buffers para visualización
-            self.times.append(timestamp_s)
-            self.eog_raw_values.append(eog_raw_uv)
-            self.eog_filtered_values.append(eog_filtered_uv)
-            
-            # Guardar datos para CSV
-            self.csv_data['timestamp'].append(timestamp_ms)
-            self.csv_data['index'].append(packet_id)
-            self.csv_data['eog_raw'].append(eog_raw)
-            self.csv_data['eog_filtered'].append(eog_filtered)
-            self.csv_data['signal_quality'].append('good')  # Por ahora fijo
-            self.csv_data['event'].append('none')  # Evento 'none' por defecto
+                # Actualizar buffers para visualización
+                self.times.append(timestamp_s)
+                self.eog_raw_values.append(eog_raw_uv)
+                self.eog_filtered_values.append(eog_filtered_uv)
+                
+                # Guardar datos para CSV
+                self.csv_data['timestamp'].append(timestamp_ms)
+                self.csv_data['index'].append(packet_id)
+                self.csv_data['eog_raw'].append(eog_raw)
+                self.csv_data['eog_filtered'].append(eog_filtered)
+                self.csv_data['signal_quality'].append('good')  # Por ahora fijo
+                self.csv_data['event'].append('none')  # Evento 'none' por defecto
             
             # Incrementar contador de muestras
-            self.sample_count += 1
+            self.sample_count += len(packets)
             
-            return True
+            return len(packets)
             
         except Exception as e:
-            print(f"Error procesando paquete: {e}")
-            return False
+            print(f"Error procesando paquetes: {e}")
+            return 0
     
     def save_data(self):
         """Guarda los datos adquiridos en archivo CSV"""
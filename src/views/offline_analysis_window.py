@@ -15,7 +15,7 @@ from PySide6.QtWidgets import (
     QPushButton, QFileDialog, QMessageBox, QSlider, QSpinBox,
     QFrame, QGroupBox, QGridLayout, QProgressBar, QTextEdit
 )
-from PySide6.QtCore import Qt, QThread, Signal
+from PySide6.QtCore import Qt
 from PySide6.QtGui import QFont
 
 # Importar el filtro offline
@@ -27,42 +27,12 @@ src_path = Path(__file__).parent.parent
 if str(src_path) not in sys.path:
     sys.path.insert(0, str(src_path))
 
-from utils.signal_processing import OfflineEOGFilter
+from utils.analysis_jobs import AnalysisJobService, FilterEOGJob
 
 # Constantes de conversión
 ADC_TO_MICROVOLTS = 0.0078125 * 4.03225806  # Ganancia de 16 del ADS1115 y 248 del AD620 * 1000 µV
 
 
-class FilteringThread(QThread):
-    """Hilo para procesar filtrado offline sin bloquear la UI"""
-    
-    progress_updated = Signal(int)
-    filtering_completed = Signal(np.ndarray)  # ✅ Cambiar a retornar solo el array
-    error_occurred = Signal(str)
-    
-    def __init__(self, eog_data_uv, sample_rate=125):
-        super().__init__()
-        self.eog_data_uv = eog_data_uv
-        self.sample_rate = sample_rate
-        
-    def run(self):
-        """Ejecutar filtrado en hilo separado"""
-        try:
-            self.progress_updated.emit(25)
-            offline_filter = OfflineEOGFilter(fs=self.sample_rate, lp_cutoff=5.0)
-            
-            self.progress_updated.emit(50)
-            # Aplicar filtrado con fase cero
-            result = offline_filter.filter_signal(self.eog_data_uv)
-            
-            self.progress_updated.emit(100)
-            # ✅ CORRECCIÓN: Emitir solo el array filtrado
-            self.filtering_completed.emit(result['filtered'])
-            
-        except Exception as e:
-            self.error_occurred.emit(f"Error en el hilo de filtrado: {e}")
-
-
 class OfflineAnalysisWindow(QMainWindow):
     """Ventana principal para análisis offline de señales EOG"""
     
@@ -84,8 +54,8 @@ class OfflineAnalysisWindow(QMainWindow):
         self.window_duration = 8
         self.current_position = 0  # posición actual en segundos
         
-        # Thread para filtrado
-        self.filtering_thread = None
+        # Filtrado en el pool compartido de análisis
+        self.job_service = AnalysisJobService.instance()
         
         self.setup_ui()
         self.setup_plots()
@@ -412,11 +382,14 @@ class OfflineAnalysisWindow(QMainWindow):
         self.progress_bar.setValue(0)
         self.load_file_btn.setEnabled(False)
         
-        self.filtering_thread = FilteringThread(self.eog_raw_uv, self.sample_rate)
-        self.filtering_thread.progress_updated.connect(self.progress_bar.setValue)
-        self.filtering_thread.filtering_completed.connect(self.on_filtering_completed)
-        self.filtering_thread.error_occurred.connect(self.on_filtering_error)
-        self.filtering_thread.start()
+        self.job_service.cancel_owner(self)
+        self.job_service.submit(
+            FilterEOGJob(self.eog_raw_uv, self.sample_rate, lp_cutoff=5.0),
+            owner=self,
+            on_finished=self.on_filtering_completed,
+            on_progress=self.progress_bar.setValue,
+            on_failed=self.on_filtering_error
+        )
             
     def on_filtering_completed(self, filtered_result):
         """Se ejecuta al completar el filtrado. Inicia la segmentación y graficado."""
@@ -665,6 +638,11 @@ class OfflineAnalysisWindow(QMainWindow):
                 self.curve_reference.setData(time_window, ref_window)
                 self.plot_reference.setXRange(start_time, end_time, padding=0)
 
+    def closeEvent(self, event):
+        """Cancelar el filtrado pendiente al cerrar la ventana"""
+        self.job_service.cancel_owner(self)
+        event.accept()
+
 
 # Para pruebas independientes
 if __name__ == "__main__":
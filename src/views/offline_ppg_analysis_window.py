@@ -16,7 +16,7 @@ from PySide6.QtWidgets import (
     QFrame, QGroupBox, QGridLayout, QProgressBar, QTextEdit,
     QApplication, QSplitter
 )
-from PySide6.QtCore import Qt, QThread, Signal, QTimer
+from PySide6.QtCore import Qt, QTimer
 from PySide6.QtGui import QFont
 import pyqtgraph as pg
 
@@ -26,182 +26,9 @@ if str(src_path) not in sys.path:
     sys.path.insert(0, str(src_path))
 
 # Importar clases necesarias
-from utils.signal_processing import OfflinePPGFilter, BPMOfflineCalculation
 from database.database_manager import DatabaseManager
-from scipy import signal
-
-
-class BPMCalculationThread(QThread):
-    """Hilo para calcular evolución de BPM offline sin bloquear la UI"""
-    
-    progress_updated = Signal(int)
-    bpm_calculated = Signal(dict)
-    error_occurred = Signal(str)
-    
-    def __init__(self, filtered_ppg_data, ms_data, fs=125):
-        super().__init__()
-        self.filtered_ppg_data = filtered_ppg_data
-        self.ms_data = ms_data
-        self.fs = fs
-        
-    def run(self):
-        """Calcular evolución de BPM usando BPMOfflineCalculation"""
-        try:
-            self.progress_updated.emit(5)
-            
-            # Crear calculador BPM offline
-            bpm_calculator = BPMOfflineCalculation(fs=self.fs)
-            
-            self.progress_updated.emit(20)
-            
-            # Calcular evolución de BPM
-            result = bpm_calculator.calculate_bpm_evolution(
-                self.filtered_ppg_data, 
-                self.ms_data
-            )
-            
-            self.progress_updated.emit(100)
-            
-            # Emitir resultado
-            self.bpm_calculated.emit(result)
-            
-        except Exception as e:
-            self.error_occurred.emit(f"Error calculando BPM: {str(e)}")
-    
-    def _calculate_bpm_for_window(self, ppg_window, time_window):
-        """Calcular BPM para una ventana específica"""
-        try:
-            if len(ppg_window) < self.fs * 5:  # Mínimo 5 segundos
-                return {'bpm': None, 'confidence': 0.0}
-            
-            # Detección de picos con parámetros optimizados
-            # Distancia mínima entre picos (0.4s = 150 BPM máximo)
-            min_distance = int(0.4 * self.fs)
-            
-            # Prominencia adaptativa
-            prominence = np.std(ppg_window) * 0.3
-            
-            peaks, properties = signal.find_peaks(
-                ppg_window,
-                distance=min_distance,
-                prominence=prominence,
-                height=np.mean(ppg_window)
-            )
-            
-            if len(peaks) < 3:
-                return {'bpm': None, 'confidence': 0.0}
-            
-            # Calcular intervalos RR en segundos
-            peak_times = time_window[peaks[0]] + (peaks / self.fs)
-            rr_intervals = np.diff(peak_times)
-            
-            # Filtrar intervalos fisiológicos (0.4s a 1.5s = 40-150 BPM)
-            valid_rr = rr_intervals[(rr_intervals >= 0.4) & (rr_intervals <= 1.5)]
-            
-            if len(valid_rr) < 2:
-                return {'bpm': None, 'confidence': 0.0}
-            
-            # Calcular BPM promedio
-            mean_rr = np.mean(valid_rr)
-            bpm = 60.0 / mean_rr
-            
-            # Validar rango fisiológico
-            if bpm < 40 or bpm > 120:
-                return {'bpm': None, 'confidence': 0.0}
-            
-            # Calcular confianza basada en variabilidad
-            cv = np.std(valid_rr) / mean_rr  # Coeficiente de variación
-            confidence = max(0.0, min(1.0, 1.0 - cv * 3))  # Normalizar
-            
-            return {'bpm': bpm, 'confidence': confidence}
-            
-        except Exception as e:
-            return {'bpm': None, 'confidence': 0.0}
-    
-    def _calculate_with_extended_window(self, full_time, current_time, original_start, original_end):
-        """Calcular BPM con ventana extendida para manejar artefactos"""
-        try:
-            # Extender ventana hacia atrás y adelante
-            extended_start = original_start - self.artifact_extension_sec
-            extended_end = original_end + self.artifact_extension_sec
-            
-            # Asegurar límites
-            extended_start = max(extended_start, full_time[0])
-            extended_end = min(extended_end, full_time[-1])
-            
-            # Extraer datos extendidos
-            mask = (full_time >= extended_start) & (full_time <= extended_end)
-            extended_ppg = self.filtered_ppg_data[mask]
-            extended_time = full_time[mask]
-            
-            return self._calculate_bpm_for_window(extended_ppg, extended_time)
-            
-        except Exception as e:
-            return {'bpm': None, 'confidence': 0.0}
-    
-    def _smooth_bpm_series(self, bpm_values):
-        """Aplicar suavizado a la serie temporal de BPM"""
-        if len(bpm_values) < 5:
-            return bpm_values
-        
-        # Usar filtro de media móvil con ventana de 5 puntos
-        try:
-            from scipy.ndimage import uniform_filter1d
-            return uniform_filter1d(bpm_values, size=5, mode='nearest')
-        except:
-            # Fallback: media móvil simple
-            smoothed = np.copy(bpm_values)
-            for i in range(2, len(bpm_values) - 2):
-                smoothed[i] = np.mean(bpm_values[i-2:i+3])
-            return smoothed
-
-
-class PPGFilteringThread(QThread):
-    """Hilo para procesar filtrado PPG offline sin bloquear la UI"""
-    
-    progress_updated = Signal(int)
-    filtering_completed = Signal(dict)
-    error_occurred = Signal(str)
-    
-    def __init__(self, ppg_data, fs=125):
-        super().__init__()
-        self.ppg_data = ppg_data
-        self.fs = fs
-        
-    def run(self):
-        """Ejecutar filtrado en hilo separado"""
-        try:
-            # Emitir progreso inicial
-            self.progress_updated.emit(10)
-            
-            # Crear filtro PPG con configuración optimizada
-            ppg_filter = OfflinePPGFilter(
-                fs=self.fs,
-                hp_cutoff=0.5,      # Eliminar deriva DC
-                lp_cutoff=5.0,      # Rango cardíaco óptimo
-                notch_enabled=False,  # Desactivar notch para evitar problemas con datos PPG
-                smoothing=True      # Suavizado adicional
-            )
-            
-            self.progress_updated.emit(30)
-            
-            # Aplicar filtrado
-            filter_result = ppg_filter.filter_signal(self.ppg_data)
-            
-            self.progress_updated.emit(80)
-            
-            # Verificar resultado
-            if filter_result is None:
-                self.error_occurred.emit("Error en el filtrado: resultado nulo")
-                return
-                
-            self.progress_updated.emit(100)
-            
-            # Emitir resultado
-            self.filtering_completed.emit(filter_result)
-            
-        except Exception as e:
-            self.error_occurred.emit(f"Error durante el filtrado: {str(e)}")
+from utils.analysis_jobs import AnalysisJobService, FilterPPGJob, BPMEvolutionJob
+from utils.pyramid_plot import PyramidCurve
 
 
 class OfflinePPGAnalysisWindow(QMainWindow):
@@ -232,15 +59,14 @@ class OfflinePPGAnalysisWindow(QMainWindow):
         self.bpm_data = None
         self.bpm_times = None
         self.bpm_confidence = None
-        self.bpm_thread = None
         
         # Variables de navegación
         self.window_size_seconds = 10.0  # Ventana de visualización
         self.current_position = 0.0      # Posición actual en segundos
         self.zoom_factor = 1.0           # Factor de zoom
         
-        # Variables de filtrado
-        self.filtering_thread = None
+        # Trabajos de filtrado y BPM (pool compartido de análisis)
+        self.job_service = AnalysisJobService.instance()
         
         # Configurar ventana
         self.setWindowTitle("EMDR Project - Análisis Offline de Señales PPG")
@@ -369,6 +195,10 @@ class OfflinePPGAnalysisWindow(QMainWindow):
         self.raw_plot.getAxis('left').setTextPen(color='white')
         self.raw_plot.getAxis('bottom').setTextPen(color='white')
         
+        # Curva persistente: la navegación solo cambia sus datos
+        self.raw_curve = PyramidCurve(self.raw_plot, pen=pg.mkPen(color='#4A90E2', width=1.5))
+        self.raw_curve.set_transform(self.apply_zoom)
+        
         raw_layout.addWidget(self.raw_plot)
         charts_layout.addWidget(raw_group)
         
@@ -391,6 +221,9 @@ class OfflinePPGAnalysisWindow(QMainWindow):
         self.filtered_plot.getAxis('left').setTextPen(color='white')
         self.filtered_plot.getAxis('bottom').setTextPen(color='white')
         
+        self.filtered_curve = PyramidCurve(self.filtered_plot, pen=pg.mkPen(color='#00A99D', width=2))
+        self.filtered_curve.set_transform(self.apply_zoom)
+        
         filtered_layout.addWidget(self.filtered_plot)
         charts_layout.addWidget(filtered_group)
         
@@ -700,6 +533,11 @@ class OfflinePPGAnalysisWindow(QMainWindow):
                     f"La sesión contiene solo {len(self.ppg_data_raw)} muestras.\nSe requieren al menos 500 muestras para un filtrado efectivo."
                 )
             
+            # Pirámides min/max: se construyen una vez por sesión
+            self.ppg_data_filtered = None
+            self.filtered_curve.clear()
+            self.raw_curve.set_data(self.ms_data / 1000.0, self.ppg_data_raw)
+            
             # Mostrar señal cruda inmediatamente
             self.plot_raw_signal()
             
@@ -733,14 +571,23 @@ class OfflinePPGAnalysisWindow(QMainWindow):
         self.progress_bar.setValue(0)
         self.filter_status_label.setText("Filtrando señal PPG...")
         
-        # Crear y configurar hilo de filtrado
-        self.filtering_thread = PPGFilteringThread(self.ppg_data_raw, estimated_fs)
-        self.filtering_thread.progress_updated.connect(self.update_filter_progress)
-        self.filtering_thread.filtering_completed.connect(self.on_filtering_completed)
-        self.filtering_thread.error_occurred.connect(self.on_filtering_error)
+        # Descartar resultados pendientes de una sesión anterior
+        self.job_service.cancel_owner(self)
         
-        # Iniciar filtrado
-        self.filtering_thread.start()
+        # Filtrado en el pool de análisis (o desde la caché de la sesión)
+        self.job_service.submit(
+            FilterPPGJob(
+                self.ppg_data_raw, estimated_fs, session_id=self.current_session_id,
+                hp_cutoff=0.5,        # Eliminar deriva DC
+                lp_cutoff=5.0,        # Rango cardíaco óptimo
+                notch_enabled=False,  # Desactivar notch para evitar problemas con datos PPG
+                smoothing=True        # Suavizado adicional
+            ),
+            owner=self,
+            on_finished=self.on_filtering_completed,
+            on_progress=self.update_filter_progress,
+            on_failed=self.on_filtering_error
+        )
     
     def update_filter_progress(self, progress):
         """Actualizar progreso del filtrado"""
@@ -750,6 +597,7 @@ class OfflinePPGAnalysisWindow(QMainWindow):
         """Manejar finalización del filtrado"""
         self.filter_result = filter_result
         self.ppg_data_filtered = filter_result['filtered']
+        self.filtered_curve.set_data(self.ms_data / 1000.0, self.ppg_data_filtered)
         
         # Ocultar barra de progreso
         self.progress_bar.setVisible(False)
@@ -788,18 +636,19 @@ class OfflinePPGAnalysisWindow(QMainWindow):
         else:
             estimated_fs = 125
         
-        # Crear y configurar hilo de cálculo BPM
-        self.bpm_thread = BPMCalculationThread(
-            self.ppg_data_filtered, 
-            self.ms_data, 
-            estimated_fs
+        # Cálculo de BPM en el pool de análisis (o desde la caché de la sesión)
+        self.job_service.submit(
+            BPMEvolutionJob(
+                self.ppg_data_filtered, 
+                self.ms_data, 
+                estimated_fs,
+                session_id=self.current_session_id
+            ),
+            owner=self,
+            on_finished=self.on_bpm_completed,
+            on_progress=self.update_bpm_progress,
+            on_failed=self.on_bpm_error
         )
-        self.bpm_thread.progress_updated.connect(self.update_bpm_progress)
-        self.bpm_thread.bpm_calculated.connect(self.on_bpm_completed)
-        self.bpm_thread.error_occurred.connect(self.on_bpm_error)
-        
-        # Iniciar cálculo
-        self.bpm_thread.start()
     
     def update_bpm_progress(self, progress):
         """Actualizar progreso del cálculo BPM"""
@@ -903,29 +752,13 @@ class OfflinePPGAnalysisWindow(QMainWindow):
             return
         
         try:
-            self.raw_plot.clear()
-            
             # Calcular ventana de visualización en segundos
             start_time_sec, end_time_sec = self.get_current_time_window_seconds()
             
-            # Convertir tiempo a segundos
-            time_sec = self.ms_data / 1000.0
-            
-            # Filtrar datos en la ventana
-            mask = (time_sec >= start_time_sec) & (time_sec <= end_time_sec)
-            windowed_time_sec = time_sec[mask]
-            windowed_ppg = self.ppg_data_raw[mask]
+            # Dibujar el nivel de la pirámide adecuado al ancho de la gráfica
+            windowed_time_sec, _ = self.raw_curve.show_range(start_time_sec, end_time_sec)
             
             if len(windowed_time_sec) > 0:
-                # Aplicar zoom vertical
-                if self.zoom_factor != 1.0:
-                    mean_val = np.mean(windowed_ppg)
-                    windowed_ppg = mean_val + (windowed_ppg - mean_val) * self.zoom_factor
-                
-                # Graficar con color azul
-                pen = pg.mkPen(color='#4A90E2', width=1.5)
-                self.raw_plot.plot(windowed_time_sec, windowed_ppg, pen=pen)
-                
                 # Configurar límites
                 self.raw_plot.setXRange(start_time_sec, end_time_sec, padding=0)
                 
@@ -943,29 +776,13 @@ class OfflinePPGAnalysisWindow(QMainWindow):
             return
         
         try:
-            self.filtered_plot.clear()
-            
             # Calcular ventana de visualización en segundos
             start_time_sec, end_time_sec = self.get_current_time_window_seconds()
             
-            # Convertir tiempo a segundos
-            time_sec = self.ms_data / 1000.0
-            
-            # Filtrar datos en la ventana
-            mask = (time_sec >= start_time_sec) & (time_sec <= end_time_sec)
-            windowed_time_sec = time_sec[mask]
-            windowed_ppg = self.ppg_data_filtered[mask]
+            # Dibujar el nivel de la pirámide adecuado al ancho de la gráfica
+            windowed_time_sec, _ = self.filtered_curve.show_range(start_time_sec, end_time_sec)
             
             if len(windowed_time_sec) > 0:
-                # Aplicar zoom vertical
-                if self.zoom_factor != 1.0:
-                    mean_val = np.mean(windowed_ppg)
-                    windowed_ppg = mean_val + (windowed_ppg - mean_val) * self.zoom_factor
-                
-                # Graficar con color verde esmeralda
-                pen = pg.mkPen(color='#00A99D', width=2)
-                self.filtered_plot.plot(windowed_time_sec, windowed_ppg, pen=pen)
-                
                 # Configurar límites
                 self.filtered_plot.setXRange(start_time_sec, end_time_sec, padding=0)
                 
@@ -978,6 +795,13 @@ class OfflinePPGAnalysisWindow(QMainWindow):
         except Exception as e:
             print(f"Error graficando señal filtrada: {e}")
     
+    def apply_zoom(self, values):
+        """Aplicar el zoom vertical alrededor de la media de la ventana visible"""
+        if self.zoom_factor == 1.0:
+            return values
+        mean_val = np.mean(values)
+        return mean_val + (values - mean_val) * self.zoom_factor
+    
     def get_current_time_window(self):
         """Calcular ventana de tiempo actual en milisegundos"""
         if self.ms_data is None or len(self.ms_data) == 0:
@@ -1066,8 +890,8 @@ class OfflinePPGAnalysisWindow(QMainWindow):
     
     def clear_plots(self):
         """Limpiar todas las gráficas"""
-        self.raw_plot.clear()
-        self.filtered_plot.clear()
+        self.raw_curve.clear()
+        self.filtered_curve.clear()
         self.bpm_plot.clear()
         
         self.raw_plot.setTitle('Señal PPG Sin Filtrar - Sin datos', color='#AAAAAA', size='12pt')
@@ -1437,15 +1261,8 @@ class OfflinePPGAnalysisWindow(QMainWindow):
     
     def closeEvent(self, event):
         """Manejar cierre de ventana"""
-        # Detener hilo de filtrado si está ejecutándose
-        if self.filtering_thread and self.filtering_thread.isRunning():
-            self.filtering_thread.terminate()
-            self.filtering_thread.wait()
-        
-        # Detener hilo de BPM si está ejecutándose
-        if self.bpm_thread and self.bpm_thread.isRunning():
-            self.bpm_thread.terminate()
-            self.bpm_thread.wait()
+        # Cancelar filtrado y cálculo de BPM pendientes de esta ventana
+        self.job_service.cancel_owner(self)
         
         event.accept()
         print("🔴 Ventana de análisis PPG cerrada")
@@ -1459,10 +1276,12 @@ def get_all_sessions_with_ppg():
         cursor = conn.cursor()
         
         cursor.execute("""
-            SELECT id, id_paciente, fecha, objetivo, comentarios
-            FROM sesiones 
-            WHERE datos_ppg IS NOT NULL
-            ORDER BY fecha DESC
+            SELECT s.id, s.id_paciente, s.fecha, s.objetivo, s.comentarios
+            FROM sesiones s
+            WHERE EXISTS (
+                SELECT 1 FROM bloques_senal b WHERE b.id_sesion = s.id AND b.canal = 'ppg'
+            )
+            ORDER BY s.fecha DESC
         """)
         
         sessions = cursor.fetchall()
@@ -22,6 +22,7 @@ from models.devices import Devices, KNOWN_SLAVES
 from utils.events import event_system
 from controller.emdr_controller import EMDRControllerWidget
 from sensor.sensor_monitor import SensorMonitor
+from sensor.acquisition_log import release_columns
 from database.database_manager import DatabaseManager
 from utils.cleanup_interface import CleanupManager
 
@@ -266,6 +267,10 @@ class EMDRControlPanel(QMainWindow):
         # Monitor de sensores en tiempo real
         self.sensor_monitor = SensorMonitor()
         self.sensor_monitor.main_layout.setContentsMargins(0, 0, 0, 0)  # Eliminar márgenes del layout interno
+        # Registrar la captura en disco para poder recuperarla tras un cierre inesperado
+        self.sensor_monitor.set_session_context(
+            self.patient_id, self.current_session, self.session_datetime, self.session_type
+        )
         right_layout.addWidget(self.sensor_monitor)
         
         # ===== NUEVA SECCIÓN: EVALUACIÓN CLÍNICA =====
@@ -944,23 +949,15 @@ class EMDRControlPanel(QMainWindow):
             sud_intermedio = int(text) if (text := self.sud_intermedio_input.text().strip()) else None
             sud_final = int(text) if (text := self.sud_final_input.text().strip()) else None
             voc = int(text) if (text := self.voc_input.text().strip()) else None    # walrus operator (:=)
-            timestamps_compressed = None
-            eog_compressed = None
-            ppg_compressed = None
-            bpm_compressed = None
             comentarios = text if (text := self.comments_text.toPlainText().strip()) else 'Sin comentarios'
 
-            # Preparar los datos de las señales
-            if len(self.sensor_monitor.csv_data['timestamp']) > 0:
-                # Extraer datos
-                timestamps_compressed = self.sensor_monitor.csv_data['timestamp']
-                eog_compressed = self.sensor_monitor.csv_data['eog_raw']
-                ppg_compressed = self.sensor_monitor.csv_data['ppg_raw']
-                bpm_compressed = self.sensor_monitor.csv_data['pulse_bpm']
-                
+            # Las señales se leen después de confirmar el guardado
+            recorder = self.sensor_monitor.session_recorder
+            has_signals = len(recorder) > 0
+            if has_signals:
                 # Mensaje de datos guardados
                 mensaje = "¡Datos guardados correctamente! " + \
-                          f"Se han guardado {self.milliseconds_to_time(timestamps_compressed[-1])} en la sesión N°{self.current_session}."
+                          f"Se han guardado {self.milliseconds_to_time(int(recorder['timestamp'][-1]))} en la sesión N°{self.current_session}."
             
             else:
                 mensaje = "¡Datos guardados correctamente! " + \
@@ -1072,8 +1069,12 @@ class EMDRControlPanel(QMainWindow):
                         if msg_box.clickedButton() == no_button:
                             return
 
+                # Extraer las señales: del registro en disco si está completo (se cierra y
+                # marca como completo), o de las vistas sin copia del registro en memoria
+                signal_columns = self.sensor_monitor.session_signal_columns() if has_signals else {}
+                
                 # Guardar datos de sesión en la base de datos
-                DatabaseManager.add_session(
+                session_id = DatabaseManager.add_session(
                     id_paciente=self.patient_id,
                     fecha=self.session_datetime.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
                     objetivo=self.session_type,
@@ -1081,12 +1082,30 @@ class EMDRControlPanel(QMainWindow):
                     sud_intermedio=sud_intermedio,
                     sud_final=sud_final,
                     voc=voc,
-                    datos_ms=timestamps_compressed,
-                    datos_eog=eog_compressed,
-                    datos_ppg=ppg_compressed,
-                    datos_bpm=bpm_compressed,
+                    datos_ms=signal_columns.get('timestamp'),
+                    datos_eog=signal_columns.get('eog_raw'),
+                    datos_ppg=signal_columns.get('ppg_raw'),
+                    datos_bpm=signal_columns.get('pulse_bpm'),
                     comentarios=comentarios
                 )
+                # Soltar las columnas y cerrar su mapeo sobre el registro en disco:
+                # en Windows un archivo mapeado no se puede borrar
+                release_columns(signal_columns)
+                del signal_columns
+                
+                if session_id is None:
+                    # Conservar el registro en disco para recuperarlo en el próximo inicio
+                    QMessageBox.critical(
+                        self,
+                        "Error",
+                        "No se pudo guardar la sesión en la base de datos.\n"
+                        "La captura se conserva en disco y se ofrecerá recuperarla al reiniciar la aplicación."
+                    )
+                    return
+                
+                # La sesión ya está en la base de datos: el registro en disco sobra
+                self.sensor_monitor.discard_acquisition_log()
+                
                 QMessageBox.information(
                     self,
                     "Datos guardados",
@@ -1319,6 +1338,9 @@ class EMDRControlPanel(QMainWindow):
         
         if msg_box.clickedButton() == yes_button:
             try:
+                # Salida confirmada sin guardar: no ofrecer recuperación de esta captura
+                self.sensor_monitor.discard_acquisition_log()
+                
                 # Emitir señal antes de cerrar
                 self.window_closed.emit()
                 
@@ -1385,6 +1407,9 @@ class EMDRControlPanel(QMainWindow):
             try:
                 print("Iniciando cierre de aplicación...")
                 
+                # Salida confirmada sin guardar: no ofrecer recuperación de esta captura
+                self.sensor_monitor.discard_acquisition_log()
+                
                 # Realizar limpieza antes de cerrar
                 if self.cleanup_manager.request_close():
                     print("✅ Cierre coordinado exitoso")
@@ -9,7 +9,7 @@ from PySide6.QtWidgets import (
     QHeaderView, QDialog, QFormLayout, QTextEdit, QGroupBox, QSplitter,
     QMainWindow, QScrollArea
 )
-from PySide6.QtCore import Qt, Signal
+from PySide6.QtCore import Qt, Signal, QTimer
 from PySide6.QtGui import QFont, QIcon, QPixmap
 
 # Importar la clase DatabaseManager
@@ -27,6 +27,9 @@ class PatientManagerWidget(QMainWindow):
     # Señal emitida cuando la ventana se cierra
     window_closed = Signal()  # Nueva señal personalizada
     
+    # Espera tras la última tecla antes de buscar (ms)
+    SEARCH_DEBOUNCE_MS = 250
+    
     def __init__(self, username=None):
         super().__init__()
         self.username = username
@@ -36,6 +39,7 @@ class PatientManagerWidget(QMainWindow):
         self.setWindowIcon(QIcon(str(Path(__file__).parent.parent.parent / 'resources' / 'emdr_icon.png')))
         self.resize(800, 600)
         self.patients_data = []
+        self.patients_by_id = {}
         
         self.setup_ui()
         self.load_patients()
@@ -169,7 +173,7 @@ class PatientManagerWidget(QMainWindow):
         """)
         
         self.search_input = QLineEdit()
-        self.search_input.setPlaceholderText("Escriba el nombre, apellido o código de paciente...")
+        self.search_input.setPlaceholderText("Escriba el nombre, apellido, comentario o código de paciente...")
         self.search_input.setStyleSheet("""
             QLineEdit {
                 padding: 8px;
@@ -186,7 +190,13 @@ class PatientManagerWidget(QMainWindow):
                 color: #AAAAAA;
             }
         """)
-        self.search_input.textChanged.connect(self.filter_patients)
+        # Búsqueda incremental: se busca cuando el usuario deja de escribir
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.filter_patients)
+        self.search_input.textChanged.connect(lambda _text: self.search_timer.start())
+        self.search_input.returnPressed.connect(self.filter_patients)
         
         self.search_button = QPushButton("Buscar")
         self.search_button.setStyleSheet("""
@@ -472,8 +482,9 @@ class PatientManagerWidget(QMainWindow):
             self.status_label.setText("Cargando pacientes...")
             QApplication.processEvents()
             
-            # Obtener pacientes de la base de datos
-            self.patients_data = DatabaseManager.get_all_patients()
+            # Obtener pacientes con sus estadísticas de sesiones (una sola consulta)
+            self.patients_data = DatabaseManager.get_patients_with_session_stats()
+            self.patients_by_id = {patient['id']: patient for patient in self.patients_data}
             
             # Actualizar tabla
             self.populate_table(self.patients_data)
@@ -504,64 +515,55 @@ class PatientManagerWidget(QMainWindow):
             # Teléfono
             self.patients_table.setItem(i, 5, QTableWidgetItem(patient.get('celular', '')))
             
-            # Sesiones - obtener número de sesiones para este paciente
-            try:
-                patient_id = patient.get('id')
-                if patient_id:
-                    sessions = DatabaseManager.get_sessions_for_patient(patient_id)
-                    session_count = len(sessions) if sessions else 0
-                    
-                    # Obtener fecha de la última sesión
-                    if sessions and len(sessions) > 0:
-                        # Las sesiones están ordenadas por fecha DESC, así que la primera es la más reciente
-                        last_session_date = sessions[0].get('fecha', '')
-                        if last_session_date:
-                            # Formatear la fecha para mostrar solo DD/MM/YYYY
-                            try:
-                                fecha_parte = last_session_date.split(' ')[0]  # Obtener solo la parte de fecha
-                                year, month, day = fecha_parte.split('-')
-                                last_session_formatted = f"{day}/{month}/{year}"
-                            except:
-                                last_session_formatted = "Ninguna"
-                        else:
-                            last_session_formatted = "Ninguna"
-                    else:
-                        last_session_formatted = "Ninguna"
-                else:
-                    session_count = 0
-                    last_session_formatted = "Ninguna"
-                
-                self.patients_table.setItem(i, 6, QTableWidgetItem(str(session_count)))
-                self.patients_table.setItem(i, 7, QTableWidgetItem(last_session_formatted))
-                
-            except Exception as e:
-                print(f"Error obteniendo sesiones para paciente {patient.get('id', 'N/A')}: {e}")
-                self.patients_table.setItem(i, 6, QTableWidgetItem("0"))
-                self.patients_table.setItem(i, 7, QTableWidgetItem("Ninguna"))
+            # Sesiones - número y fecha de la última (calculados en la consulta de pacientes)
+            session_count = patient.get('num_sesiones', 0)
+            last_session_formatted = self.format_session_date(patient.get('ultima_sesion'))
+            
+            self.patients_table.setItem(i, 6, QTableWidgetItem(str(session_count)))
+            self.patients_table.setItem(i, 7, QTableWidgetItem(last_session_formatted))
         
         # Resetear selección
         self.patients_table.clearSelection()
         self.details_button.setEnabled(False)
         self.session_button.setEnabled(False)
     
+    @staticmethod
+    def format_session_date(session_date):
+        """Formatea la fecha de una sesión como DD/MM/YYYY ("Ninguna" si no hay)"""
+        if not session_date:
+            return "Ninguna"
+        try:
+            fecha_parte = session_date.split(' ')[0]  # Obtener solo la parte de fecha
+            year, month, day = fecha_parte.split('-')
+            return f"{day}/{month}/{year}"
+        except ValueError:
+            return "Ninguna"
+    
     def filter_patients(self):
-        """Filtra los pacientes según el texto de búsqueda"""
-        search_text = self.search_input.text().lower().strip()
+        """Filtra los pacientes según el texto de búsqueda (índice de texto completo)"""
+        self.search_timer.stop()
+        search_text = self.search_input.text().strip()
         
         if not search_text:
             # Si no hay texto, mostrar todos los pacientes
             self.populate_table(self.patients_data)
             return
         
-        # Filtrar pacientes
-        filtered_patients = []
-        for patient in self.patients_data:
-            # Buscar en ID, nombre, apellidos
-            if (search_text in str(patient.get('id', '')).lower() or
-                search_text in patient.get('nombre', '').lower() or
-                search_text in patient.get('apellido_paterno', '').lower() or
-                search_text in patient.get('apellido_materno', '').lower()):
-                filtered_patients.append(patient)
+        # Código de paciente: coincidencias por ID primero
+        matched_ids = []
+        if search_text.isdigit():
+            matched_ids = [patient_id for patient_id in self.patients_by_id if search_text in str(patient_id)]
+        
+        # Nombre, apellidos o comentarios, ordenados por relevancia
+        results = DatabaseManager.search_patients(search_text) or []
+        matched_ids.extend(patient['id'] for patient in results)
+        
+        # Las estadísticas de sesiones ya están en los datos cargados
+        filtered_patients = [
+            self.patients_by_id[patient_id]
+            for patient_id in dict.fromkeys(matched_ids)
+            if patient_id in self.patients_by_id
+        ]
         
         # Actualizar tabla con resultados filtrados
         self.populate_table(filtered_patients)
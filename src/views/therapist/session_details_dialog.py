@@ -1,7 +1,5 @@
 import sys
 import os
-import json
-import pickle
 import numpy as np
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton,
@@ -13,8 +11,9 @@ import pyqtgraph as pg
 
 # Importar la clase DatabaseManager
 from database.database_manager import DatabaseManager
-# Importar el filtro PPG offline y calculador BPM
-from utils.signal_processing import OfflinePPGFilter, BPMOfflineCalculation
+# Importar los trabajos de carga, filtrado PPG offline y cálculo de BPM
+from utils.analysis_jobs import AnalysisJobService, LoadSessionSignalsJob, FilterPPGJob, BPMEvolutionJob
+from utils.pyramid_plot import PyramidCurve
 
 
 class SessionDetailsDialog(QDialog):
@@ -35,14 +34,25 @@ class SessionDetailsDialog(QDialog):
         self.current_position = 0  # Posición actual en la gráfica
         
         # Variables para el filtro PPG
-        self.ppg_filter = None
         self.filter_result = None
+        self.estimated_fs = 125
         
         # Variables para BPM
         self.bpm_data = None
         self.bpm_times = None
         self.bpm_confidence = None
-        self.bpm_calculator = None
+        
+        # Análisis en segundo plano y widgets de la gráfica (se crean al recibir datos)
+        self.job_service = AnalysisJobService.instance()
+        self.chart_layout = None
+        self.chart_status_label = None
+        self.plot_widget = None
+        self.ppg_curve = None  # Curva PPG persistente (pirámide min/max)
+        self.bpm_curve = None
+        self.confidence_curve = None
+        self.mean_bpm_line = None
+        self.chart_message = None
+        self.artifact_items = []  # Marcas de artefactos de la ventana visible
         
         # Variables para campos clínicos editables
         self.sud_inicial_field = None
@@ -63,10 +73,13 @@ class SessionDetailsDialog(QDialog):
         self.load_session_data()
         self.setup_ui()
         
+        # Señales, filtrado y BPM se calculan sin bloquear la apertura del diálogo
+        self.start_signal_loading()
+        
     def load_session_data(self):
-        """Carga los datos completos de la sesión desde la base de datos"""
+        """Carga los datos clínicos de la sesión (las señales se cargan en segundo plano)"""
         try:
-            self.session_data = DatabaseManager.get_session(self.session_id, signal_data=True)
+            self.session_data = DatabaseManager.get_session(self.session_id, signal_data=False)
             if not self.session_data:
                 QMessageBox.critical(self, "Error", f"No se pudo encontrar la sesión con ID: {self.session_id}")
                 self.reject()
@@ -78,166 +91,188 @@ class SessionDetailsDialog(QDialog):
                 self.patient_data = DatabaseManager.get_patient(patient_id)
             else:
                 self.patient_data = None
-                
-            # Recuperar datos de PPG y milisegundos
-            self.ppg_data = self.session_data.get('datos_ppg')
-            self.ms_data = self.session_data.get('datos_ms')
-            
-            # Procesar y filtrar datos PPG si están disponibles
-            if self.ppg_data is not None and self.ms_data is not None:
-                self.process_and_filter_ppg()
 
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Error al cargar datos de la sesión: {str(e)}")
             self.reject()
     
+    def start_signal_loading(self):
+        """Carga, filtra y calcula BPM en el pool de análisis; la gráfica se completa al terminar"""
+        if not self.session_data:
+            return
+        
+        self.job_service.submit(
+            LoadSessionSignalsJob(self.session_id, channels=('ppg',)),
+            owner=self,
+            on_finished=self.on_signals_loaded,
+            on_progress=lambda percent: self.set_chart_status(f"Cargando datos de pulso... {percent}%"),
+            on_failed=self.on_signals_failed
+        )
+    
+    def on_signals_loaded(self, signals):
+        """Recibe las señales decodificadas y lanza el filtrado PPG"""
+        # Recuperar datos de PPG y milisegundos
+        if signals:
+            self.ppg_data = signals.get('ppg')
+            self.ms_data = signals.get('ms')
+        
+        # Procesar y filtrar datos PPG si están disponibles
+        if self.ppg_data is not None and self.ms_data is not None:
+            self.process_and_filter_ppg()
+        else:
+            self.set_chart_status("Datos de pulso no registrados")
+    
+    def on_signals_failed(self, error_message):
+        """Error al leer las señales de la sesión"""
+        self.set_chart_status("Datos de pulso no disponibles")
+        QMessageBox.warning(self, "Advertencia", f"Error al cargar las señales de la sesión:\n{error_message}")
+    
     def process_and_filter_ppg(self):
-        """Procesa y filtra los datos PPG usando OfflinePPGFilter"""
-        try:
-            # Verificar que los datos sean válidos
-            if self.ppg_data is None or self.ms_data is None:
-                print("Datos PPG o MS no disponibles")
-                return
-            
-            # Convertir a arrays numpy si es necesario
-            if not isinstance(self.ppg_data, np.ndarray):
-                self.ppg_data = np.array(self.ppg_data)
-            
-            if not isinstance(self.ms_data, np.ndarray):
-                self.ms_data = np.array(self.ms_data)
-            
-            # Verificar que tenemos suficientes datos
-            if len(self.ppg_data) < 500:  # Mínimo ~4 segundos a 125 Hz
-                print(f"Insuficientes datos PPG: {len(self.ppg_data)} muestras")
-                return
-            
-            print(f"Procesando señal PPG: {len(self.ppg_data)} muestras")
-            
-            # Calcular frecuencia de muestreo estimada
-            if len(self.ms_data) > 1:
-                time_span_sec = (max(self.ms_data) - min(self.ms_data)) / 1000.0
-                estimated_fs = len(self.ms_data) / time_span_sec
-                print(f"Frecuencia de muestreo estimada: {estimated_fs:.1f} Hz")
-            else:
-                estimated_fs = 125  # Valor por defecto
-            
-            # Crear filtro PPG offline con parámetros optimizados
-            self.ppg_filter = OfflinePPGFilter(
-                fs=estimated_fs,
+        """Procesa y filtra los datos PPG usando OfflinePPGFilter (en segundo plano)"""
+        # Verificar que los datos sean válidos
+        if self.ppg_data is None or self.ms_data is None:
+            print("Datos PPG o MS no disponibles")
+            return
+        
+        # Convertir a arrays numpy si es necesario
+        if not isinstance(self.ppg_data, np.ndarray):
+            self.ppg_data = np.array(self.ppg_data)
+        
+        if not isinstance(self.ms_data, np.ndarray):
+            self.ms_data = np.array(self.ms_data)
+        
+        # Verificar que tenemos suficientes datos
+        if len(self.ppg_data) < 500:  # Mínimo ~4 segundos a 125 Hz
+            print(f"Insuficientes datos PPG: {len(self.ppg_data)} muestras")
+            self.set_chart_status("Datos de pulso no registrados")
+            return
+        
+        print(f"Procesando señal PPG: {len(self.ppg_data)} muestras")
+        
+        # Calcular frecuencia de muestreo estimada
+        if len(self.ms_data) > 1:
+            time_span_sec = (self.ms_data.max() - self.ms_data.min()) / 1000.0
+            self.estimated_fs = len(self.ms_data) / time_span_sec
+            print(f"Frecuencia de muestreo estimada: {self.estimated_fs:.1f} Hz")
+        else:
+            self.estimated_fs = 125  # Valor por defecto
+        
+        # Filtro PPG offline con parámetros optimizados; los resultados de
+        # aperturas anteriores se recuperan de la caché de la sesión
+        self.job_service.submit(
+            FilterPPGJob(
+                self.ppg_data,
+                self.estimated_fs,
+                session_id=self.session_id,
                 hp_cutoff=0.5,      # Eliminar deriva DC, preservar HRV
                 lp_cutoff=5.0,      # Rango cardíaco hasta 300 BPM
                 notch_freq=50,      # Eliminar ruido de red eléctrica
                 notch_q=30,         # Factor de calidad del notch
                 smoothing=True      # Suavizado adicional
-            )
-            
-            # Aplicar filtro offline
-            self.filter_result = self.ppg_filter.filter_signal(self.ppg_data)
-            
-            # Obtener señal filtrada
-            self.ppg_filtered = self.filter_result['filtered']
-            
-            # Calcular evolución de BPM
-            try:
-                print("Calculando evolución de BPM...")
-                self.bpm_calculator = BPMOfflineCalculation(fs=estimated_fs)
-                bpm_result = self.bpm_calculator.calculate_bpm_evolution(
-                    self.ppg_filtered, 
-                    self.ms_data
-                )
-                
-                # Extraer datos de BPM
-                self.bpm_data = bpm_result['bpm_values']
-                self.bpm_times = bpm_result['times_sec']
-                self.bpm_confidence = bpm_result['confidence_values']
-                
-                metadata_bpm = bpm_result['metadata']
-                print(f"✅ BPM calculado: {metadata_bpm['total_points']} puntos")
-                if metadata_bpm.get('mean_bpm'):
-                    print(f"  - BPM promedio: {metadata_bpm['mean_bpm']:.1f} ± {metadata_bpm['std_bpm']:.1f}")
-                    
-            except Exception as e:
-                print(f"Error calculando BPM: {e}")
-                self.bpm_data = None
-                self.bpm_times = None
-                self.bpm_confidence = None
-            
-            # Mostrar información del filtrado
-            quality = self.filter_result['quality']
-            metadata = self.filter_result['metadata']
-            
-            print(f"✅ Filtrado PPG completado:")
-            print(f"  - Calidad general: {quality['overall']}")
-            print(f"  - SNR mejorado: {metadata['snr_improvement_db']:.1f} dB")
-            print(f"  - Picos detectados: {quality['peaks_detected']}")
-            
-            if quality.get('estimated_hr'):
-                print(f"  - Frecuencia cardíaca estimada: {quality['estimated_hr']:.1f} BPM")
-            
-            # Calcular límites fijos del eje Y
-            self.calculate_fixed_y_limits()
-            
-            # Detectar artefactos si los hay
-            artifacts = self.filter_result.get('artifacts', [])
-            if artifacts:
-                print(f"  - Artefactos de movimiento detectados: {len(artifacts)}")
-                for i, (start, end, duration) in enumerate(artifacts):
-                    print(f"    Artefacto {i+1}: {duration:.0f}ms")
-            
-        except Exception as e:
-            print(f"Error procesando datos PPG: {e}")
-            QMessageBox.warning(
-                self, 
-                "Advertencia", 
-                f"Error al filtrar señal PPG: {str(e)}\n\nSe mostrará la señal sin filtrar."
-            )
-            # Usar señal original si falla el filtrado
-            self.ppg_filtered = self.ppg_data.copy() if self.ppg_data is not None else None
+            ),
+            owner=self,
+            on_finished=self.on_ppg_filtered,
+            on_progress=lambda percent: self.set_chart_status(f"Filtrando señal PPG... {percent}%"),
+            on_failed=self.on_ppg_filter_failed
+        )
     
-    def process_sensor_data(self):
-        """Procesa los datos de sensores desde la base de datos"""
-        try:
-            # Intentar deserializar datos_ppg
-            if self.session_data.get('datos_ppg'):
-                ppg_blob = self.session_data['datos_ppg']
-                # Intentar diferentes métodos de deserialización
-                try:
-                    # Método 1: JSON
-                    self.ppg_data = json.loads(ppg_blob.decode('utf-8'))
-                except:
-                    try:
-                        # Método 2: Pickle
-                        self.ppg_data = pickle.loads(ppg_blob)
-                    except:
-                        try:
-                            # Método 3: NumPy array
-                            self.ppg_data = np.frombuffer(ppg_blob, dtype=np.float64)
-                        except:
-                            print("No se pudo deserializar datos_ppg")
-                            self.ppg_data = None
-            
-            # Intentar deserializar datos_ms
-            if self.session_data.get('datos_ms'):
-                ms_blob = self.session_data['datos_ms']
-                try:
-                    # Método 1: JSON
-                    self.ms_data = json.loads(ms_blob.decode('utf-8'))
-                except:
-                    try:
-                        # Método 2: Pickle
-                        self.ms_data = pickle.loads(ms_blob)
-                    except:
-                        try:
-                            # Método 3: NumPy array
-                            self.ms_data = np.frombuffer(ms_blob, dtype=np.float64)
-                        except:
-                            print("No se pudo deserializar datos_ms")
-                            self.ms_data = None
-                            
-        except Exception as e:
-            print(f"Error procesando datos de sensores: {e}")
-            self.ppg_data = None
-            self.ms_data = None
+    def on_ppg_filtered(self, filter_result):
+        """Muestra la señal filtrada y lanza el cálculo de BPM"""
+        self.filter_result = filter_result
+        
+        # Obtener señal filtrada
+        self.ppg_filtered = self.filter_result['filtered']
+        
+        # Mostrar información del filtrado
+        quality = self.filter_result['quality']
+        metadata = self.filter_result['metadata']
+        
+        print(f"✅ Filtrado PPG completado:")
+        print(f"  - Calidad general: {quality['overall']}")
+        print(f"  - SNR mejorado: {metadata['snr_improvement_db']:.1f} dB")
+        print(f"  - Picos detectados: {quality['peaks_detected']}")
+        
+        if quality.get('estimated_hr'):
+            print(f"  - Frecuencia cardíaca estimada: {quality['estimated_hr']:.1f} BPM")
+        
+        # Detectar artefactos si los hay
+        artifacts = self.filter_result.get('artifacts', [])
+        if artifacts:
+            print(f"  - Artefactos de movimiento detectados: {len(artifacts)}")
+            for i, (start, end, duration) in enumerate(artifacts):
+                print(f"    Artefacto {i+1}: {duration:.0f}ms")
+        
+        # Mostrar la señal PPG mientras se calcula el BPM
+        self.calculate_fixed_y_limits()
+        self.show_chart()
+        
+        # Calcular evolución de BPM
+        print("Calculando evolución de BPM...")
+        self.job_service.submit(
+            BPMEvolutionJob(
+                self.ppg_filtered,
+                self.ms_data,
+                self.estimated_fs,
+                session_id=self.session_id
+            ),
+            owner=self,
+            on_finished=self.on_bpm_calculated,
+            on_failed=self.on_bpm_failed
+        )
+    
+    def on_ppg_filter_failed(self, error_message):
+        """Error en el filtrado: se muestra la señal original"""
+        QMessageBox.warning(
+            self, 
+            "Advertencia", 
+            f"Error al filtrar señal PPG: {error_message}\n\nSe mostrará la señal sin filtrar."
+        )
+        # Usar señal original si falla el filtrado
+        self.ppg_filtered = self.ppg_data.copy() if self.ppg_data is not None else None
+        self.calculate_fixed_y_limits()
+        self.show_chart()
+    
+    def on_bpm_calculated(self, bpm_result):
+        """Sustituye la señal PPG por la evolución de BPM en la gráfica"""
+        # Extraer datos de BPM
+        self.bpm_data = bpm_result['bpm_values']
+        self.bpm_times = bpm_result['times_sec']
+        self.bpm_confidence = bpm_result['confidence_values']
+        
+        metadata_bpm = bpm_result['metadata']
+        print(f"✅ BPM calculado: {metadata_bpm['total_points']} puntos")
+        if metadata_bpm.get('mean_bpm'):
+            print(f"  - BPM promedio: {metadata_bpm['mean_bpm']:.1f} ± {metadata_bpm['std_bpm']:.1f}")
+        
+        # Recalcular límites fijos del eje Y para la serie de BPM
+        self.calculate_fixed_y_limits()
+        if self.plot_widget is not None:
+            self.update_chart()
+    
+    def on_bpm_failed(self, error_message):
+        """Error en el cálculo de BPM: la gráfica sigue mostrando la señal PPG"""
+        self.bpm_data = None
+        self.bpm_times = None
+        self.bpm_confidence = None
+    
+    def set_chart_status(self, text):
+        """Actualiza el mensaje mostrado mientras la gráfica no está lista"""
+        if self.chart_status_label is not None:
+            self.chart_status_label.setText(text)
+    
+    def show_chart(self):
+        """Sustituye el mensaje de carga por la gráfica"""
+        if self.plot_widget is not None or self.ppg_filtered is None:
+            return
+        if self.chart_status_label is not None:
+            self.chart_status_label.deleteLater()
+            self.chart_status_label = None
+        self.setup_chart(self.chart_layout)
+    
+    def done(self, result):
+        """Cancela los análisis pendientes al cerrar el diálogo"""
+        self.job_service.cancel_owner(self)
+        super().done(result)
     
     def setup_ui(self):
         """Configura la interfaz del diálogo"""
@@ -457,27 +492,23 @@ class SessionDetailsDialog(QDialog):
             }
         """)
         
-        chart_layout = QVBoxLayout(chart_group)
+        self.chart_layout = QVBoxLayout(chart_group)
         
-        # Verificar si hay datos de PPG disponibles
-        if self.ppg_filtered is not None and self.ms_data is not None:
-            self.setup_chart(chart_layout)
-        else:
-            # Mostrar mensaje de datos no disponibles
-            no_data_label = QLabel("Datos de pulso no registrados")
-            no_data_label.setStyleSheet("""
-                QLabel {
-                    background-color: #323232;
-                    border: 1px solid #555555;
-                    border-radius: 4px;
-                    padding: 20px;
-                    font-size: 14px;
-                    color: #AAAAAA;
-                    text-align: center;
-                }
-            """)
-            no_data_label.setAlignment(Qt.AlignCenter)
-            chart_layout.addWidget(no_data_label)
+        # Mensaje mientras se cargan y filtran las señales en segundo plano
+        self.chart_status_label = QLabel("Cargando datos de pulso...")
+        self.chart_status_label.setStyleSheet("""
+            QLabel {
+                background-color: #323232;
+                border: 1px solid #555555;
+                border-radius: 4px;
+                padding: 20px;
+                font-size: 14px;
+                color: #AAAAAA;
+                text-align: center;
+            }
+        """)
+        self.chart_status_label.setAlignment(Qt.AlignCenter)
+        self.chart_layout.addWidget(self.chart_status_label)
 
         main_layout.addWidget(chart_group)
 
@@ -756,6 +787,23 @@ class SessionDetailsDialog(QDialog):
         self.plot_widget.getAxis('left').setTextPen(color='white')
         self.plot_widget.getAxis('bottom').setTextPen(color='white')
         
+        # Elementos persistentes: la navegación solo cambia sus datos
+        self.ppg_curve = PyramidCurve(self.plot_widget, pen=pg.mkPen(color='#00A99D', width=2))
+        self.bpm_curve = self.plot_widget.plot([], [], pen=pg.mkPen(color='#00A99D', width=2))
+        self.confidence_curve = self.plot_widget.plot(
+            [], [], pen=pg.mkPen(color='#FFA500', width=1, style=Qt.DotLine)
+        )
+        self.mean_bpm_line = pg.InfiniteLine(
+            angle=0,
+            pen=pg.mkPen('#CCCCCC', width=1, style=Qt.DashLine),
+            label=''
+        )
+        self.mean_bpm_line.setVisible(False)
+        self.plot_widget.addItem(self.mean_bpm_line)
+        self.chart_message = pg.TextItem('', color='#AAAAAA', anchor=(0.5, 0.5))
+        self.chart_message.setVisible(False)
+        self.plot_widget.addItem(self.chart_message)
+        
         # Configurar límites Y fijos si están disponibles
         if hasattr(self, 'y_min') and hasattr(self, 'y_max') and self.y_min is not None and self.y_max is not None:
             self.plot_widget.setYRange(self.y_min, self.y_max, padding=0)
@@ -990,7 +1038,6 @@ class SessionDetailsDialog(QDialog):
         if self.bpm_data is not None and self.bpm_times is not None:
             data_to_plot = self.bpm_data
             times_to_plot_ms = self.bpm_times * 1000  # Ya está en segundos, convertir a ms
-            data_label = 'Evolución BPM'
             data_unit = 'BPM'
         else:
             # Fallback a PPG filtrada o original
@@ -999,72 +1046,64 @@ class SessionDetailsDialog(QDialog):
                 return
             data_to_plot = ppg_to_plot
             times_to_plot_ms = self.ms_data
-            data_label = 'PPG Filtrada' if self.ppg_filtered is not None else 'PPG Original'
             data_unit = 'Amplitud'
         
         try:
             # Calcular ventana de tiempo
-            start_time_ms = min(times_to_plot_ms) + (self.current_position * 1000)
+            start_time_ms = np.min(times_to_plot_ms) + (self.current_position * 1000)
             end_time_ms = start_time_ms + (self.window_size_seconds * 1000)
             
-            # Filtrar datos dentro de la ventana
-            mask = (times_to_plot_ms >= start_time_ms) & (times_to_plot_ms <= end_time_ms)
-            windowed_times_ms = times_to_plot_ms[mask]
-            windowed_data = data_to_plot[mask]
-            
             # CONVERSIÓN A SEGUNDOS para evitar notación científica
-            windowed_times_sec = windowed_times_ms / 1000.0
             start_time_sec = start_time_ms / 1000.0
             end_time_sec = end_time_ms / 1000.0
             
-            # Limpiar la gráfica
-            self.plot_widget.clear()
+            # Los elementos de la gráfica son persistentes: solo se actualizan sus datos
+            self.clear_artifact_marks()
+            self.chart_message.setVisible(False)
+            
+            if self.bpm_data is not None:
+                # Filtrar datos dentro de la ventana (serie BPM, pocos puntos)
+                self.ppg_curve.clear()
+                mask = (times_to_plot_ms >= start_time_ms) & (times_to_plot_ms <= end_time_ms)
+                windowed_times_sec = times_to_plot_ms[mask] / 1000.0
+                windowed_data = data_to_plot[mask]
+                self.bpm_curve.setData(windowed_times_sec, windowed_data)
+            else:
+                # Señal completa: nivel de la pirámide según el ancho de la gráfica
+                if self.ppg_curve.pyramid is None or self.ppg_curve.pyramid.values is not data_to_plot:
+                    self.ppg_curve.set_data(times_to_plot_ms / 1000.0, data_to_plot)
+                windowed_times_sec, windowed_data = self.ppg_curve.show_range(start_time_sec, end_time_sec)
+            
+            # Configurar los límites del eje X (EN SEGUNDOS) y los límites fijos del eje Y
+            self.plot_widget.setXRange(start_time_sec, end_time_sec, padding=0)
+            if hasattr(self, 'y_min') and hasattr(self, 'y_max') and self.y_min is not None and self.y_max is not None:
+                self.plot_widget.setYRange(self.y_min, self.y_max, padding=0)
             
             if len(windowed_times_sec) > 0 and len(windowed_data) > 0:
-                # Graficar datos con color verde esmeralda (USANDO SEGUNDOS)
-                pen = pg.mkPen(color='#00A99D', width=2)
-                self.plot_widget.plot(windowed_times_sec, windowed_data, pen=pen, name=data_label)
-                
-                # Si es BPM, agregar líneas de referencia
+                # Si es BPM, actualizar la línea de referencia y la confianza
                 if self.bpm_data is not None:
                     # Línea de BPM promedio durante esta ventana
-                    if len(windowed_data) > 0:
-                        mean_bpm = np.mean(windowed_data)
-                        ref_line = pg.InfiniteLine(
-                            pos=mean_bpm, 
-                            angle=0, 
-                            pen=pg.mkPen('#CCCCCC', width=1, style=Qt.DashLine),
-                            label=f'Promedio: {mean_bpm:.1f} BPM'
-                        )
-                        self.plot_widget.addItem(ref_line)
+                    mean_bpm = np.mean(windowed_data)
+                    self.mean_bpm_line.setValue(mean_bpm)
+                    self.mean_bpm_line.label.setFormat(f'Promedio: {mean_bpm:.1f} BPM')
+                    self.mean_bpm_line.setVisible(True)
                     
                     # Mostrar confianza si está disponible
                     if (self.bpm_confidence is not None and 
                         hasattr(self, 'show_confidence') and self.show_confidence):
-                        windowed_confidence = self.bpm_confidence[mask]
-                        confidence_pen = pg.mkPen(color='#FFA500', width=1, style=Qt.DotLine)
                         # Normalizar confianza para visualización
-                        conf_normalized = windowed_confidence * np.max(windowed_data)
-                        self.plot_widget.plot(windowed_times_sec, conf_normalized, 
-                                            pen=confidence_pen, name='Confianza')
-                
-                # Configurar los límites del eje X (EN SEGUNDOS)
-                self.plot_widget.setXRange(start_time_sec, end_time_sec, padding=0)
-                
-                # Configurar límites fijos del eje Y
-                if hasattr(self, 'y_min') and hasattr(self, 'y_max') and self.y_min is not None and self.y_max is not None:
-                    self.plot_widget.setYRange(self.y_min, self.y_max, padding=0)
+                        conf_normalized = self.bpm_confidence[mask] * np.max(windowed_data)
+                        self.confidence_curve.setData(windowed_times_sec, conf_normalized)
+                    else:
+                        self.confidence_curve.setData([], [])
                 
                 # Título con información específica del tipo de datos
                 if self.bpm_data is not None:
-                    if len(windowed_data) > 0:
-                        min_bpm = np.min(windowed_data)
-                        max_bpm = np.max(windowed_data)
-                        min_time = self.format_time_mmss(self.current_position)
-                        max_time = self.format_time_mmss(self.current_position + self.window_size_seconds)
-                        title_text = f'Evolución BPM (Rango: {min_bpm:.1f}-{max_bpm:.1f}) - Ventana: {min_time} a {max_time}'
-                    else:
-                        title_text = f'Evolución BPM - Ventana: {self.current_position:.1f}s a {self.current_position + self.window_size_seconds:.1f}s'
+                    min_bpm = np.min(windowed_data)
+                    max_bpm = np.max(windowed_data)
+                    min_time = self.format_time_mmss(self.current_position)
+                    max_time = self.format_time_mmss(self.current_position + self.window_size_seconds)
+                    title_text = f'Evolución BPM (Rango: {min_bpm:.1f}-{max_bpm:.1f}) - Ventana: {min_time} a {max_time}'
                 else:
                     # Título para PPG
                     if self.filter_result:
@@ -1092,18 +1131,10 @@ class SessionDetailsDialog(QDialog):
                     
             else:
                 # Mostrar mensaje si no hay datos en esta ventana
-                text_item = pg.TextItem(
-                    'No hay datos en esta ventana',
-                    color='#AAAAAA',
-                    anchor=(0.5, 0.5)
-                )
-                text_item.setPos(start_time_ms + (end_time_ms - start_time_ms) / 2, 0)
-                self.plot_widget.addItem(text_item)
-                
-                # Configurar límites X y Y fijos incluso sin datos
-                self.plot_widget.setXRange(start_time_ms, end_time_ms, padding=0)
-                if hasattr(self, 'y_min') and hasattr(self, 'y_max') and self.y_min is not None and self.y_max is not None:
-                    self.plot_widget.setYRange(self.y_min, self.y_max, padding=0)
+                self.mean_bpm_line.setVisible(False)
+                self.confidence_curve.setData([], [])
+                self.show_chart_message('No hay datos en esta ventana', '#AAAAAA',
+                                        (start_time_sec + end_time_sec) / 2)
                 
                 if self.bpm_data is not None:
                     self.plot_widget.setTitle('Evolución BPM - Sin datos', color='#AAAAAA', size='14pt')
@@ -1112,15 +1143,26 @@ class SessionDetailsDialog(QDialog):
             
         except Exception as e:
             print(f"Error actualizando gráfica: {e}")
-            # Limpiar y mostrar mensaje de error
-            self.plot_widget.clear()
-            error_text = pg.TextItem(
-                f'Error mostrando datos: {str(e)}',
-                color='red',
-                anchor=(0.5, 0.5)
-            )
-            error_text.setPos(0, 0)
-            self.plot_widget.addItem(error_text)
+            # Vaciar las curvas y mostrar mensaje de error
+            self.ppg_curve.clear()
+            self.bpm_curve.setData([], [])
+            self.confidence_curve.setData([], [])
+            self.mean_bpm_line.setVisible(False)
+            self.clear_artifact_marks()
+            self.show_chart_message(f'Error mostrando datos: {str(e)}', 'red', 0)
+    
+    def show_chart_message(self, text, color, x_pos):
+        """Muestra el mensaje persistente de la gráfica en la posición X indicada"""
+        self.chart_message.setText(text, color=color)
+        y_range = self.plot_widget.getViewBox().viewRange()[1]
+        self.chart_message.setPos(x_pos, (y_range[0] + y_range[1]) / 2)
+        self.chart_message.setVisible(True)
+    
+    def clear_artifact_marks(self):
+        """Quita de la gráfica las marcas de artefactos de la ventana anterior"""
+        for item in self.artifact_items:
+            self.plot_widget.removeItem(item)
+        self.artifact_items = []
     
     def mark_artifacts_in_window(self, start_time_ms, end_time_ms):
         """Marcar artefactos de movimiento que estén visible en la ventana actual"""
@@ -1145,10 +1187,10 @@ class SessionDetailsDialog(QDialog):
                 
                 # Verificar si el artefacto está visible en la ventana actual
                 if (artifact_start_ms < end_time_ms and artifact_end_ms > start_time_ms):
-                    # Crear región de resaltado para el artefacto
+                    # Crear región de resaltado para el artefacto (eje X en segundos)
                     region = pg.LinearRegionItem(
-                        [max(artifact_start_ms, start_time_ms), 
-                         min(artifact_end_ms, end_time_ms)],
+                        [max(artifact_start_ms, start_time_ms) / 1000.0, 
+                         min(artifact_end_ms, end_time_ms) / 1000.0],
                         brush=pg.mkBrush(255, 0, 0, 50),  # Rojo semi-transparente
                         pen=pg.mkPen(255, 0, 0, 100),     # Borde rojo
                         movable=False
@@ -1162,10 +1204,11 @@ class SessionDetailsDialog(QDialog):
                         anchor=(0.5, 1.0)
                     )
                     artifact_label.setPos(
-                        (artifact_start_ms + artifact_end_ms) / 2,
+                        (artifact_start_ms + artifact_end_ms) / 2000.0,
                         self.plot_widget.getViewBox().viewRange()[1][1] * 0.9
                     )
                     self.plot_widget.addItem(artifact_label)
+                    self.artifact_items.extend([region, artifact_label])
                     
         except Exception as e:
             print(f"Error marcando artefactos: {e}")
@@ -0,0 +1,141 @@
+"""
+Pruebas de equivalencia numérica de OnlineEOGFilter.
+
+Comparan la etapa FIR vectorizada (filter() muestra a muestra, filter_block()
+y llamadas mezcladas) con la implementación anterior basada en una deque y
+un generador, sobre señales aleatorias largas.
+
+Uso (desde la raíz del repositorio):
+    python -m unittest discover tests
+"""
+
+import contextlib
+import io
+import sys
+import unittest
+from collections import deque
+from pathlib import Path
+
+import numpy as np
+from scipy import signal
+
+# Añadir el directorio src al path para las importaciones
+src_path = Path(__file__).parent.parent / 'src'
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+
+from utils.signal_processing import OnlineEOGFilter
+
+# Muestras por prueba (~4,5 minutos a 125 Hz)
+N_SAMPLES = 30000
+
+
+class ReferenceEOGFilter:
+    """Implementación anterior de OnlineEOGFilter (notch lfilter + FIR con deque)."""
+
+    def __init__(self, fs=125, lp_cutoff=30.0, notch_freq=50, notch_q=30, fir_taps=101):
+        nyq = fs * 0.5
+        self.b_notch, self.a_notch = signal.iirnotch(notch_freq / nyq, notch_q)
+        self.b_lp = signal.firwin(fir_taps, lp_cutoff, fs=fs, window='hamming')
+        self.z_notch = signal.lfilter_zi(self.b_notch, self.a_notch)
+        self.fir_buffer = deque(maxlen=len(self.b_lp))
+        self.fir_buffer.extend([0.0] * len(self.b_lp))
+
+    def filter(self, x):
+        y, self.z_notch = signal.lfilter(self.b_notch, self.a_notch, [float(x)], zi=self.z_notch)
+        self.fir_buffer.append(y[0])
+        return sum(
+            sample * coeff
+            for sample, coeff in zip(self.fir_buffer, reversed(self.b_lp))
+        )
+
+
+def random_eog(n_samples, seed):
+    """Señal tipo EOG: deriva lenta, sacadas (escalones), ruido y 50 Hz, en rango ADC."""
+    rng = np.random.default_rng(seed)
+    drift = np.cumsum(rng.normal(0, 2, n_samples))
+    saccades = np.repeat(rng.normal(0, 400, n_samples // 250 + 1), 250)[:n_samples]
+    mains = 80 * np.sin(2 * np.pi * 50 * np.arange(n_samples) / 125)
+    noise = rng.normal(0, 30, n_samples)
+    return np.clip(2048 + drift + saccades + mains + noise, -32768, 32767).astype(np.int16)
+
+
+def random_block_sizes(n_samples, seed, max_size=300):
+    """Tamaños de bloque aleatorios (incluye 0, 1 y bloques mayores que el FIR)."""
+    rng = np.random.default_rng(seed)
+    sizes = []
+    while sum(sizes) < n_samples:
+        sizes.append(int(rng.integers(0, max_size)))
+    sizes[-1] -= sum(sizes) - n_samples
+    return sizes
+
+
+class OnlineEOGFilterEquivalenceTest(unittest.TestCase):
+
+    def setUp(self):
+        # Los filtros imprimen su configuración al crearse
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.filters = {
+                notch: (OnlineEOGFilter(notch_freq=notch), ReferenceEOGFilter(notch_freq=notch))
+                for notch in (50, 60)
+            }
+
+    def assert_equivalent(self, actual, expected):
+        scale = max(1.0, float(np.max(np.abs(expected))))
+        np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9 * scale)
+
+    def reference_output(self, reference, data):
+        return np.array([reference.filter(x) for x in data])
+
+    def test_scalar_path(self):
+        for seed, (notch, (eog_filter, reference)) in enumerate(self.filters.items()):
+            data = random_eog(N_SAMPLES, seed)
+            expected = self.reference_output(reference, data)
+            actual = np.array([eog_filter.filter(x) for x in data])
+            self.assert_equivalent(actual, expected)
+
+    def test_single_block(self):
+        for seed, (notch, (eog_filter, reference)) in enumerate(self.filters.items()):
+            data = random_eog(N_SAMPLES, 10 + seed)
+            expected = self.reference_output(reference, data)
+            self.assert_equivalent(eog_filter.filter_block(data), expected)
+
+    def test_random_blocks(self):
+        for seed, (notch, (eog_filter, reference)) in enumerate(self.filters.items()):
+            data = random_eog(N_SAMPLES, 20 + seed)
+            expected = self.reference_output(reference, data)
+
+            outputs, start = [], 0
+            for size in random_block_sizes(N_SAMPLES, seed):
+                block_output = eog_filter.filter_block(data[start:start + size])
+                self.assertEqual(len(block_output), size)
+                outputs.append(block_output)
+                start += size
+            self.assert_equivalent(np.concatenate(outputs), expected)
+
+    def test_mixed_scalar_and_block_calls(self):
+        for seed, (notch, (eog_filter, reference)) in enumerate(self.filters.items()):
+            data = random_eog(N_SAMPLES, 30 + seed)
+            expected = self.reference_output(reference, data)
+            rng = np.random.default_rng(seed)
+
+            outputs, start = [], 0
+            for size in random_block_sizes(N_SAMPLES, 40 + seed, max_size=150):
+                chunk = data[start:start + size]
+                if rng.random() < 0.5:
+                    outputs.append(np.array([eog_filter.filter(x) for x in chunk]))
+                else:
+                    outputs.append(eog_filter.filter_block(chunk))
+                start += size
+            self.assert_equivalent(np.concatenate(outputs), expected)
+
+    def test_reset_restarts_from_initial_state(self):
+        eog_filter, _ = self.filters[50]
+        data = random_eog(5000, 50)
+        first = eog_filter.filter_block(data)
+        eog_filter.reset()
+        self.assert_equivalent(eog_filter.filter_block(data), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,241 @@
+"""
+Pruebas del códec de señales y de la migración de BLOBs antiguos.
+
+Parte del códec: ida y vuelta exacta de encode_signal/SignalReader para
+cada tipo de almacenamiento, lecturas parciales, split_chunks + read_chunked
+y locate_range sobre timestamps.
+
+Parte de migraciones: se construye una base de datos v0 (schema.sql) con
+las señales en BLOBs pickle + zlib, como las guardaba la versión original,
+se aplica apply_migrations y se comprueba que las señales se recuperan
+exactamente desde bloques_senal y que el intervalo de tiempo de cada bloque
+es correcto (con y sin timestamps).
+
+Uso (desde la raíz del repositorio):
+    python -m unittest discover tests
+"""
+
+import contextlib
+import io
+import os
+import pickle
+import shutil
+import sqlite3
+import sys
+import tempfile
+import unittest
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+# Añadir el directorio src al path para las importaciones
+src_path = Path(__file__).parent.parent / 'src'
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+
+import database.db_connection as db_connection
+from database.connection_manager import connection_manager
+from database.database_manager import DatabaseManager
+from database.migrations import SCHEMA_VERSION, apply_migrations, get_schema_version
+from database.signal_codec import SignalReader, encode_signal, read_chunked
+
+SCHEMA_PATH = src_path / 'database' / 'schema.sql'
+
+# Muestras por bloque en la base de datos (10 s a 125 Hz)
+CHUNK_SIZE = 1250
+N_SAMPLES = 20000
+
+
+def legacy_blob(values):
+    """BLOB de la versión original: pickle + zlib de un array int32 o de una lista."""
+    return zlib.compress(pickle.dumps(values))
+
+
+def session_signals(seed, n_samples=N_SAMPLES):
+    """Timestamps con jitter (y repetidos), EOG, PPG y BPM representables en float32."""
+    rng = np.random.default_rng(seed)
+    ms = np.cumsum(rng.integers(0, 12, n_samples)).astype(np.int32) + 1000
+    eog = rng.integers(-2000, 2000, n_samples).astype(np.int32)
+    ppg = (np.arange(n_samples) % 300 + 1500).astype(np.int32)
+    bpm = (60 + rng.integers(0, 160, n_samples) / 4).tolist()
+    return ms, eog, ppg, bpm
+
+
+class SignalCodecTest(unittest.TestCase):
+
+    def test_round_trip_all_dtypes(self):
+        rng = np.random.default_rng(0)
+        signals = {
+            np.int16: rng.integers(-32768, 32768, 7777).astype(np.int16),
+            np.int32: rng.integers(-2**31, 2**31, 7777, dtype=np.int64).astype(np.int32),
+            np.float32: rng.normal(0, 1e3, 7777).astype(np.float32),
+        }
+        # Valores especiales de float32: se comparan bit a bit
+        signals[np.float32][:4] = [np.nan, -0.0, np.inf, -np.inf]
+
+        for dtype, values in signals.items():
+            reader = SignalReader(encode_signal(values, dtype))
+            self.assertEqual(len(reader), len(values))
+            self.assertEqual(reader.n_chunks, -(-len(values) // CHUNK_SIZE))
+            decoded = reader.read_all()
+            self.assertEqual(decoded.dtype, np.dtype(dtype))
+            self.assertEqual(decoded.tobytes(), values.tobytes())
+
+    def test_partial_reads(self):
+        values = np.random.default_rng(1).integers(-32768, 32768, 9000).astype(np.int16)
+        reader = SignalReader(encode_signal(values, np.int16))
+        for start, stop in [(0, 1), (1249, 1251), (1250, 2500), (100, 8999), (8999, 9000),
+                            (5000, 5000), (7000, 20000)]:
+            np.testing.assert_array_equal(reader.read(start, stop), values[start:stop])
+
+        out = np.empty(3000, dtype=np.int16)
+        self.assertIs(reader.read(1000, 4000, out=out), out)
+        np.testing.assert_array_equal(out, values[1000:4000])
+
+    def test_split_chunks_and_read_chunked(self):
+        values = np.random.default_rng(2).normal(70, 5, 6000).astype(np.float32)
+        reader = SignalReader(encode_signal(values, np.float32))
+        chunks = reader.split_chunks()
+        self.assertEqual([start for start, _ in chunks], list(range(0, 6000, CHUNK_SIZE)))
+
+        np.testing.assert_array_equal(read_chunked(chunks), values)
+        for start, stop in [(0, 10), (1200, 3800), (4999, 6000)]:
+            first, last = start // CHUNK_SIZE, (stop - 1) // CHUNK_SIZE
+            np.testing.assert_array_equal(
+                read_chunked(chunks[first:last + 1], start, stop), values[start:stop]
+            )
+
+    def test_locate_range(self):
+        ms, _, _, _ = session_signals(3)
+        reader = SignalReader(encode_signal(ms, np.int32))
+        for low, high in [(ms[0], ms[-1]), (ms[0] - 10, ms[0] - 1), (ms[-1] + 1, ms[-1] + 10),
+                          (ms[1249], ms[1250]), (ms[3000] + 0.5, ms[7000]), (5000, 4000)]:
+            expected_start = int(np.searchsorted(ms, low, side='left'))
+            expected_stop = max(expected_start, int(np.searchsorted(ms, high, side='right')))
+            start, stop = reader.locate_range(low, high)
+            if high < low:
+                self.assertEqual(stop - start, 0)
+            else:
+                self.assertEqual((start, stop), (expected_start, expected_stop))
+
+
+class LegacySignalMigrationTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.db_path = os.path.join(cls.tmp_dir, 'v0.db')
+
+        # Base de datos v0 con las señales como las guardaba la versión original
+        cls.full = session_signals(4)
+        ms, eog, ppg, bpm = cls.full
+        cls.wide_ppg = ppg.copy()
+        cls.wide_ppg[::997] = 40000   # Fuera de int16: la migración debe ensanchar a int32
+        cls.no_ms_ppg = ppg[:3000]
+
+        conn = sqlite3.connect(cls.db_path)
+        conn.executescript(SCHEMA_PATH.read_text(encoding='utf-8'))
+        conn.execute(
+            "INSERT INTO pacientes (apellido_paterno, nombre, fecha_nacimiento, celular) "
+            "VALUES ('Pérez', 'Ana', '1990-01-01', '600000000')"
+        )
+        insert = ("INSERT INTO sesiones (id, id_paciente, fecha, datos_ms, datos_eog, datos_ppg, datos_bpm) "
+                  "VALUES (?, 1, '2025-01-01', ?, ?, ?, ?)")
+        conn.execute(insert, (1, legacy_blob(ms), legacy_blob(eog), legacy_blob(ppg), legacy_blob(bpm)))
+        conn.execute(insert, (2, legacy_blob(ms), None, legacy_blob(cls.wide_ppg), None))
+        conn.execute(insert, (3, None, None, legacy_blob(cls.no_ms_ppg), None))
+        conn.execute(insert, (4, None, None, None, None))
+        conn.commit()
+
+        conn = sqlite3.connect(cls.db_path, isolation_level=None)
+        with contextlib.redirect_stdout(io.StringIO()):
+            cls.applied = apply_migrations(conn)
+        cls.conn = conn
+
+        # DatabaseManager lee la base de datos migrada
+        cls.previous_db_path = db_connection.DB_PATH
+        db_connection.DB_PATH = cls.db_path
+
+    @classmethod
+    def tearDownClass(cls):
+        connection_manager.close()
+        db_connection.DB_PATH = cls.previous_db_path
+        cls.conn.close()
+        shutil.rmtree(cls.tmp_dir, ignore_errors=True)
+
+    def chunk_rows(self, session_id, channel):
+        return self.conn.execute(
+            "SELECT indice_bloque, muestra_inicio, n_muestras, t_inicio_ms, t_fin_ms, datos "
+            "FROM bloques_senal WHERE id_sesion = ? AND canal = ? ORDER BY indice_bloque",
+            (session_id, channel)
+        ).fetchall()
+
+    def read_channel(self, session_id, channel):
+        return read_chunked([(start, blob) for _, start, _, _, _, blob in self.chunk_rows(session_id, channel)])
+
+    def test_schema_is_current(self):
+        self.assertEqual(self.applied, SCHEMA_VERSION)
+        self.assertEqual(get_schema_version(self.conn), SCHEMA_VERSION)
+        tables = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.assertNotIn('senales_sesion', tables)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(sesiones)")}
+        self.assertFalse(columns & {'datos_ms', 'datos_eog', 'datos_ppg', 'datos_bpm'})
+
+    def test_exact_round_trip(self):
+        ms, eog, ppg, bpm = self.full
+        expected = {
+            'ms': (ms, np.int32),
+            'eog': (eog, np.int16),
+            'ppg': (ppg, np.int16),
+            'bpm': (np.array(bpm, dtype=np.float64), np.float32),
+        }
+        for channel, (values, dtype) in expected.items():
+            decoded = self.read_channel(1, channel)
+            self.assertEqual(decoded.dtype, np.dtype(dtype), channel)
+            np.testing.assert_array_equal(decoded, values, err_msg=channel)
+
+    def test_int16_overflow_is_widened(self):
+        decoded = self.read_channel(2, 'ppg')
+        self.assertEqual(decoded.dtype, np.dtype(np.int32))
+        np.testing.assert_array_equal(decoded, self.wide_ppg)
+        self.assertEqual(self.chunk_rows(2, 'eog'), [])
+
+    def test_chunk_time_ranges_from_timestamps(self):
+        ms = self.full[0]
+        for channel in ('ms', 'eog', 'ppg', 'bpm'):
+            rows = self.chunk_rows(1, channel)
+            self.assertEqual(len(rows), -(-N_SAMPLES // CHUNK_SIZE), channel)
+            for index, start, n_samples, t_start, t_end, _ in rows:
+                self.assertEqual(start, index * CHUNK_SIZE)
+                self.assertEqual(n_samples, min(CHUNK_SIZE, N_SAMPLES - start))
+                self.assertEqual((t_start, t_end), (ms[start], ms[start + n_samples - 1]), channel)
+
+    def test_chunk_time_ranges_without_timestamps(self):
+        rows = self.chunk_rows(3, 'ppg')
+        self.assertEqual([row[2] for row in rows], [1250, 1250, 500])
+        for _, start, n_samples, t_start, t_end, _ in rows:
+            self.assertEqual(t_start, start * 1000 // 125)
+            self.assertEqual(t_end, (start + n_samples - 1) * 1000 // 125)
+        self.assertEqual(self.chunk_rows(4, 'ppg'), [])
+
+    def test_time_range_queries(self):
+        ms, eog, _, bpm = self.full
+        with contextlib.redirect_stdout(io.StringIO()):
+            full = DatabaseManager.get_session_signals(1, channels=('ms', 'eog', 'bpm'))
+        np.testing.assert_array_equal(full['eog']['values'], eog)
+        np.testing.assert_array_equal(full['bpm']['values'], bpm)
+        self.assertEqual(full['total_samples'], N_SAMPLES)
+
+        for low, high in [(ms[1249], ms[1250]), (ms[3000] + 0.5, ms[7000]), (5000, 25000)]:
+            start = int(np.searchsorted(ms, low, side='left'))
+            stop = int(np.searchsorted(ms, high, side='right'))
+            with contextlib.redirect_stdout(io.StringIO()):
+                window = DatabaseManager.get_session_signals(1, channels=('eog',), t_start_ms=low, t_end_ms=high)
+            self.assertEqual((window['start_index'], window['stop_index']), (start, stop))
+            np.testing.assert_array_equal(window['eog']['ms'], ms[start:stop])
+            np.testing.assert_array_equal(window['eog']['values'], eog[start:stop])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+"""
+Pruebas de StreamingBeatDetector (BPM en vivo del modo 'beats').
+
+Señales PPG sintéticas de 10 minutos filtradas con el mismo paso banda que
+SensorMonitor: tonos limpios, onda con segundo armónico y ruido, y pulsos con
+onda dícrota. Se comprueba el número de latidos detectados y el error del
+BPM final, además de la adaptación a cambios de ritmo y de amplitud.
+
+Uso (desde la raíz del repositorio):
+    python -m unittest discover tests
+"""
+
+import contextlib
+import io
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+# Añadir el directorio src al path para las importaciones
+src_path = Path(__file__).parent.parent / 'src'
+if str(src_path) not in sys.path:
+    sys.path.insert(0, str(src_path))
+
+from utils.signal_processing import OnlinePPGFilter, PPGHeartRateCalculator, StreamingBeatDetector
+
+FS = 125
+DURATION_SEC = 600
+TIMES = np.arange(FS * DURATION_SEC) / FS
+
+# Tolerancias: latidos contados (relativa) y BPM final (absoluta)
+COUNT_TOLERANCE = 0.01
+BPM_TOLERANCE = 1.0
+
+
+def live_filter(data):
+    """Paso banda de la adquisición en vivo (SensorMonitor)."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        ppg_filter = OnlinePPGFilter(filter_type='bandpass', fs=FS, lowcut=0.2, highcut=10.0, order=4)
+    return ppg_filter.filter_block(data)
+
+
+def harmonic_ppg(bpm, noise, seed, second_harmonic=0.5):
+    """Onda de pulso con segundo armónico y ruido blanco."""
+    rng = np.random.default_rng(seed)
+    phase = 2 * np.pi * bpm / 60 * TIMES
+    return (np.sin(phase) + second_harmonic * np.sin(2 * phase + 0.8)
+            + noise * rng.normal(size=len(TIMES)))
+
+
+def dicrotic_ppg(bpm, noise, seed, times=TIMES):
+    """Pulso sistólico seguido de la onda dícrota (45% de amplitud) y ruido blanco."""
+    rng = np.random.default_rng(seed)
+    cycle = (times * bpm / 60) % 1.0
+    pulse = np.exp(-((cycle - 0.2) / 0.07) ** 2) + 0.45 * np.exp(-((cycle - 0.55) / 0.08) ** 2)
+    return pulse + noise * rng.normal(size=len(times))
+
+
+class StreamingBeatDetectorTest(unittest.TestCase):
+
+    def detect(self, data):
+        detector = StreamingBeatDetector(sample_rate=FS)
+        result = detector.process_block(data, TIMES)
+        return result, detector
+
+    def assert_detects(self, data, bpm, label):
+        result, _ = self.detect(data)
+        expected_beats = DURATION_SEC * bpm / 60
+        n_beats = int(result['beat'].sum())
+        self.assertLessEqual(abs(n_beats - expected_beats), COUNT_TOLERANCE * expected_beats,
+                             f"{label}: {n_beats} latidos, se esperaban {expected_beats:.0f}")
+        self.assertLess(abs(result['bpm'][-1] - bpm), BPM_TOLERANCE,
+                        f"{label}: BPM {result['bpm'][-1]:.2f}, se esperaba {bpm}")
+
+    def test_clean_tones(self):
+        for bpm in (45, 72, 110, 160):
+            data = live_filter(np.sin(2 * np.pi * bpm / 60 * TIMES))
+            self.assert_detects(data, bpm, f"tono {bpm} BPM")
+
+    def test_noisy_second_harmonic(self):
+        for bpm in (60, 72, 90):
+            for seed in (0, 1):
+                data = live_filter(harmonic_ppg(bpm, noise=0.2, seed=seed))
+                self.assert_detects(data, bpm, f"armónico {bpm} BPM, semilla {seed}")
+
+    def test_noisy_second_harmonic_unfiltered(self):
+        # Sin filtrar, el ruido y el armónico generan muchos picos secundarios
+        data = harmonic_ppg(72, noise=0.2, seed=0)
+        self.assert_detects(data, 72, "armónico sin filtrar")
+
+    def test_dicrotic_notch(self):
+        for bpm in (45, 60, 72, 90, 110, 140):
+            for seed in (0, 1):
+                data = live_filter(dicrotic_ppg(bpm, noise=0.2, seed=seed))
+                self.assert_detects(data, bpm, f"dícrota {bpm} BPM, semilla {seed}")
+
+    def test_amplitude_modulation_and_drop(self):
+        # Modulación respiratoria del 40%, deriva de línea base y caída de amplitud al 30%
+        amplitude = (1 + 0.4 * np.sin(2 * np.pi * 0.25 * TIMES)) * np.where(TIMES < 450, 1.0, 0.3)
+        data = amplitude * dicrotic_ppg(72, noise=0.0, seed=2) + 0.5 * np.sin(2 * np.pi * 0.1 * TIMES)
+        data += 0.05 * np.random.default_rng(2).normal(size=len(TIMES))
+        self.assert_detects(live_filter(data), 72, "modulación de amplitud")
+
+    def test_heart_rate_step(self):
+        # 72 BPM durante 5 minutos y después 110 BPM
+        rate = np.where(TIMES < 300, 72, 110) / 60
+        phase = 2 * np.pi * np.cumsum(rate) / FS
+        rng = np.random.default_rng(3)
+        data = live_filter(np.sin(phase) + 0.5 * np.sin(2 * phase + 0.8) + 0.1 * rng.normal(size=len(TIMES)))
+
+        result, _ = self.detect(data)
+        expected_beats = 300 * 72 / 60 + 300 * 110 / 60
+        self.assertLessEqual(abs(result['beat'].sum() - expected_beats), COUNT_TOLERANCE * expected_beats)
+        self.assertLess(abs(result['bpm'][290 * FS] - 72), BPM_TOLERANCE)
+        self.assertLess(abs(result['bpm'][320 * FS] - 110), BPM_TOLERANCE)
+
+    def test_block_matches_samples(self):
+        data = live_filter(dicrotic_ppg(72, noise=0.2, seed=4))[:FS * 60]
+        times = TIMES[:FS * 60]
+
+        sample_detector = StreamingBeatDetector(sample_rate=FS)
+        sample_beats = np.array([sample_detector.update(v, t) for v, t in zip(data, times)])
+
+        block_detector = StreamingBeatDetector(sample_rate=FS)
+        block_beats = np.concatenate([
+            block_detector.process_block(data[start:start + 97], times[start:start + 97])['beat']
+            for start in range(0, len(data), 97)
+        ])
+        np.testing.assert_array_equal(block_beats, sample_beats)
+        self.assertEqual(block_detector.bpm, sample_detector.bpm)
+
+    def test_heart_rate_calculator_beats_mode(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            calculator = PPGHeartRateCalculator(sample_rate=FS, method='beats')
+        data = live_filter(dicrotic_ppg(72, noise=0.2, seed=5))
+        result = calculator.add_block(data, TIMES)
+        self.assertLess(abs(result['bpm'][-1] - 72), BPM_TOLERANCE)
+        self.assertLessEqual(abs(result['beat'].sum() - 720), COUNT_TOLERANCE * 720)
+
+
+if __name__ == '__main__':
+    unittest.main()